@@ -48,6 +48,8 @@ class RunModelDtoSchema(BaseDto):
     simulation_id = fields.Str()
     created_on = fields.DateTime()
     created_by = fields.Str()
+    # return the result with the run status (for models whose outputs are used by other models)
+    include_result = fields.Bool(missing=False)
     data = fields.Dict()
 
 
@@ -55,6 +57,20 @@ class ModelRunStatusDtoSchema(BaseDto):
     run_id = fields.Str()
     created_on = fields.DateTime()
     status = fields.Str(validate=validate.OneOf([a.value for a in ModelRunStatus]))
+    # only when requested with include_result
+    result = fields.Dict(fields.Str(), fields.List(fields.Dict()))
+    # only for runs of a batch that failed with an error
+    error_message = fields.Str(allow_none=True)
+
+
+class RunModelBatchDtoSchema(BaseDto):
+    # several runs of one model in a single request (e.g. the scenarios of a parameter sweep)
+    runs = fields.List(fields.Nested(RunModelDtoSchema), validate=validate.Length(min=1))
+
+
+class ModelRunStatusBatchDtoSchema(BaseDto):
+    # status of every run of a batch, in the order of the request
+    runs = fields.List(fields.Nested(ModelRunStatusDtoSchema))
 
 
 class ModelResultDtoSchema(BaseDto):
@@ -67,6 +83,7 @@ class ModelResultDtoSchema(BaseDto):
 
 class GatewayPaths:
     model_run = 'api/run_model'
+    model_run_batch = 'api/run_model_batch'
     model_status = 'api/get_model_run_state'
     model_result = 'api/get_result'
 
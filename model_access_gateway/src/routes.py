@@ -1,15 +1,16 @@
 import sys
+import traceback
 from datetime import datetime
 from functools import partial
 from typing import Any, Dict
 
 from flask import request, current_app, make_response
 from flask.blueprints import Blueprint
-from marshmallow import fields
+from marshmallow import fields, validate
 from marshmallow.schema import Schema
 
-from common_data_access.dtos import ModelRunStatus, ModelRunStatusDtoSchema, \
-    ModelResultDtoSchema, RunModelDtoSchema
+from common_data_access.dtos import ModelRunStatus, ModelRunStatusBatchDtoSchema, ModelRunStatusDtoSchema, \
+    ModelResultDtoSchema, RunModelBatchDtoSchema, RunModelDtoSchema
 from common_data_access.json_extension import get_json
 from model_access_gateway.run import shared_scheduler
 from model_access_gateway.src.models.model import Model
@@ -40,14 +41,41 @@ def run_model():
 
     model: Model = get_model(current_app)
     print(f'got model {model}', file=sys.stderr)
-    input_dto = type(f'Run{type(model).__name__}DtoSchema', (RunModelDtoSchema, ), dict(
+    input_dto = __run_model_schema(model)
+    print(f'got schema {input_dto}', file=sys.stderr)
+    model_run_request = input_dto().load(request.json)
+    print('got data', file=sys.stderr)
+    return get_json(__run(model, model_run_request), ModelRunStatusDtoSchema), 201
+
+
+@routes_blueprint.route('/run_model_batch', methods=['POST'])
+def run_model_batch():
+    # several runs of the model in one request (e.g. the scenarios of a parameter sweep), every run is
+    # stored and reported like a run requested on its own; a run that fails with an error is reported as failed,
+    # the other runs of the batch are not affected
+    model: Model = get_model(current_app)
+    input_dto = type(f'Run{type(model).__name__}BatchDtoSchema', (RunModelBatchDtoSchema, ), dict(
+        runs = fields.List(fields.Nested(__run_model_schema(model)), validate=validate.Length(min=1)),
+        Meta = type(f'Run{type(model).__name__}BatchDtoSchemaMeta',
+            (Schema.Meta, ), dict(register=False))
+    ))
+    batch_request = input_dto().load(request.json)
+    print(f'running model for {len(batch_request.runs)} requests...', file=sys.stderr)
+    return get_json({'runs': [__run(model, model_run_request, True) for model_run_request in batch_request.runs]},
+                    ModelRunStatusBatchDtoSchema), 201
+
+
+def __run_model_schema(model: Model):
+    return type(f'Run{type(model).__name__}DtoSchema', (RunModelDtoSchema, ), dict(
         data = fields.Nested(model.input_dto),
         Meta = type(f'Run{type(model).__name__}DtoSchemaMeta',
             (Schema.Meta, ), dict(register=False))
     ))
-    print(f'got schema {input_dto}', file=sys.stderr)
-    model_run_request = input_dto().load(request.json)
-    print('got data', file=sys.stderr)
+
+
+def __run(model: Model, model_run_request, report_errors: bool = False) -> Dict[str, Any]:
+    # Run the model and store the run, an error of the model fails the run and is raised (or reported in the run
+    # status with report_errors)
     simulation_run = SimulationRun(submitted_on=datetime.utcnow(),
                                 #    submitted_by=model_run_request.created_by,
                                    status=ModelRunStatus.SUBMITTED,
@@ -77,7 +105,21 @@ def run_model():
     #     'status': ModelRunStatus.SUBMITTED.value
     # }, ModelRunStatusDtoSchema), 201
     print(f"running model...", file=sys.stderr)
-    simulation_run.result = model.run_model(model_run_request.data)
+    try:
+        simulation_run.result = model.run_model(model_run_request.data)
+    except Exception as e:
+        simulation_run.completed_on = datetime.utcnow()
+        simulation_run.status = ModelRunStatus.FAILED
+        simulation_run.save()
+        if not report_errors:
+            raise
+        traceback.print_exc()
+        return {
+            'created_on': simulation_run.submitted_on,
+            'run_id': simulation_run.id,
+            'status': simulation_run.status.value,
+            'error_message': f'{e.__class__.__name__} occurred while running the model. {str(e)}'
+        }
     simulation_run.completed_on = datetime.utcnow()
     if len(errors := model.output_dto().validate(simulation_run.result)) == 0 :
         simulation_run.status = ModelRunStatus.SUCCESS
@@ -85,11 +127,15 @@ def run_model():
         simulation_run.status = ModelRunStatus.FAILED
     simulation_run.save()
 
-    return get_json({
+    run_status = {
         'created_on': simulation_run.submitted_on,
         'run_id': simulation_run.id,
         'status': simulation_run.status.value
-    }, ModelRunStatusDtoSchema), 201
+    }
+    if model_run_request.include_result:
+        # hand the result over directly, so chained models do not need another request
+        run_status['result'] = simulation_run.result
+    return run_status
 
 
 @routes_blueprint.route('/get_result/<run_id>', methods=['GET'])
@@ -5,4 +5,13 @@ from .src import create_app
 
 def run_backend():
     app = create_app()
+    # load the unit ontology before serving, instead of on the first simulation
+    from unit_translation_component import warmup
+    warmup()
+    # run the simulations left in the queue (e.g. by a restart) without waiting for a new one, if this process runs
+    # workers (SIMULATION_WORKERS). In debug mode the reloader serves the application from a child process, its
+    # parent only restarts that one and runs no workers.
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from .src.utils.simulation_queue import start_workers
+        start_workers(app)
     app.run(host=os.getenv('FLASK_RUN_HOST', '0.0.0.0'), port=int(os.getenv('FLASK_RUN_PORT', '5000')))
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
 import traceback
 
+import click
 from apispec.ext.marshmallow import MarshmallowPlugin
 from apispec_webframeworks.flask import FlaskPlugin
 from flasgger import APISpec, Swagger
@@ -16,6 +17,7 @@ def create_app() -> Flask:
     configuration = select_configuration()
     app.config.from_object(configuration)
     configure_jwt(app)
+    configure_unit_cache(app)
     initialize_db_connections(app)
     setup_cli(app)
     setup_global_error_handlers(app)
@@ -33,6 +35,12 @@ def select_configuration():
     return conf
 
 
+def configure_unit_cache(app: Flask):
+    from unit_translation_component.cache_backend import create_backend, set_backend
+    set_backend(create_backend(app.config['UNIT_CACHE_BACKEND'], path=app.config.get('UNIT_CACHE_PATH'),
+                               url=app.config.get('UNIT_CACHE_URL')))
+
+
 def configure_jwt(app: Flask):
     jwt = JWTManager(app)
 
@@ -107,13 +115,23 @@ def setup_cli(app: Flask):
         seed_graph_db_with_inof_ontology(app.config['GRAPH_DB_SERVER_URL'], app.config['GRAPH_DB_REPOSITORY_ID'])
 
     @app.cli.command('cache-om')
-    def cache_om_to_redis():
-        """Cache Ontology of Measurement (OM) on Redis (requires redis server on localhost:6379)"""
+    @click.option('--processes', type=int, default=None, help='Number of worker processes (default: CPU count)')
+    @click.option('--report', type=click.Path(dir_okay=False), default=None, help='Write the warm-up report as JSON')
+    def cache_om(processes, report):
+        """Cache Ontology of Measurement (OM) unit factors in the configured unit cache backend"""
         from unit_translation_component import cache_units
-        print('caching OM on redis!')
-        cache_units()
+        print(f'caching OM on {app.config["UNIT_CACHE_BACKEND"]}!')
+        cache_units(processes=processes, report_path=report)
         print('OM caching complete!')
 
+    @app.cli.command('simulation-worker')
+    @click.option('--threads', type=int, default=None,
+                  help='Number of worker threads (default: SIMULATION_WORKER_THREADS)')
+    def simulation_worker(threads):
+        """Run queued simulations, start it on any number of nodes sharing the database to deploy the backend"""
+        from model_sharing_backend.src.utils.simulation_queue import run_workers
+        run_workers(app, threads)
+
 
 def setup_global_error_handlers(app: Flask):
     from werkzeug.exceptions import HTTPException
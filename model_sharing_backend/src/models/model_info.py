@@ -25,6 +25,9 @@ class ModelInfo(BaseModelWithOwnerAndCreator):
     is_connected = _db.Column(_db.Boolean, default=True)
     ontology_uri = _db.Column(_db.String, nullable=False)
     gateway_url = _db.Column(_db.String, nullable=False)
+    # a deterministic model gives the same outputs for the same inputs (and version), so its runs are reused
+    version = _db.Column(_db.String, nullable=True)
+    deterministic = _db.Column(_db.Boolean, default=False)
     permissions = _db.relationship('ModelPermission', cascade='delete-orphan, delete, save-update')
     used_in_simulations = _db.relationship('Simulation', secondary=model_simulation_association)
 
@@ -38,6 +41,8 @@ class ModelInfo(BaseModelWithOwnerAndCreator):
         is_connected = fields.Bool()
         ontology_uri = fields.Str(required=True)
         gateway_url = fields.Url(required=True, require_tld=False)
+        version = fields.Str(allow_none=True)
+        deterministic = fields.Bool()
         use_count = fields.Method('model_usage_count', dump_only=True, default=0)
         can_execute = fields.Method('has_execute_permission', dump_only=True, default=False)
 
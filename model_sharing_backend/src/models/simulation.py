@@ -18,12 +18,26 @@ from .user import UserBasicReadonlyInfo
 _db = create_db_connection()
 
 
+class SimulationJobStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
 class SimulationBindingTypes(Enum):
     DATA_SOURCE = 'data'
     MODEL = 'model'
     INPUT = 'input'
 
 
+class SweepModes(Enum):
+    # every combination of the values of the parameters
+    GRID = 'grid'
+    # the n-th values of all parameters together, every parameter has the same number of values
+    LIST = 'list'
+
+
 class ColumnBinding(BaseModel):
     __tablename__ = 'simulation_bindings'
 
@@ -35,6 +49,8 @@ class ColumnBinding(BaseModel):
     source_argument_uri = _db.Column(_db.String, nullable=True)
     source_column_name = _db.Column(_db.String, nullable=True)
     source_column_uri = _db.Column(_db.String, nullable=True)
+    # column of the source matched with the join key of the argument (the column bound to the key if not set)
+    source_key_column_name = _db.Column(_db.String, nullable=True)
     source_type = _db.Column(_db.Enum(SimulationBindingTypes), nullable=False, 
         default=SimulationBindingTypes.INPUT)
 
@@ -47,6 +63,7 @@ class ColumnBinding(BaseModel):
         source_argument_uri = fields.String()
         source_column_name = fields.String()
         source_column_uri = fields.String()
+        source_key_column_name = fields.String(allow_none=True)
         source_type = fields.Str(required=True,
             validate=validate.OneOf([sbt.value for sbt in SimulationBindingTypes]))
         
@@ -77,6 +94,8 @@ class ArgumentBinding(BaseModel):
     model_uri = _db.Column(_db.String)
     argument_uri = _db.Column(_db.String)
     argument_name = _db.Column(_db.String)
+    # target column on which the rows of different sources are matched, rows are matched by position if not set
+    join_key = _db.Column(_db.String, nullable=True)
     columns = _db.relationship('ColumnBinding', cascade='delete, save-update')
 
     class ArgumentBindingDtoSchema(DbSchema):
@@ -85,27 +104,61 @@ class ArgumentBinding(BaseModel):
         model_uri = fields.String()
         argument_uri = fields.String()
         argument_name = fields.String()
+        join_key = fields.String(allow_none=True)
         columns = fields.List(fields.Nested(ColumnBinding.ColumnBindingDtoSchema))
 
         def __init__(self, *args, **kwargs):
             super().__init__(ArgumentBinding, *args, **kwargs)
 
 
+class SweepParameter(BaseModel):
+    # Input column of a model that takes another value in every scenario of a parameter sweep (see parameter_sweep)
+    # A value replaces the source_name of the input binding of the column, so it can hold several '|'-separated values
+    __tablename__ = 'sweep_parameters'
+
+    simulation_id = _db.Column(UUID(as_uuid=True), _db.ForeignKey('simulations.id'))
+    # name of the parameter in the scenarios of an execution
+    name = _db.Column(_db.String, nullable=False)
+    model_uri = _db.Column(_db.String, nullable=False)
+    argument_name = _db.Column(_db.String, nullable=False)
+    column_name = _db.Column(_db.String, nullable=False)
+    values = _db.Column(_db.PickleType, nullable=False)
+
+    class SweepParameterDtoSchema(DbSchema):
+        name = fields.Str(required=True, validate=[NotEmptyString()])
+        model_uri = fields.Str(required=True)
+        argument_name = fields.Str(required=True)
+        column_name = fields.Str(required=True)
+        values = fields.List(fields.Str(), required=True, validate=[validate.Length(min=1)])
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(SweepParameter, *args, **kwargs)
+
+
 class Simulation(BaseModelWithOwnerAndCreator):
     __tablename__ = 'simulations'
 
     name = _db.Column(_db.String, nullable=False)
     description = _db.Column(_db.String)
+    # number of models run at the same time, SIMULATION_MAX_PARALLEL_MODELS when not set
+    max_parallel_models = _db.Column(_db.Integer, nullable=True)
+    # reuse earlier runs of deterministic models with the same inputs (see ExecutedModel.input_hash)
+    reuse_model_runs = _db.Column(_db.Boolean, default=True)
+    # how the values of the sweep parameters make up the scenarios (see SweepModes)
+    sweep_mode = _db.Column(_db.String, default=SweepModes.GRID.value)
     # food_product_id = _db.Column(UUID(as_uuid=True), _db.ForeignKey('food_products.id'))
     # food_product = _db.relationship('FoodProduct')
     models = _db.relationship('ModelInfo', secondary=model_simulation_association)
     data_sources = _db.relationship('DataSourceInfo', secondary=data_source_simulation_association)
     executions = _db.relationship('ExecutedSimulation', cascade='delete, save-update')
     bindings = _db.relationship('ArgumentBinding', cascade='delete, save-update')
+    sweep_parameters = _db.relationship('SweepParameter', cascade='delete, save-update')
 
     class SimulationDbSchema(BaseDbSchemaWithOwnerAndCreator):
         name = fields.Str(required=True, validate=[NotEmptyString()])
         description = fields.Str()
+        max_parallel_models = fields.Integer(allow_none=True, validate=[validate.Range(min=1)])
+        reuse_model_runs = fields.Bool(allow_none=True)
         # food_product_id = fields.UUID(required=True, load_only=True)
         # food_product = FoodProductBasicInfoReadOnlyField
         model_ids = fields.List(fields.UUID(), required=True, load_only=True, 
@@ -114,6 +167,8 @@ class Simulation(BaseModelWithOwnerAndCreator):
         data_source_ids = fields.List(fields.UUID(), required=True, load_only=True)
         data_sources = fields.List(DataSourceBasicInfoReadonlyField, dump_only=True)
         bindings = fields.List(fields.Nested(ArgumentBinding.ArgumentBindingDtoSchema))
+        sweep_mode = fields.Str(allow_none=True, validate=validate.OneOf([sm.value for sm in SweepModes]))
+        sweep_parameters = fields.List(fields.Nested(SweepParameter.SweepParameterDtoSchema))
 
         def __init__(self, *args, **kwargs):
             super().__init__(Simulation, *args, **kwargs)
@@ -137,10 +192,27 @@ class ExecutedModel(BaseModel):
 
     client_run_id = _db.Column(_db.String)
     error_message = _db.Column(_db.String)
+    # rows left out of the inputs (e.g. without a match on the join key)
+    warning_message = _db.Column(_db.String)
+    # status of the run reported by the model gateway (see ModelRunStatus)
+    status = _db.Column(_db.String)
+    # hash of the model and its inputs, a successful run of a deterministic model is reused for the same hash
+    input_hash = _db.Column(_db.String, index=True)
+    # run whose result is used instead of running the model again
+    reused_from_id = _db.Column(UUID(as_uuid=True), _db.ForeignKey('executed_models.id'), nullable=True)
+    # index of the scenario of a parameter sweep (see ExecutedSimulation.scenarios), None without a sweep
+    scenario = _db.Column(_db.Integer, nullable=True)
     created_on = _db.Column(_db.DateTime)
     model_id = _db.Column(UUID(as_uuid=True), _db.ForeignKey('model_infos.id'), nullable=False)
     model = _db.relationship('ModelInfo', uselist=False)
     executed_simulation_id = _db.Column(UUID(as_uuid=True), _db.ForeignKey('executed_simulations.id'))
+    # seconds spent per phase of the run (see phase_timer), None for phases the model did not get to
+    input_preparation_seconds = _db.Column(_db.Float)
+    unit_conversion_seconds = _db.Column(_db.Float)
+    gateway_request_seconds = _db.Column(_db.Float)
+    result_fetch_seconds = _db.Column(_db.Float)
+
+    PHASES = ('input_preparation', 'unit_conversion', 'gateway_request', 'result_fetch')
 
 
 class ExecutedSimulation(BaseModelWithOwnerAndCreator):
@@ -149,24 +221,70 @@ class ExecutedSimulation(BaseModelWithOwnerAndCreator):
     simulation_id = _db.Column(UUID(as_uuid=True), _db.ForeignKey('simulations.id'), nullable=False)
     simulation = _db.relationship('Simulation', uselist=False)
     executed_models = _db.relationship('ExecutedModel', cascade='delete, save-update')
+    job = _db.relationship('SimulationJob', uselist=False, cascade='delete, save-update')
+    # values of the sweep parameters (by name) of every scenario of a parameter sweep, None without a sweep
+    scenarios = _db.Column(_db.PickleType, nullable=True)
+    # seconds spent per phase of the run (see phase_timer), the phases of the models are summed over all models
+    # and data sources, which run at the same time, so they can add up to more than total_seconds
+    total_seconds = _db.Column(_db.Float)
+    data_fetch_seconds = _db.Column(_db.Float)
+    metadata_parse_seconds = _db.Column(_db.Float)
+    input_preparation_seconds = _db.Column(_db.Float)
+    unit_conversion_seconds = _db.Column(_db.Float)
+    gateway_request_seconds = _db.Column(_db.Float)
+    result_fetch_seconds = _db.Column(_db.Float)
+    persistence_seconds = _db.Column(_db.Float)
+
+    PHASES = ('total', 'data_fetch', 'metadata_parse', 'input_preparation', 'unit_conversion', 'gateway_request',
+              'result_fetch', 'persistence')
+
+
+class SimulationJob(BaseModel):
+    # Entry of the simulation queue, an executed simulation is run by a worker once its job is claimed
+    __tablename__ = 'simulation_jobs'
+
+    executed_simulation_id = _db.Column(UUID(as_uuid=True), _db.ForeignKey('executed_simulations.id'),
+                                        nullable=False, unique=True)
+    status = _db.Column(_db.Enum(SimulationJobStatus), nullable=False, index=True)
+    enqueued_on = _db.Column(_db.DateTime, nullable=False)
+    started_on = _db.Column(_db.DateTime)
+    finished_on = _db.Column(_db.DateTime)
+    # worker running the job, it renews its lease with a heartbeat (see simulation_queue)
+    worker = _db.Column(_db.String)
+    heartbeat_on = _db.Column(_db.DateTime)
+    attempts = _db.Column(_db.Integer, nullable=False, default=0)
+    # why the simulation could not be run (errors of single models are kept on the executed models)
+    error_message = _db.Column(_db.String)
 
 
 SimulationBasicInfoReadonlyField = fields.Nested(Simulation.SimulationDbSchema, only=('id', 'name', 'owner'),
                                                  dump_only=True)
 
 
+def phase_timings(execution) -> dict:
+    # Seconds per phase of an executed model or simulation, phases that were not timed are left out
+    return {phase: getattr(execution, f'{phase}_seconds') for phase in type(execution).PHASES
+            if getattr(execution, f'{phase}_seconds', None) is not None}
+
+
 class ExecutedModelDtoSchema(BaseDto):
     id = fields.UUID(data_key='model_execution_id')
     client_run_id = fields.Str()
+    warning_message = fields.Str()
+    reused_from_id = fields.UUID(data_key='reused_model_execution_id')
+    scenario = fields.Integer()
     model = ModelBasicInfoReadonlyField
+    timings = fields.Function(phase_timings, dump_only=True)
 
 
 class ModelResultDtoWithModelIdSchema(ModelResultDtoSchema):
     model_id = fields.UUID()
+    scenario = fields.Integer()
 
 
 class ModelRunStatusWithModelIdDtoSchema(ModelRunStatusDtoSchema):
     model_id = fields.UUID()
+    scenario = fields.Integer()
 
 
 class ExecutedSimulationDtoSchema(BaseDto):
@@ -175,9 +293,16 @@ class ExecutedSimulationDtoSchema(BaseDto):
     created_on = fields.DateTime()
     simulation = SimulationBasicInfoReadonlyField
     executed_models = fields.List(fields.Nested(ExecutedModelDtoSchema))
+    scenarios = fields.List(fields.Dict(fields.Str(), fields.Str()))
+    timings = fields.Function(phase_timings, dump_only=True)
 
 
 class SimulationStatusDtoSchema(ExecutedSimulationDtoSchema):
+    status = fields.Str(validate=validate.OneOf([a.value for a in SimulationJobStatus]))
+    enqueued_on = fields.DateTime()
+    started_on = fields.DateTime()
+    finished_on = fields.DateTime()
+    error_message = fields.Str()
     model_statuses = fields.List(fields.Nested(ModelRunStatusWithModelIdDtoSchema, exclude=['run_id']))
 
 
@@ -191,6 +316,7 @@ class SimulationResultsDtoSchema(ExecutedSimulationDtoSchema):
 
 def get_schemas() -> list:
     return [ ColumnBinding.ColumnBindingDtoSchema, ArgumentBinding.ArgumentBindingDtoSchema, 
+            SweepParameter.SweepParameterDtoSchema,
             Simulation.SimulationDbSchema, ModelResultDtoWithModelIdSchema, 
             ExecutedSimulationDtoSchema, SimulationResultsDtoSchema, 
             SimulationWithExecutionsSchema, ModelRunStatusWithModelIdDtoSchema, 
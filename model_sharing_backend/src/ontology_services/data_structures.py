@@ -1,8 +1,6 @@
 from dataclasses import dataclass
 import dataclasses
 from enum import Enum
-from functools import wraps
-import threading
 from typing import List, Optional, Union
 from marshmallow import fields, validate
 from marshmallow.decorators import post_load, pre_dump
@@ -11,6 +9,8 @@ from unit_translation_component import Unit
 from marshmallow.schema import Schema
 import rdflib
 
+# The definitions below are immutable, so parsed interfaces can be shared between threads
+
 class ColumnReferenceType(str, Enum):
     NONE = 'none'
     FIXED = 'fixed'
@@ -21,7 +21,7 @@ class ColumnReferenceType(str, Enum):
         return self.value
 
 
-@dataclass
+@dataclass(frozen=True)
 class ColumnDefinition:
     uri: str
     name: str
@@ -36,136 +36,109 @@ class ColumnDefinition:
     referenced_schema: Union['TableDefinition', List[str]] = None
     referenced_objects: List[dict] = dataclasses.field(default_factory=list)
 
-lock: threading.Lock = threading.Lock()
-@dataclass
+# Vocabularies of the interface ontologies published by the gateways
+TABLE = rdflib.Namespace('http://www.foodvoc.org/resource/InternetOfFood/Table/')
+OM = rdflib.Namespace('http://www.ontology-of-units-of-measure.org/resource/om-2/')
+OMX = rdflib.Namespace('http://www.foodvoc.org/resource/InternetOfFood/omx/')
+OWL3 = rdflib.Namespace('http://www.foodvoc.org/resource/InternetOfFood/OntologyWebLanguage/') # BUG IMAGINARY OWL
+
+@dataclass(frozen=True)
 class TableDefinition:
     uri: str
     columns: List[ColumnDefinition]
 
-    def with_lock(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            with lock:
-                return func(*args, **kwargs)
-        return wrapper
-
     #region query_methods
+    # The graph patterns are matched with triple lookups instead of SPARQL queries: parsing SPARQL
+    # in rdflib is not thread-safe (it required a global lock), reading a graph concurrently is.
+    @staticmethod
+    def _quantities(graph, column_node):
+        # quantities that have this column as numerical value, of an interface object property
+        # ?amount a table:InterfaceObjectProperty ; omx:isQuantityPropertyOf [ omx:hasNumericalValueProperty column ]
+        for quantity in graph.subjects(OMX.hasNumericalValueProperty, column_node):
+            if any((amount, rdflib.RDF.type, TABLE.InterfaceObjectProperty) in graph
+                    for amount in graph.subjects(OMX.isQuantityPropertyOf, quantity)):
+                yield quantity
+
+    @staticmethod
+    def _chain_heads(graph, column_node):
+        # first properties of the property chains of this column
+        # column owl3:dataTypePropertyChain ?x . ?x rdf:first ?first
+        for chain in graph.objects(column_node, OWL3.dataTypePropertyChain):
+            for first in graph.objects(chain, rdflib.RDF.first):
+                yield chain, first
+
     @staticmethod
-    @with_lock
     def _is_unit_query(graph, column_node):
-        query = f"""ASK {{ 
-    ?amount a table:InterfaceObjectProperty ; 
-        omx:isQuantityPropertyOf [ omx:hasNumericalValueProperty {column_node.n3()} ] . 
-}}"""
-        return bool(graph.query(query))
+        return any(True for _ in TableDefinition._quantities(graph, column_node))
 
     @staticmethod
-    @with_lock
     def _is_fixed_unit_query(graph, column_node):
-        return bool(graph.query(f"""ASK {{ 
-    ?amount a table:InterfaceObjectProperty ;
-        omx:isQuantityPropertyOf [ omx:hasNumericalValueProperty {column_node.n3()} ;
-            omx:hasFixedUnit ?unit ] .
-}}"""))
+        return any(True for quantity in TableDefinition._quantities(graph, column_node)
+            for _ in graph.objects(quantity, OMX.hasFixedUnit))
 
     @staticmethod
-    @with_lock
     def _is_same_table_unit_query(graph, column_node, table_node):
-        return bool(graph.query(f"""ASK {{ 
-    ?amount a table:InterfaceObjectProperty ;
-        omx:isQuantityPropertyOf [ omx:hasNumericalValueProperty {column_node.n3()} ;
-            omx:hasUnitProperty ?unitprop ] .
-    {table_node.n3()} table:hasColumnProperty ?unitprop . 
-}}"""))
+        return any((table_node, TABLE.hasColumnProperty, unit_property) in graph
+            for quantity in TableDefinition._quantities(graph, column_node)
+            for unit_property in graph.objects(quantity, OMX.hasUnitProperty))
 
     @staticmethod
-    @with_lock
     def _get_unit(graph, column_node, table_node, type: ColumnReferenceType):
+        quantities = list(TableDefinition._quantities(graph, column_node))
         if type is ColumnReferenceType.FIXED:
-            return next(str(u[0]) for u in graph.query(f""" SELECT ?unit WHERE {{
-    ?amount a table:InterfaceObjectProperty ;
-        omx:isQuantityPropertyOf [ omx:hasNumericalValueProperty {column_node.n3()} ;
-            omx:hasFixedUnit ?unit ] . }}""")), ""
+            return next(str(unit) for quantity in quantities
+                for unit in graph.objects(quantity, OMX.hasFixedUnit)), ""
         elif type is ColumnReferenceType.COLUMN:
-            return next(str(u[0]) for u in graph.query(f""" SELECT ?unit WHERE {{
-    ?amount a table:InterfaceObjectProperty ;
-        omx:isQuantityPropertyOf [ omx:hasNumericalValueProperty {column_node.n3()} ;
-            omx:hasUnitProperty ?unit ] . }}""")), str(table_node)
+            return next(str(unit) for quantity in quantities
+                for unit in graph.objects(quantity, OMX.hasUnitProperty)), str(table_node)
         else:
-            return next(list(map(str, us)) for us in graph.query(f""" SELECT ?unit ?source WHERE {{
-    ?amount a table:InterfaceObjectProperty ;
-        omx:isQuantityPropertyOf [ omx:hasNumericalValueProperty {column_node.n3()} ;
-            omx:hasUnitProperty ?unit ] . 
-    ?unit rdfs:domain ?source . }}"""))
+            return next([str(unit), str(source)] for quantity in quantities
+                for unit in graph.objects(quantity, OMX.hasUnitProperty)
+                for source in graph.objects(unit, rdflib.RDFS.domain))
 
     @staticmethod
-    @with_lock
     def _is_reference(graph, column_node):
-        return bool(graph.query(f"""ASK {{ 
-    {column_node.n3()} owl3:dataTypePropertyChain ?x . 
-    ?x rdf:first ?not_quantity . 
-    FILTER NOT EXISTS {{ 
-        ?not_quantity a table:InterfaceObjectProperty ; 
-            rdfs:range om:Quantity . 
-    }}
-}}"""))
+        # a chain that does not start with a quantity property
+        return any(not ((first, rdflib.RDF.type, TABLE.InterfaceObjectProperty) in graph and
+                (first, rdflib.RDFS.range, OM.Quantity) in graph)
+            for _, first in TableDefinition._chain_heads(graph, column_node))
 
     @staticmethod
-    @with_lock
     def _is_table_reference(graph, column_node):
-        return bool(graph.query(f"""ASK {{ 
-    {column_node.n3()} owl3:dataTypePropertyChain ?x . 
-    ?x rdf:first ?refobject .
-    ?refobject rdfs:range ?schema .
-    ?schema a table:DataSchemaClass .
-}}"""))
+        return any((schema, rdflib.RDF.type, TABLE.DataSchemaClass) in graph
+            for _, object_reference in TableDefinition._chain_heads(graph, column_node)
+            for schema in graph.objects(object_reference, rdflib.RDFS.range))
 
     @staticmethod
-    @with_lock
     def _get_reference_uris(graph, column_node):
-        return next(list(map(str, r)) for r in graph.query(f"""SELECT ?object ?property WHERE {{
-    {column_node.n3()} owl3:dataTypePropertyChain ?x . 
-    ?x rdf:first ?objref ;
-        rdf:rest ?y .
-    ?y rdf:first ?property .
-    ?objref rdfs:range ?object .
+        return next([str(referenced_object), str(referenced_property)]
+            for chain, object_reference in TableDefinition._chain_heads(graph, column_node)
+            for rest in graph.objects(chain, rdflib.RDF.rest)
+            for referenced_property in graph.objects(rest, rdflib.RDF.first)
+            for referenced_object in graph.objects(object_reference, rdflib.RDFS.range))
 
-}}"""))
+    @staticmethod
+    def _referenced_classes(graph, column_node):
+        for _, object_reference in TableDefinition._chain_heads(graph, column_node):
+            yield from graph.objects(object_reference, rdflib.RDFS.range)
 
     @staticmethod
-    @with_lock
     def _get_reference_properties(graph, column_node):
-        return list(str(p[0]) for p in graph.query(f"""SELECT ?property WHERE {{
-    {column_node.n3()} owl3:dataTypePropertyChain ?x . 
-    ?x rdf:first ?objref .
-    ?objref rdfs:range ?object .
-    ?property rdfs:domain ?object .
-}}"""))
+        return list(str(p) for referenced_class in TableDefinition._referenced_classes(graph, column_node)
+            for p in graph.subjects(rdflib.RDFS.domain, referenced_class))
 
     @staticmethod
-    @with_lock
     def _get_referenced_objects(graph, column_node) -> List[dict]:
-        objects = list(str(r[0]) for r in graph.query(f"""SELECT ?object WHERE {{
-    {column_node.n3()} owl3:dataTypePropertyChain ?x . 
-    ?x rdf:first ?objref .
-    ?objref rdfs:range ?objclass .
-    ?object a ?objclass .
-}}"""))
-        properties = list(str(r[0]) for r in graph.query(f"""SELECT ?property WHERE {{
-    {column_node.n3()} owl3:dataTypePropertyChain ?x . 
-    ?x rdf:first ?objref .
-    ?objref rdfs:range ?objclass .
-    ?property rdfs:domain ?objclass .
-}}"""))
-        value_query = """SELECT ?value WHERE {{
-    {object} {property} ?value .
-}}"""
+        classes = list(TableDefinition._referenced_classes(graph, column_node))
+        objects = list(obj for referenced_class in classes
+            for obj in graph.subjects(rdflib.RDF.type, referenced_class))
+        properties = list(p for referenced_class in classes
+            for p in graph.subjects(rdflib.RDFS.domain, referenced_class))
         object_list = list()
         for obj in objects:
             object_dict = dict()
             for prop in properties:
-                property_value = list(str(r[0]) for r in graph.query(value_query.format(object=obj, property=prop)))
-                object_dict[prop] = property_value
+                object_dict[str(prop)] = list(str(value) for value in graph.objects(obj, prop))
             object_list.append(object_dict)
         return object_list
 
@@ -173,8 +146,6 @@ class TableDefinition:
 
     @staticmethod
     def from_graph(graph: rdflib.Graph, table_node: rdflib.URIRef) -> 'TableDefinition':
-        TABLE = rdflib.Namespace('http://www.foodvoc.org/resource/InternetOfFood/Table/')
-
         tableUri = str(table_node)
 
         tableColumns = []
@@ -202,8 +173,7 @@ class TableDefinition:
 
                 if columnUnitType == ColumnReferenceType.FIXED:
                     # also add unit label to fixed unit definition (for convenience)
-                    with lock:
-                        columnUnitLabel = Unit(columnUnitUri, internal=True).label
+                    columnUnitLabel = Unit(columnUnitUri, internal=True).label
 
             ## references ##
             referenceType = ColumnReferenceType.NONE
@@ -236,7 +206,7 @@ class TableDefinition:
         
         return TableDefinition(tableUri, tableColumns)
 
-@dataclass
+@dataclass(frozen=True)
 class ArgumentDefinition:
     uri: str
     name: str
@@ -257,7 +227,7 @@ class ArgumentDefinition:
         return ArgumentDefinition(argumentUri, argumentName, tableDefinition.uri, tableDefinition.columns)
 
     
-@dataclass
+@dataclass(frozen=True)
 class ModelInterfaceDefinition:
     uri: str
     inputs: List[ArgumentDefinition]
@@ -95,6 +95,8 @@ def update_model(model_id: str):
     model_info_db.is_connected = model_info_new.is_connected
     model_info_db.ontology_uri = model_info_new.ontology_uri
     model_info_db.gateway_url = model_info_new.gateway_url
+    model_info_db.version = model_info_new.version
+    model_info_db.deterministic = model_info_new.deterministic
 
     # model_info_with_params = GraphDbModelSchema().load(request.json)
     # graph_db_model = add_model(model_info_with_params.name, model_info_with_params.inputs,
@@ -1,7 +1,7 @@
 from datetime import datetime
 
 import requests
-from flask import Blueprint, request
+from flask import Blueprint, current_app, request
 from flask_jwt_extended import jwt_required, current_user
 from werkzeug.exceptions import abort
 
@@ -9,8 +9,10 @@ from common_data_access.dtos import ModelResultDtoSchema, ModelRunStatusDtoSchem
 from common_data_access.json_extension import get_json
 from model_sharing_backend.src.models.simulation import Simulation, ExecutedSimulation, \
     ExecutedSimulationDtoSchema, SimulationResultsDtoSchema, SimulationWithExecutionsSchema, \
-    SimulationStatusDtoSchema
-from model_sharing_backend.src.utils import model_runner, gateway_service
+    SimulationStatusDtoSchema, SimulationJobStatus
+from model_sharing_backend.src.utils import gateway_service, simulation_queue
+from model_sharing_backend.src.utils.parameter_sweep import ParameterSweep
+from model_sharing_backend.src.utils.simulation_scheduler import SimulationSchedule
 
 simulation_bp = Blueprint('Simulation', __name__)
 
@@ -101,6 +103,7 @@ def delete_simulation(simulation_id: str):
 def run_simulation(simulation_id: str):
     """
     Run one or more models on a product
+    The simulation is queued and run in the background, see simulation_status for its progress
     ---
     tags:
         -   Simulation
@@ -112,19 +115,23 @@ def run_simulation(simulation_id: str):
             description: id of simulation
             required: true
     responses:
-        200:
-            description: simulation submitted for run
+        202:
+            description: simulation queued for run
             schema:
                 $ref: '#/definitions/ExecutedSimulationDto'
+        400:
+            description: the sweep parameters of the simulation do not make up a sweep
         404:
             description: simulation not found or not owned by current user's company
-        400:
-            description: simulation execution failed
     """
     simulation = Simulation.query.get_owned_or_404(current_user.company_id, simulation_id)
-    simulation.models = simulation.models or []
-    executed_simulation = model_runner.run_simulation(simulation)
-    return get_json(executed_simulation, ExecutedSimulationDtoSchema)
+    try:
+        ParameterSweep(simulation, SimulationSchedule(simulation),
+                       current_app.config.get('SIMULATION_MAX_SCENARIOS', 1000))
+    except ValueError as e:
+        abort(400, description=str(e))
+    executed_simulation = simulation_queue.enqueue(simulation, current_user)
+    return get_json(executed_simulation, ExecutedSimulationDtoSchema), 202
 
 
 @simulation_bp.route('/simulation/<simulation_id>', methods=['PUT'])
@@ -160,6 +167,9 @@ def update_simulation(simulation_id: str):
     simulation_new = Simulation.SimulationDbSchema(context={'company_id': current_user.company_id}).load(request.json)
     simulation_db.name = simulation_new.name
     simulation_db.description = simulation_new.description
+    simulation_db.max_parallel_models = simulation_new.max_parallel_models
+    simulation_db.reuse_model_runs = simulation_new.reuse_model_runs
+    simulation_db.sweep_mode = simulation_new.sweep_mode
     
     simulation_db.data_sources = simulation_new.data_sources
     simulation_db.models = simulation_new.models
@@ -167,6 +177,9 @@ def update_simulation(simulation_id: str):
     for binding in simulation_new.bindings:
         binding.simulation_id = simulation_db.id
     simulation_db.bindings = simulation_new.bindings
+    for sweep_parameter in simulation_new.sweep_parameters or []:
+        sweep_parameter.simulation_id = simulation_db.id
+    simulation_db.sweep_parameters = simulation_new.sweep_parameters or []
     return get_json(simulation_db.update(), Simulation.SimulationDbSchema, {'company_id': current_user.company_id})
 
 
@@ -230,8 +243,14 @@ def get_simulation_results(simulation_execution_id: str):
     """
     executed_simulation = ExecutedSimulation.query.get_owned_or_404(current_user.company_id, simulation_execution_id)
     executed_simulation.results = []
+    # results by gateway and run, the scenarios of a parameter sweep share the runs of models they do not affect
+    fetched = dict()
     for executed_model in executed_simulation.executed_models:
-        if not executed_model.client_run_id:
+        run = (executed_model.model.gateway_url, executed_model.client_run_id)
+        if executed_model.client_run_id and run in fetched:
+            # results are generated classes (see BaseDto), a subclass shares the result and has its own model id
+            model_result = type(fetched[run].__name__, (fetched[run], ), dict())
+        elif not executed_model.client_run_id:
             model_result = ModelResultDtoSchema().load(
                 {'model_name': executed_model.model.name, 'result': [{'error': executed_model.error_message}],
                  'status': ModelRunStatus.FAILED.value, 'created_on': str(executed_model.created_on)})
@@ -239,6 +258,7 @@ def get_simulation_results(simulation_execution_id: str):
             try:
                 model_result = gateway_service.get_model_run_result(executed_model.model.gateway_url,
                                                                     executed_model.client_run_id)
+                fetched[run] = model_result
             except requests.RequestException as e:
                 model_result = ModelResultDtoSchema().load(
                     {'model_name': executed_model.model.name,
@@ -246,6 +266,7 @@ def get_simulation_results(simulation_execution_id: str):
                      'status': ModelRunStatus.UNREACHABLE.value, 'created_on': str(executed_model.created_on)})
 
         model_result.model_id = executed_model.model_id
+        model_result.scenario = executed_model.scenario
         executed_simulation.results.append(model_result)
     return get_json(executed_simulation, SimulationResultsDtoSchema)
 
@@ -267,16 +288,40 @@ def get_simulation_status(simulation_execution_id):
             required: true
     responses:
         200:
-            description: status of all models in the simulation
+            description: status of the simulation run (queued, running, done or failed) and of all models in it
             schema:
                 $ref: '#/definitions/SimulationStatusDto'
         404:
             description: simulation run was not found or not accessible
     """
     executed_simulation = ExecutedSimulation.query.get_owned_or_404(current_user.company_id, simulation_execution_id)
+    job = executed_simulation.job
     executed_simulation.model_statuses = []
+    if job is not None:
+        executed_simulation.status = job.status.value
+        executed_simulation.enqueued_on = job.enqueued_on
+        executed_simulation.started_on = job.started_on
+        executed_simulation.finished_on = job.finished_on
+        executed_simulation.error_message = job.error_message
+        if job.status in (SimulationJobStatus.QUEUED, SimulationJobStatus.RUNNING):
+            # models are stored when the simulation is done
+            status = ModelRunStatus.SUBMITTED if job.status == SimulationJobStatus.QUEUED else ModelRunStatus.RUNNING
+            for model in executed_simulation.simulation.models or []:
+                model_status = ModelRunStatusDtoSchema().load({'created_on': str(job.enqueued_on),
+                                                               'status': status.value})
+                model_status.model_id = model.id
+                executed_simulation.model_statuses.append(model_status)
+            return get_json(executed_simulation, SimulationStatusDtoSchema)
+    else:
+        # executed before simulations were queued
+        executed_simulation.status = SimulationJobStatus.DONE.value
+
     for executed_model in executed_simulation.executed_models:
-        if not executed_model.client_run_id:
+        if executed_model.status:
+            # as reported by the gateway when the model ran
+            model_status = ModelRunStatusDtoSchema().load(
+                {'created_on': str(executed_model.created_on), 'status': executed_model.status})
+        elif not executed_model.client_run_id:
             model_status = ModelRunStatusDtoSchema().load(
                 {'created_on': str(executed_model.created_on), 'status': ModelRunStatus.FAILED.value})
         else:
@@ -287,5 +332,6 @@ def get_simulation_status(simulation_execution_id):
                 model_status = ModelRunStatusDtoSchema().load(
                     {'created_on': str(executed_model.created_on), 'status': ModelRunStatus.UNREACHABLE.value})
         model_status.model_id = executed_model.model_id
+        model_status.scenario = executed_model.scenario
         executed_simulation.model_statuses.append(model_status)
     return get_json(executed_simulation, SimulationStatusDtoSchema)
@@ -1,29 +1,71 @@
 import sys
-from typing import Type
+import threading
+from typing import Dict, List, Type
+from urllib.parse import urlsplit
 import rdflib
 from rdflib.graph import Graph
 from rdflib.namespace import Namespace
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 
-from common_data_access.dtos import GatewayPaths, ModelResultDtoSchema, ModelRunStatusDtoSchema
+from common_data_access.dtos import GatewayPaths, ModelResultDtoSchema, ModelRunStatusBatchDtoSchema, \
+    ModelRunStatusDtoSchema
 from model_sharing_backend.src.models.simulation import ModelRunStatusWithModelIdDtoSchema
 from model_sharing_backend.src.ontology_services.data_structures import ArgumentDefinition, ColumnDefinition, ModelInterfaceDefinition, TableDefinition
+from model_sharing_backend.src.utils.phase_timer import DATA_FETCH, METADATA_PARSE, PhaseTimer
+
+
+# Sessions by gateway (scheme and host), so requests to the same gateway reuse their connections,
+# also when they are made from several threads at once
+__sessions: Dict[str, requests.Session] = dict()
+__sessions_lock = threading.Lock()
+# Connections kept open per gateway
+POOL_SIZE = 16
+
+
+def __session(url: str) -> requests.Session:
+    parts = urlsplit(url)
+    gateway = f'{parts.scheme}://{parts.netloc}'
+    session = __sessions.get(gateway)
+    if session is None:
+        with __sessions_lock:
+            session = __sessions.get(gateway)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                __sessions[gateway] = session
+    return session
 
 
 def request_model_run(gateway_url: str, data: any):
     try:
-        response_json = __make_request(f'{gateway_url.rstrip("/")}/{GatewayPaths.model_run}', requests.post, json=data)
+        response_json = __make_request(f'{gateway_url.rstrip("/")}/{GatewayPaths.model_run}', 'post', json=data)
         return ModelRunStatusDtoSchema().load(response_json)
     except requests.RequestException as e:
         print(f'error while communicating {gateway_url}. {str(e)}', file=sys.stdout)
         raise e
 
 
+def request_model_runs(gateway_url: str, data: List[any], timeout: float = 5) -> list:
+    # Several runs of a model in one request, returns the status of every run in the order of data
+    # The gateway answers once every run is done, so the timeout should grow with the number of runs.
+    # Raises a RequestException (e.g. a 404 response of gateways without the batch endpoint) if it fails
+    try:
+        response_json = __make_request(f'{gateway_url.rstrip("/")}/{GatewayPaths.model_run_batch}', 'post',
+                                       timeout=timeout, json={'runs': data})
+        return ModelRunStatusBatchDtoSchema().load(response_json).runs
+    except requests.RequestException as e:
+        print(f'error while communicating {gateway_url}. {str(e)}', file=sys.stdout)
+        raise e
+
+
 def get_model_run_result(gateway_url: str, run_id: str):
     try:
-        response_json = __make_request(f'{gateway_url.rstrip("/")}/{GatewayPaths.model_result}/{run_id}', requests.get)
+        response_json = __make_request(f'{gateway_url.rstrip("/")}/{GatewayPaths.model_result}/{run_id}', 'get')
         return ModelResultDtoSchema().load(response_json)
     except requests.RequestException as e:
         print(f'error while communicating {gateway_url}. {str(e)}', file=sys.stdout)
@@ -32,37 +74,48 @@ def get_model_run_result(gateway_url: str, run_id: str):
 
 def get_model_run_status(gateway_url: str, run_id: str):
     try:
-        response_json = __make_request(f'{gateway_url.rstrip("/")}/{GatewayPaths.model_status}/{run_id}', requests.get)
+        response_json = __make_request(f'{gateway_url.rstrip("/")}/{GatewayPaths.model_status}/{run_id}', 'get')
         return ModelRunStatusWithModelIdDtoSchema().load(response_json)
     except requests.RequestException as e:
         print(f'error while communicating {gateway_url}. {str(e)}', file=sys.stdout)
         raise e
 
 
-def fetch_data_source_data(gateway_url: str):
+def fetch_data_source_data(gateway_url: str, columns: List[str] = None, timer: PhaseTimer = None):
+    # Rows of a data source, only the given columns if set
     try:
-        return __make_request(f'{gateway_url.rstrip("/")}/data.json', requests.get)
+        with (timer or PhaseTimer()).phase(DATA_FETCH):
+            return __make_request(f'{gateway_url.rstrip("/")}/data.json', 'get',
+                params={'columns': columns} if columns else None)
     except requests.RequestException as e:
         print(f'error while communicating {gateway_url}. {str(e)}', file=sys.stdout)
         raise e
     
-def fetch_data_source_metadata(gateway_url: str, ontology_uri: str) -> TableDefinition:
-    return __parse_graph_node(__load_graph(gateway_url+'/ontology.ttl'),
-        ontology_uri, TableDefinition)
+def fetch_data_source_metadata(gateway_url: str, ontology_uri: str, timer: PhaseTimer = None) -> TableDefinition:
+    return __parse_graph_node(__load_graph(gateway_url+'/ontology.ttl', timer),
+        ontology_uri, TableDefinition, timer)
 
 def fetch_argument_definition(gateway_url: str, ontology_uri: str) -> ArgumentDefinition:
     return __parse_graph_node(__load_graph(gateway_url+'/ontology.ttl'),
         ontology_uri, ArgumentDefinition)
 
-def fetch_model_interface_definition(gateway_url: str, ontology_uri: str) -> ModelInterfaceDefinition:
-    return __parse_graph_node(__load_graph(gateway_url+'/ontology.ttl'),
-        ontology_uri, ModelInterfaceDefinition)
+def fetch_model_interface_definition(gateway_url: str, ontology_uri: str,
+    timer: PhaseTimer = None) -> ModelInterfaceDefinition:
+    return __parse_graph_node(__load_graph(gateway_url+'/ontology.ttl', timer),
+        ontology_uri, ModelInterfaceDefinition, timer)
 
-def __parse_graph_node(graph: Graph, ontology_uri: str, node_type: Type):
-    return node_type.from_graph(graph, rdflib.URIRef(ontology_uri))
+def __parse_graph_node(graph: Graph, ontology_uri: str, node_type: Type, timer: PhaseTimer = None):
+    with (timer or PhaseTimer()).phase(METADATA_PARSE):
+        return node_type.from_graph(graph, rdflib.URIRef(ontology_uri))
 
-def __load_graph(graph_url: str) -> Graph:
-    graph = rdflib.Graph().parse(location=graph_url, format="turtle")
+def __load_graph(graph_url: str, timer: PhaseTimer = None) -> Graph:
+    # downloaded through the pooled session of the gateway, rdflib would open a new connection
+    timer = timer or PhaseTimer()
+    with timer.phase(DATA_FETCH):
+        response = __session(graph_url).get(graph_url, timeout=5)
+        response.raise_for_status()
+    with timer.phase(METADATA_PARSE):
+        graph = rdflib.Graph().parse(data=response.content.decode('utf-8'), format="turtle")
     # TODO potentially handle imports if those are encountered
     
     # add namespaces used in queries
@@ -80,9 +133,9 @@ def __load_graph(graph_url: str) -> Graph:
 
     return graph
 
-def __make_request(url: str, method: any, **kwargs):
+def __make_request(url: str, method: str, timeout: float = 5, **kwargs):
     try:
-        response = method(url, timeout=5, **kwargs)
+        response = __session(url).request(method, url, timeout=timeout, **kwargs)
         response.raise_for_status()
         return response.json()
     except (requests.RequestException, requests.HTTPError) as e:
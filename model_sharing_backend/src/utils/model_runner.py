@@ -1,12 +1,18 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, Generator, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import requests, sys
-from flask_jwt_extended import current_user
-from unit_translation_component import Unit, Values
+from flask import current_app
+from unit_translation_component import ConversionPlan, Unit, Values
 from unit_translation_component.exception import GenericException
 
-from common_data_access.dtos import RunModelDtoSchema
+from common_data_access.dtos import ModelRunStatus, RunModelDtoSchema
 from model_sharing_backend.src.graph_db.model_data_structure import GraphDbModelParameter
 from model_sharing_backend.src.graph_db.queries.query_model import get_model
 from model_sharing_backend.src.graph_db.queries.query_runner import SparQlRunner
@@ -15,165 +21,593 @@ from model_sharing_backend.src.models.model_info import ModelInfo
 from model_sharing_backend.src.models.simulation import ArgumentBinding, ExecutedModel, ExecutedModelDtoSchema, ExecutedSimulation, ExecutedSimulationDtoSchema, Simulation, SimulationBindingTypes
 from model_sharing_backend.src.ontology_services.data_structures import ColumnReferenceType, TableDefinition
 from model_sharing_backend.src.utils import gateway_service
+from model_sharing_backend.src.utils.parameter_sweep import ParameterSweep, Variant
+from model_sharing_backend.src.utils.phase_timer import GATEWAY_REQUEST, PERSISTENCE, RESULT_FETCH, TOTAL, \
+    UNIT_CONVERSION, PhaseTimer
+from model_sharing_backend.src.utils.simulation_scheduler import SimulationSchedule
 
 
-def run_simulation(simulation: Simulation):
-    executed_simulation = ExecutedSimulation(created_by=current_user, created_on=datetime.utcnow(),
-                                             owner=current_user.company, simulation_id=simulation.id,
-                                             executed_models=[])
+class SimulationCancelledException(Exception):
+    """Raised when a simulation is cancelled while it runs, nothing of the execution is stored"""
 
-    complete_models_list: List[ModelInfo] = []
 
-    simulation_data: Dict = dict()
-    # make data structure for holding data and model results
-    for data_source in simulation.data_sources:
-        data = gateway_service.fetch_data_source_data(data_source.gateway_url)
-        metadata = gateway_service.fetch_data_source_metadata(data_source.gateway_url, data_source.ontology_uri)
-        
-        simulation_data[data_source.ontology_uri] = dict(
-            data=data,
-            metadata=metadata
-        )
+def run_simulation(simulation: Simulation, executed_simulation: ExecutedSimulation,
+    cancelled: threading.Event = None) -> ExecutedSimulation:
+    # Run the models of a simulation for an execution (see simulation_queue), on behalf of the user that created it
+    # Does not need a request, only an application context. Once cancelled is set no other model is started and
+    # SimulationCancelledException is raised instead of storing the execution.
+    return SimulationRunner(simulation, executed_simulation, cancelled).run()
+
+
+class SimulationRunner:
+    # One execution of a simulation (see run_simulation)
+    # Every model is attempted once per variant (the values of the sweep parameters that affect it, see ParameterSweep),
+    # as soon as the models and the data sources it depends on are available. Data sources are fetched at the same time
+    # when the simulation starts (the metadata first, so only the columns that are used are requested) and are shared
+    # by all scenarios; models that do not depend on each other run at the same time. Both run on bounded pools of
+    # workers that only talk to the gateways, the event loop (run) handles everything else. The interface definitions
+    # of models whose outputs are used by other models are fetched with the data sources, so running such a model and
+    # getting its outputs back is a single request. The variants of a model are sent to its gateway in batches
+    # (SIMULATION_SWEEP_BATCH_SIZE runs per request). Deterministic models that ran before with the same inputs are not
+    # run again, their earlier run is reused (unless the simulation opts out), so only models downstream of a change
+    # are run.
+
+    def __init__(self, simulation: Simulation, executed_simulation: ExecutedSimulation,
+        cancelled: threading.Event = None):
+        self.simulation = simulation
+        self.executed_simulation = executed_simulation
+        self.cancelled = cancelled or threading.Event()
+        self.run_by = executed_simulation.created_by
+        self.started = time.perf_counter()
+        # time spent per phase, see phase_timer
+        self.timer = PhaseTimer()
+
+        # order the models by their bindings, models that can not run are known before any gateway is called
+        self.schedule = SimulationSchedule(simulation)
+        # scenarios of a parameter sweep, a model runs once per variant: the values of the parameters that affect it
+        self.sweep = ParameterSweep(simulation, self.schedule,
+                                    current_app.config.get('SIMULATION_MAX_SCENARIOS', 1000))
+        self.variants = {model.id: self.sweep.variants(model) for model in simulation.models}
+
+        self.reuse_model_runs = simulation.reuse_model_runs is not False
+        self.max_parallel_models = simulation.max_parallel_models or \
+            current_app.config.get('SIMULATION_MAX_PARALLEL_MODELS', 4)
+        self.max_parallel_fetches = current_app.config.get('SIMULATION_MAX_PARALLEL_FETCHES', 8)
+        self.batch_size = current_app.config.get('SIMULATION_SWEEP_BATCH_SIZE', 50)
+        self.run_timeout = current_app.config.get('SIMULATION_SWEEP_RUN_TIMEOUT', 5.0)
+
+        schedule = self.schedule
+        self.data_sources = {str(data_source.ontology_uri): data_source for data_source in simulation.data_sources
+                             if str(data_source.ontology_uri) in schedule.required_data_sources()}
+        self.chained_models = [model for model in schedule.order if schedule.dependants[model.id]]
+        self.position = {model.id: i for i, model in enumerate(schedule.order)}
+        # what every model waits for: models, data source URIs and the interface definition of chained models
+        self.waiting = {model.id: schedule.dependencies[model.id] | schedule.data_sources[model.id]
+                        for model in schedule.order}
+        for model in self.chained_models:
+            self.waiting[model.id].add(('interface', model.id))
+        self.ready = [model for model in schedule.order if not self.waiting[model.id]]
+        # variants of every model that did not complete yet
+        self.pending = {model.id: len(self.variants[model.id]) for model in schedule.order}
+        # work on the pools: (model, runs, timer) by future of a model run and (URI, part) by future of a fetch
+        self.running = dict()
+        self.fetching = dict()
+        # executed model of every variant of a model, by model id and variant
+        self.executed_models: Dict = dict()
+        # (model id, variant) of the failed runs
+        self.failed_models = set()
+        self.failed_data_sources = dict()
+        # gateways that can not run batches, their models are run one variant at a time
+        self.unbatched_gateways = set()
+        # data by data source URI, shared by all scenarios
+        self.simulation_data: Dict = dict()
+        # outputs (by output URI) by model id and variant, for use by other models
+        self.model_outputs: Dict = dict()
+        # output definitions by argument name of the chained models
+        self.output_definitions: Dict = dict()
+
+        self.__fail_unscheduled_models()
+
+    def run(self) -> ExecutedSimulation:
+        with ThreadPoolExecutor(max_workers=self.max_parallel_models) as self.pool, \
+                ThreadPoolExecutor(max_workers=max(1, min(len(self.data_sources) + len(self.chained_models),
+                                                          self.max_parallel_fetches))) as self.fetch_pool:
+            self.__start_fetches()
+            while self.ready or self.running or self.fetching:
+                dispatch = sorted(self.ready, key=lambda m: self.position[m.id])
+                self.ready.clear()
+                for model in dispatch:
+                    self.__start_model(model)
+
+                if not (self.running or self.fetching):
+                    continue
+                done, _ = wait(set(self.running) | set(self.fetching), return_when=FIRST_COMPLETED)
+                for future in sorted((f for f in done if f in self.fetching),
+                                     key=lambda f: tuple(map(str, self.fetching[f]))):
+                    self.__fetched(future)
+                for future in sorted((f for f in done if f in self.running),
+                                     key=lambda f: (self.position[self.running[f][0].id], self.running[f][1][0][0])):
+                    self.__ran(future)
+
+        self.__collect_executed_models()
+        return self.__persist()
+
+    def __check_cancelled(self):
+        # stop before anything else is started or stored, the runs that are not started yet are dropped
+        if self.cancelled.is_set():
+            for future in list(self.running) + list(self.fetching):
+                future.cancel()
+            raise SimulationCancelledException('the simulation was cancelled while it ran')
+
+    def __fail_unscheduled_models(self):
+        # models that can not run (see SimulationSchedule) fail in every variant
+        for model in self.simulation.models:
+            if model.id in self.schedule.errors:
+                print("model", model.name, "can not run:", self.schedule.errors[model.id], file=sys.stderr)
+                for variant in self.variants[model.id]:
+                    self.executed_models[(model.id, variant)] = ExecutedModel(
+                        error_message=f"Not all input data available for this model: {self.schedule.errors[model.id]}",
+                        status=ModelRunStatus.FAILED.value,
+                        created_on=datetime.utcnow(),
+                        model_id=model.id,
+                    )
+
+    # scheduling
+
+    def __available(self, dependency, dependants: Iterable[str]):
+        for dependant in dependants:
+            self.waiting[dependant].discard(dependency)
+            if not self.waiting[dependant]:
+                self.ready.append(self.schedule.models[dependant])
+
+    def __complete(self, model: ModelInfo, variant: Variant, executed_model: ExecutedModel, failed: bool):
+        self.executed_models[(model.id, variant)] = executed_model
+        if failed:
+            self.failed_models.add((model.id, variant))
+        if executed_model.client_run_id is None:
+            executed_model.status = ModelRunStatus.FAILED.value
+        self.pending[model.id] -= 1
+        if not self.pending[model.id]:
+            self.__available(model.id, self.schedule.dependants[model.id])
+
+    def __start_model(self, model: ModelInfo):
+        # prepare the runs of every variant of a model that is ready, reuse earlier runs and submit the others
+        self.__check_cancelled()
+        print("running model", model.name, "for", len(self.variants[model.id]), "variants", file=sys.stderr)
+        # check access rights
+        permitted = model.owner_id == self.run_by.company_id or any(
+            filter(lambda p: p.company_id == self.run_by.company_id, model.permissions))
+        runs = []
+        for variant in self.variants[model.id]:
+            reason = self.__missing_input(model, variant)
+            if reason is not None:
+                self.__complete(model, variant, ExecutedModel(
+                    error_message=f"Not all input data available for this model: {reason}",
+                    created_on=datetime.utcnow(),
+                    model_id=model.id,
+                ), True)
+                continue
+            if not permitted:
+                self.__complete(model, variant, ExecutedModel(
+                    error_message="No permission to run this model",
+                    created_on=datetime.utcnow(),
+                    model_id=model.id,
+                ), True)
+                continue
+
+            executed_model, run_model_json = prepare_model_run(model, self.schedule.model_bindings(model),
+                self.__model_data(model, variant), self.run_by.username, self.simulation.id,
+                bool(self.schedule.dependants[model.id]), self.sweep.input_values(model, variant))
+            if run_model_json is None:
+                self.__complete(model, variant, executed_model, True)
+                continue
+            executed_model.input_hash = model_run_hash(model, run_model_json)
+            if not self.__reuse(model, variant, executed_model, run_model_json):
+                runs.append((variant, executed_model, run_model_json))
+        if runs:
+            self.__submit(model, runs)
 
-    print("entering while loop for simu")
-    previous_complete_length = 0
-    while len(complete_models_list) < len(simulation.models): 
-        print("loop", len(complete_models_list), len(simulation.models), file=sys.stderr)
-        # loop over incomplete models
-        for incomplete_model in (model for model in simulation.models if 
-        not any((c_model.id == model.id for c_model in complete_models_list))):
-            print("running model", incomplete_model.name, file=sys.stderr)
-            print("simulation_data", simulation_data.keys(), file=sys.stderr)
+    def __missing_input(self, model: ModelInfo, variant: Variant) -> Optional[str]:
+        # why a model can not run in a variant: a failed dependency (in the same scenarios) or data source
+        schedule = self.schedule
+        failed_dependency = schedule.failed_dependency(model, {
+            dependency for dependency in schedule.dependencies[model.id]
+            if (dependency, self.sweep.dependency_variant(schedule.models[dependency], variant)) in self.failed_models})
+        if failed_dependency is not None:
+            return f'model {failed_dependency.name} failed'
+        failed_data_source = next((uri for uri in sorted(schedule.data_sources[model.id])
+                                   if uri in self.failed_data_sources), None)
+        if failed_data_source is not None:
+            return f'data source {failed_data_source} not available. {self.failed_data_sources[failed_data_source]}'
+        return None
+
+    def __model_data(self, model: ModelInfo, variant: Variant) -> Dict:
+        # data sources and the outputs of the dependencies of a model in the same scenarios
+        data = dict(self.simulation_data)
+        for dependency in self.schedule.dependencies[model.id]:
+            dependency_variant = self.sweep.dependency_variant(self.schedule.models[dependency], variant)
+            data.update(self.model_outputs.get((dependency, dependency_variant)) or {})
+        return data
+
+    # reuse of earlier runs
+
+    def __reuse(self, model: ModelInfo, variant: Variant, executed_model: ExecutedModel, run_model_json: Dict) -> bool:
+        # use an earlier run of a deterministic model with the same inputs, False if the model has to run
+        reused = find_reusable_run(model, executed_model.input_hash) if self.reuse_model_runs else None
+        if reused is None:
+            return False
+        print("reusing run", reused.client_run_id, "of model", model.name, file=sys.stderr)
+        executed_model.reused_from_id = reused.id
+        executed_model.client_run_id = reused.client_run_id
+        executed_model.status = reused.status
+        if not self.schedule.dependants[model.id]:
+            self.__complete(model, variant, executed_model, False)
+            return True
+        # the outputs are needed by other models
+        model_timer = PhaseTimer()
+        future = self.pool.submit(reuse_model_run, model.gateway_url, reused.client_run_id, run_model_json,
+                                  self.output_definitions.get(model.id), model_timer)
+        self.running[future] = (model, [(variant, executed_model, run_model_json)], model_timer)
+        return True
+
+    # batching
+
+    def __submit(self, model: ModelInfo, runs: List[Tuple[Variant, ExecutedModel, Dict]]):
+        # run the variants of a model on its gateway, in batches unless the gateway can not run those
+        self.__check_cancelled()
+        definitions = self.output_definitions.get(model.id) if self.schedule.dependants[model.id] else None
+        if len(runs) == 1 or model.gateway_url in self.unbatched_gateways:
+            for variant, executed_model, run_model_json in runs:
+                model_timer = PhaseTimer()
+                self.running[self.pool.submit(run_model_on_gateway, model.gateway_url, run_model_json, definitions,
+                                              model_timer)] = \
+                    (model, [(variant, executed_model, run_model_json)], model_timer)
+            return
+        for start in range(0, len(runs), self.batch_size):
+            batch = runs[start:start + self.batch_size]
+            model_timer = PhaseTimer()
+            self.running[self.pool.submit(run_model_batch_on_gateway, model.gateway_url,
+                                          [run_model_json for _, _, run_model_json in batch], definitions,
+                                          self.run_timeout * len(batch), model_timer)] = (model, batch, model_timer)
+
+    def __ran(self, future):
+        # handle the result of a model run or a batch of runs
+        model, runs, model_timer = self.running.pop(future)
+        results = future.result()
+        if results is None:
+            # the gateway can not run batches, run the variants one at a time
+            print("gateway", model.gateway_url, "does not run batches", file=sys.stderr)
+            self.unbatched_gateways.add(model.gateway_url)
+            self.__submit(model, runs)
+            return
+        results = results if isinstance(results, list) else [results]
+        for (variant, executed_model, _), result in zip(runs, results):
+            client_run_id, status, error_message, outputs = result
+            # the runs of a batch share the time of its request
+            for phase in (GATEWAY_REQUEST, RESULT_FETCH):
+                seconds = model_timer.get(phase)
+                setattr(executed_model, f'{phase}_seconds', seconds / len(runs) if seconds is not None else None)
+            if executed_model.client_run_id != client_run_id:
+                # the result of the reused run was no longer available, the model ran again
+                executed_model.reused_from_id = None
+            executed_model.client_run_id = client_run_id
+            executed_model.status = status
+            executed_model.error_message = error_message
+            # keep the model results (for use by other models)
+            self.model_outputs[(model.id, variant)] = outputs
+            self.__complete(model, variant, executed_model,
+                client_run_id is None or (outputs is None and bool(self.schedule.dependants[model.id])))
+
+    # fetching data sources and interface definitions
+
+    def __start_fetches(self):
+        for uri, data_source in self.data_sources.items():
+            self.simulation_data[uri] = dict()
+            self.fetching[self.fetch_pool.submit(gateway_service.fetch_data_source_metadata, data_source.gateway_url,
+                                                 data_source.ontology_uri, self.timer)] = (uri, 'metadata')
+        for model in self.chained_models:
+            self.fetching[self.fetch_pool.submit(gateway_service.fetch_model_interface_definition,
+                                                 model.gateway_url + '/api', model.ontology_uri, self.timer)] = \
+                (model.id, 'interface')
+
+    def __fetched(self, future):
+        # handle fetched metadata or data of a data source or the interface definition of a model
+        uri, part = self.fetching.pop(future)
+        if part == 'interface':
+            # uri is the id of the model
             try:
-                # check access rights
-                if incomplete_model.owner_id == current_user.company_id or any(
-                filter(lambda p: p.company_id == current_user.company_id, incomplete_model.permissions)):
-                    executed_model = run_model(incomplete_model, 
-                        (binding for binding in simulation.bindings if binding.model_uri == incomplete_model.ontology_uri), 
-                        simulation_data, current_user.username, simulation.id)
-                    executed_simulation.executed_models.append(executed_model)
-                    complete_models_list.append(incomplete_model)
-                    
-                    # add model results to simulation_data (for use by other models)
-                    model_results = gateway_service.get_model_run_result(incomplete_model.gateway_url,
-                        executed_model.client_run_id)
-                    model_metadata = gateway_service.fetch_model_interface_definition(incomplete_model.gateway_url + '/api', 
-                        incomplete_model.ontology_uri)
-                    for argument_name in model_results.result:
-                        # get data and models per-argument from model_results and model_metadata
-                        print("handling model output", argument_name, file=sys.stderr)
-                        argument_data = model_results.result[argument_name]
-                        argument_meta = next(md for md in model_metadata.outputs if str(md.name) == argument_name)
-                        argument_uri = argument_meta.uri
-                        argument_metadata = TableDefinition(
-                            uri=argument_meta.type_uri, # type uri!
-                            columns=argument_meta.columns) 
-
-                        simulation_data[argument_uri] = dict(
-                            data=argument_data,
-                            metadata=argument_metadata
-                        )
-            except KeyError as ex:
-                print(f"data (not yet) available when trying to run {incomplete_model.name}; skipping", 
-                    file=sys.stderr)
-                print(ex, file=sys.stderr)
-                pass
+                self.output_definitions[uri] = {str(md.name): md for md in future.result().outputs}
             except Exception as ex:
-                raise Exception from ex
-                pass #handle problem with preparing inputs (incomplete data for example)
-        if len(complete_models_list) <= previous_complete_length:
-            print("some models left that do not complete; failing them")
-            # if no more models completed this loop, cancel remaining and set errors
-            for incomplete_model in (model for model in simulation.models if 
-            not any((c_model.id == model.id for c_model in complete_models_list))):
-                failed_model = ExecutedModel(
-                    error_message="Not all input data available for this model",
-                    created_on=datetime.utcnow(),
-                    model_id=incomplete_model.id,
-                )
-                executed_simulation.executed_models.append(failed_model)
-            break
-        else:
-            print("completed new models this round")
-            previous_complete_length = len(complete_models_list)
-    print("no more model rounds")
-    print(ExecutedSimulationDtoSchema().dumps(executed_simulation))
-    return executed_simulation.save()
-    # get list of models to run (incomplete)
-    # make data structure containing all data related to simulation [grouped by source] -> [with metadata!]
-    # {
-    #   source: {
-    #       data: [{...},...], <- fetched (gateway_service.py)
-    #       metadata: {...} <- interpreted ontology (data_structures.py)
-    #   }  
-    # }
-        # "fixed" sources (part of simulation definition)
-        # TODO data sources
-        # TODO model outputs (filled in once model is completed)
-    # TODO loop over incomplete model list:
-        # get simulation bindings of model
-        # check whether data for all bindings is available =!> skip model for next run
-        # build model input data using bindings
-        # run model with input data
-        # TODO store model output in data structure
-    # leave loop with error if no models have all data available
-
-    # get all bindings
-    # fill all bindings (if possible)
-        # if multiple columns from same source, then use label (ie "primary key") and match the others
-        # also add extra information based on ontology (InterfaceProperties)
-            # might require extra data sources other than the ones selected for the simulation!
-        # ... implicit parameters not part of binding(?) (property - value - UNIT)
-    # loop until all models complete:
-        # run models that have completed bindings
-        # update bindings with model results
-
-
-def run_model(model: ModelInfo, model_bindings: Generator[ArgumentBinding, None, None], available_data: Dict,
+                print(f"interface of model {self.schedule.models[uri].name} not available", ex, file=sys.stderr)
+            self.__available(('interface', uri), [uri])
+            return
+        try:
+            self.simulation_data[uri][part] = future.result()
+        except Exception as ex:
+            print(f"{part} of data source {uri} not available", ex, file=sys.stderr)
+            self.failed_data_sources.setdefault(uri, str(ex))
+        if part == 'metadata' and uri not in self.failed_data_sources:
+            columns = data_source_columns(uri, self.simulation_data[uri]['metadata'],
+                (binding for model in self.schedule.order for binding in self.schedule.model_bindings(model)))
+            self.fetching[self.fetch_pool.submit(gateway_service.fetch_data_source_data,
+                                                 self.data_sources[uri].gateway_url, columns, self.timer)] = \
+                (uri, 'data')
+        if {'data', 'metadata'} <= self.simulation_data[uri].keys() or uri in self.failed_data_sources and \
+                not any(fetched_uri == uri for fetched_uri, _ in self.fetching.values()):
+            # data and metadata arrived (or failed), models reading only available sources can start
+            self.__available(uri, (model.id for model in self.schedule.order
+                                   if uri in self.schedule.data_sources[model.id]))
+
+    # scenarios, timings and persistence
+
+    def __collect_executed_models(self):
+        # executed models are listed by scenario in the order of the simulation, whatever order they completed in;
+        # the other scenarios of a variant get a copy of the executed model of its first scenario
+        executed_simulation = self.executed_simulation
+        executed_simulation.executed_models = []
+        for scenario in range(len(self.sweep.scenarios)):
+            for model in self.simulation.models:
+                variant = self.sweep.variant(model, scenario)
+                executed_model = self.executed_models[(model.id, variant)]
+                if self.sweep.is_sweep():
+                    executed_model = executed_model if self.variants[model.id][variant][0] == scenario else \
+                        self.__scenario_copy(executed_model)
+                    executed_model.scenario = scenario
+                executed_simulation.executed_models.append(executed_model)
+        executed_simulation.scenarios = self.sweep.scenarios if self.sweep.is_sweep() else None
+
+    def __persist(self) -> ExecutedSimulation:
+        self.__check_cancelled()
+        executed_simulation = self.executed_simulation
+        for executed_model in executed_simulation.executed_models:
+            for phase in ExecutedModel.PHASES:
+                if getattr(executed_model, f'{phase}_seconds', None) is not None:
+                    self.timer.add(phase, getattr(executed_model, f'{phase}_seconds'))
+        with self.timer.phase(PERSISTENCE):
+            executed_simulation.save()
+        # the timings are stored after the executed models, so the time it took to store those is known
+        self.timer.add(TOTAL, time.perf_counter() - self.started)
+        for phase in ExecutedSimulation.PHASES:
+            setattr(executed_simulation, f'{phase}_seconds', self.timer.get(phase))
+        print(ExecutedSimulationDtoSchema().dumps(executed_simulation))
+        return executed_simulation.update()
+
+    @staticmethod
+    def __scenario_copy(executed_model: ExecutedModel) -> ExecutedModel:
+        # Executed model of another scenario of a parameter sweep that shares the run of executed_model
+        return ExecutedModel(model_id=executed_model.model_id, created_on=executed_model.created_on,
+                             client_run_id=executed_model.client_run_id, status=executed_model.status,
+                             error_message=executed_model.error_message, warning_message=executed_model.warning_message,
+                             input_hash=executed_model.input_hash,
+                             reused_from_id=executed_model.id if executed_model.client_run_id else None)
+
+
+def data_source_columns(data_source_uri: str, metadata: TableDefinition,
+    bindings: Iterable[ArgumentBinding]) -> Optional[List[str]]:
+    # Columns of a data source used by the bindings: the bound columns, the join key columns and the
+    # columns holding their units. None (all columns) if a binding does not name its column.
+    columns = set()
+    for binding in bindings:
+        # sources joined on a key without a source_key_column_name use the column bound to the key (see __join_columns)
+        key_binding = None
+        if binding.join_key and len({cb.source_argument_uri for cb in binding.columns
+                                     if cb.source_type != SimulationBindingTypes.INPUT}) > 1:
+            key_binding = next((cb for cb in binding.columns if cb.target_column.name == binding.join_key), None)
+        for column_binding in binding.columns:
+            if column_binding.source_type != SimulationBindingTypes.DATA_SOURCE or \
+                    str(column_binding.source_argument_uri) != data_source_uri:
+                continue
+            if not column_binding.source_column_name:
+                return None
+            columns.add(column_binding.source_column_name)
+            if column_binding.source_key_column_name:
+                columns.add(column_binding.source_key_column_name)
+            elif key_binding is not None and key_binding.source_column_name:
+                columns.add(key_binding.source_column_name)
+    for column in metadata.columns:
+        if str(column.name) in columns and column.unit_type is ColumnReferenceType.COLUMN:
+            columns.update(str(cd.name) for cd in metadata.columns if str(cd.uri) == str(column.unit_uri))
+    return sorted(columns)
+
+
+def run_model(model: ModelInfo, model_bindings: Iterable[ArgumentBinding], available_data: Dict,
     run_by: str, simulation_id: str) -> ExecutedModel:
+    executed_model, run_model_json = prepare_model_run(model, model_bindings, available_data, run_by, simulation_id)
+    if run_model_json is not None:
+        timer = PhaseTimer()
+        executed_model.client_run_id, executed_model.status, executed_model.error_message, _ = \
+            run_model_on_gateway(model.gateway_url, run_model_json, None, timer)
+        executed_model.gateway_request_seconds = timer.get(GATEWAY_REQUEST)
+    if executed_model.client_run_id is None:
+        executed_model.status = ModelRunStatus.FAILED.value
+    return executed_model
+
+
+def model_run_hash(model: ModelInfo, run_model_json: Dict) -> str:
+    # Hash of the model (and its version) and the inputs of a run, the same for every run with the same inputs
+    # The other fields of the request (who runs it, when, in which simulation) are left out
+    content = json.dumps({'model': model.ontology_uri, 'version': model.version, 'data': run_model_json['data']},
+                         sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def find_reusable_run(model: ModelInfo, input_hash: str) -> Optional[ExecutedModel]:
+    # Latest successful run of a deterministic model with the same inputs, None if the model has to run
+    if not model.deterministic:
+        return None
+    return ExecutedModel.query.filter(ExecutedModel.model_id == model.id, ExecutedModel.input_hash == input_hash,
+                                      ExecutedModel.status == ModelRunStatus.SUCCESS.value,
+                                      ExecutedModel.client_run_id.isnot(None), ExecutedModel.error_message.is_(None)) \
+        .order_by(ExecutedModel.created_on.desc()).first()
+
+
+def prepare_model_run(model: ModelInfo, model_bindings: Iterable[ArgumentBinding], available_data: Dict,
+    run_by: str, simulation_id: str, include_result: bool = False,
+    input_values: Dict[Tuple[str, str], str] = None) -> Tuple[ExecutedModel, Optional[Dict]]:
+    # Build the request to run a model, the request is None (and the error set) if the inputs can not be prepared
+    # With include_result the gateway returns the result with the run status, input_values replace the values of
+    # input columns (see prepare_model_inputs)
     executed_model = ExecutedModel(model_id=model.id, created_on=datetime.utcnow())
+    started = time.perf_counter()
+    timer = PhaseTimer()
+    run_model_json = None
     try:
-        params = prepare_model_inputs(model_bindings, available_data)
+        warnings = []
+        params = model_input_rows(prepare_model_inputs(model_bindings, available_data, warnings, timer,
+                                                       input_values))
+        executed_model.warning_message = '\n'.join(warnings) or None
         run_model_json = RunModelDtoSchema().dump({
             'simulation_id': simulation_id,
             'created_on': datetime.utcnow(),
             'created_by': run_by,
+            'include_result': include_result,
             'data': params
         })
-        run_status = gateway_service.request_model_run(model.gateway_url, run_model_json)
-        executed_model.client_run_id = run_status.run_id
     except ValueError as e:
         executed_model.error_message = str(e)
-    except requests.RequestException as e:
-        executed_model.error_message = f'unable to reach model gateway at {model.gateway_url}. {str(e)}. {str(e.response.content)}. {str(e.request.body)}'
+    except KeyError as e:
+        executed_model.error_message = f'input data not available: {str(e)}'
     except GenericException as e:
         executed_model.error_message = \
             f'error occurred during normalization process. Error code: {e.error}. Error message: "{e.message}"'
+    # unit conversions are part of the input preparation, but timed on their own
+    executed_model.unit_conversion_seconds = timer.get(UNIT_CONVERSION) or 0.0
+    executed_model.input_preparation_seconds = time.perf_counter() - started - executed_model.unit_conversion_seconds
+    return executed_model, run_model_json
 
-    return executed_model
 
+def run_model_on_gateway(gateway_url: str, run_model_json: Dict, output_definitions: Optional[Dict],
+    timer: PhaseTimer = None) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[Dict]]:
+    # Request a model run, returns (run id, run status, error message, outputs by output argument URI)
+    # Outputs are only made when output_definitions (by argument name) is given, the result is returned by the
+    # run request itself (see include_result), gateways that do not return it are asked for it.
+    # Runs on a worker thread, so it only talks to the gateway and leaves the database alone
+    timer = timer or PhaseTimer()
+    try:
+        with timer.phase(GATEWAY_REQUEST):
+            run_status = gateway_service.request_model_run(gateway_url, run_model_json)
+    except requests.RequestException as e:
+        response = e.response.content if e.response is not None else ''
+        body = e.request.body if e.request is not None else ''
+        return None, ModelRunStatus.FAILED.value, \
+            f'unable to reach model gateway at {gateway_url}. {str(e)}. {str(response)}. {str(body)}', None
+    return __run_outputs(gateway_url, run_status, output_definitions, timer)
+
+
+def run_model_batch_on_gateway(gateway_url: str, run_model_jsons: List[Dict], output_definitions: Optional[Dict],
+    timeout: float, timer: PhaseTimer = None) -> Optional[List[Tuple]]:
+    # Request several runs of a model at once, returns the result of every run (see run_model_on_gateway) in the
+    # order of the requests, None if the gateway can not run batches. If the gateway does not answer within the
+    # timeout every run of the batch fails: the gateway may still complete them, but their ids are lost with the
+    # response (so they are not requested again, which could run them twice).
+    timer = timer or PhaseTimer()
+    try:
+        with timer.phase(GATEWAY_REQUEST):
+            run_statuses = gateway_service.request_model_runs(gateway_url, run_model_jsons, timeout)
+    except requests.ReadTimeout:
+        return [(None, ModelRunStatus.FAILED.value, f'model gateway at {gateway_url} did not answer a batch of '
+                 f'{len(run_model_jsons)} runs within {timeout:g} seconds (SIMULATION_SWEEP_RUN_TIMEOUT per run), '
+                 'the results of the runs are unknown', None)] * len(run_model_jsons)
+    except requests.RequestException as e:
+        if e.response is not None and e.response.status_code in (404, 405):
+            return None
+        response = e.response.content if e.response is not None else ''
+        return [(None, ModelRunStatus.FAILED.value,
+                 f'unable to reach model gateway at {gateway_url}. {str(e)}. {str(response)}', None)] * \
+            len(run_model_jsons)
+    if len(run_statuses) != len(run_model_jsons):
+        return [(None, ModelRunStatus.FAILED.value, f'model gateway at {gateway_url} returned {len(run_statuses)} '
+                 f'runs for a batch of {len(run_model_jsons)}', None)] * len(run_model_jsons)
+    return [__run_outputs(gateway_url, run_status, output_definitions, timer) for run_status in run_statuses]
+
+
+def __run_outputs(gateway_url: str, run_status, output_definitions: Optional[Dict],
+    timer: PhaseTimer) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[Dict]]:
+    # Result of a requested run (see run_model_on_gateway), with the outputs if output_definitions is given
+    # (a run of a batch that failed with an error has no outputs)
+    error_message = getattr(run_status, 'error_message', None)
+    if output_definitions is None or error_message is not None:
+        # no other model uses the outputs (or they can not be interpreted)
+        return run_status.run_id, run_status.status, error_message, None
+
+    try:
+        with timer.phase(RESULT_FETCH):
+            result = getattr(run_status, 'result', None)
+            if result is None:
+                result = gateway_service.get_model_run_result(gateway_url, run_status.run_id).result
+            return run_status.run_id, run_status.status, None, __model_outputs(result, output_definitions)
+    except Exception as ex:
+        # the model ran, but models using its outputs can not
+        print(f"outputs of model at {gateway_url} not available", ex, file=sys.stderr)
+        return run_status.run_id, run_status.status, None, None
+
+
+def reuse_model_run(gateway_url: str, run_id: str, run_model_json: Dict, output_definitions: Optional[Dict],
+    timer: PhaseTimer = None) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[Dict]]:
+    # Outputs of an earlier run (see run_model_on_gateway), the model is run again if its result is not available
+    if output_definitions is None:
+        return run_id, ModelRunStatus.SUCCESS.value, None, None
+    timer = timer or PhaseTimer()
+    try:
+        with timer.phase(RESULT_FETCH):
+            result = gateway_service.get_model_run_result(gateway_url, run_id).result
+            return run_id, ModelRunStatus.SUCCESS.value, None, __model_outputs(result, output_definitions)
+    except Exception as ex:
+        print(f"result of run {run_id} at {gateway_url} not available, running the model again", ex, file=sys.stderr)
+        return run_model_on_gateway(gateway_url, run_model_json, output_definitions, timer)
 
-def prepare_model_inputs(model_bindings: Generator[ArgumentBinding, None, None], available_data: Dict) -> Dict:
+
+def __model_outputs(result: Dict, output_definitions: Dict) -> Dict:
+    # Data and metadata of the outputs of a model run by output argument URI, for use by other models
+    outputs = dict()
+    for argument_name, argument_data in result.items():
+        # get data and models per-argument from the result and the output definitions
+        print("handling model output", argument_name, file=sys.stderr)
+        argument_meta = output_definitions[argument_name]
+        argument_uri = argument_meta.uri
+        argument_metadata = TableDefinition(
+            uri=argument_meta.type_uri, # type uri!
+            columns=argument_meta.columns)
+
+        outputs[argument_uri] = dict(
+            data=argument_data,
+            metadata=argument_metadata
+        )
+    return outputs
+
+
+def prepare_model_inputs(model_bindings: Iterable[ArgumentBinding], available_data: Dict,
+    warnings: List[str] = None, timer: PhaseTimer = None,
+    input_values: Dict[Tuple[str, str], str] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    # Model inputs are built column by column (argument name -> column name -> array), rows are only made
+    # when the request is sent (see model_input_rows). Rows that are left out (unmatched or truncated) are
+    # reported in warnings, unit conversions are timed with timer. input_values (by argument and column name)
+    # are used instead of the values of input columns, e.g. the values of the sweep parameters of a scenario.
     model_input = dict()
+    warnings = warnings if warnings is not None else []
+    timer = timer or PhaseTimer()
+    input_values = input_values or dict()
 
     for argument_binding in model_bindings:
-        model_input[argument_binding.argument_name] = list()
         argument_per_column = dict()
+        # source of every column, None for input columns
+        column_sources = dict()
         for column_binding in argument_binding.columns:
             
             if column_binding.source_type == SimulationBindingTypes.INPUT:
                 # directly gather column data from source array
-                argument_per_column[column_binding.target_column.name] = column_binding.source_name.split('|')
+                source_name = input_values.get((argument_binding.argument_name, column_binding.target_column.name),
+                                               column_binding.source_name)
+                argument_per_column[column_binding.target_column.name] = __object_array(source_name.split('|'))
                 # no unit conversion, since "input" type forces target unit
             else:
                 # TODO gather data from available_data, if not available then raise exception
                 source_argument_uri = column_binding.source_argument_uri
-                source_data = available_data[source_argument_uri]["data"] # will throw if unavailable TODO maybe rethrow?
-                argument_per_column[column_binding.target_column.name] = \
-                    [row[column_binding.source_column_name] for row in source_data]
+                source = available_data[source_argument_uri] # will throw if unavailable TODO maybe rethrow?
+                column_values = __source_column(source, column_binding.source_column_name)
                 # unit conversion using other column in data
                 # check whether this column is value of unit*value product
-                source_metadata = next(cd for cd in available_data[source_argument_uri]["metadata"].columns
+                source_metadata = next(cd for cd in source["metadata"].columns
                     if str(cd.name) == column_binding.source_column_name)
 
                 source_unit_type = source_metadata.unit_type
@@ -181,43 +615,46 @@ def prepare_model_inputs(model_bindings: Generator[ArgumentBinding, None, None],
                 if (not source_unit_type is ColumnReferenceType.NONE) and \
                     (not target_unit_type is ColumnReferenceType.NONE):
                     # perform unit conversion (only possible when unit of both is known)
-                    # get source units...
-                    source_units = []
+                    # get source units, one for the column or one per row...
+                    source_units = None
                     source_is_uri = False
                     if source_unit_type is ColumnReferenceType.FIXED:
-                        source_units = [str(source_metadata.unit_uri)] * len(source_data)
+                        source_units = str(source_metadata.unit_uri)
                         source_is_uri = True
                     if source_unit_type is ColumnReferenceType.COLUMN:
-                        source_unit_column = next(str(cd.name) for cd in available_data[source_argument_uri]["metadata"].columns 
+                        source_unit_column = next(str(cd.name) for cd in source["metadata"].columns 
                             if str(cd.uri) == str(source_metadata.unit_uri)) # BUG assuming unit source = source
-                        source_units = [row[source_unit_column] for row in source_data]
+                        source_units = __source_column(source, source_unit_column)
                     # TODO if source_unit_type is ColumnReferenceType.CONCEPT:
 
-                    # get target units...
-                    target_units = []
-                    target_is_uri = False
+                    # get target unit...
+                    target_unit = None
                     if target_unit_type is ColumnReferenceType.FIXED:
-                        target_units = [str(column_binding.target_column.unit_uri)] * len(source_data) 
-                        target_is_uri = True
+                        target_unit = Unit(str(column_binding.target_column.unit_uri), internal=True)
                     # TODO if target_unit_type is ColumnReferenceType.COLUMN:
                         # ... what would be the source of the unit column?
                     # TODO if target_unit_type is ColumnReferenceType.CONCEPT:
 
                     # TODO unit conversion using ontology concept
-                    argument_per_column[column_binding.target_column.name] = \
-                        [__convert_source_to_target_unit(*c) for c in 
-                            zip(argument_per_column[column_binding.target_column.name],
-                            source_units, [source_is_uri] * len(source_data),
-                            target_units, [target_is_uri] * len(source_data))]
+                    if source_units is not None and target_unit is not None:
+                        with timer.phase(UNIT_CONVERSION):
+                            column_values = __convert_column(column_values, source_units, source_is_uri, target_unit)
+                argument_per_column[column_binding.target_column.name] = column_values
+                column_sources[column_binding.target_column.name] = source_argument_uri
 
-        # length of argument is the shortest of the columns 
-        argument_length = min(len(arg_data) for arg_data in argument_per_column.values())
+        if argument_binding.join_key and len(set(column_sources.values()) - {None}) > 1:
+            # match the rows of the sources on the join key
+            argument_per_column = __join_columns(argument_binding, argument_per_column, column_sources,
+                available_data, warnings)
 
-        for row in range(argument_length):
-            row_dict = dict()
-            for argument_column_name, argument_column_values in argument_per_column.items():
-                row_dict[argument_column_name] = argument_column_values[row]
-            model_input[argument_binding.argument_name].append(row_dict)
+        # length of argument is the shortest of the columns 
+        argument_length = min((len(arg_data) for arg_data in argument_per_column.values()), default=0)
+        truncated = max((len(arg_data) for arg_data in argument_per_column.values()), default=0) - argument_length
+        if truncated:
+            warnings.append(f'{argument_binding.argument_name}: columns have different lengths, '
+                f'{truncated} rows left out after row {argument_length}')
+        model_input[argument_binding.argument_name] = {argument_column_name: argument_column_values[:argument_length]
+            for argument_column_name, argument_column_values in argument_per_column.items()}
 
     ### unit_type = none|fixed|column|concept
     ### unit_type = none -> unit-less: never convert
@@ -251,14 +688,88 @@ def _convert_param_to_input_unit(param: dict, model_input: GraphDbModelParameter
         param['amount_unit'] = input_unit.label
     return param
 
-def __convert_source_to_target_unit(value: float, 
-        source_unit: str, source_is_uri: bool, 
-        target_unit: str, target_is_uri: bool) -> float:
-    source = Unit(source_unit, internal=source_is_uri)
-    target = Unit(target_unit, internal=target_is_uri)
-    if source != target:
-        # print(f'converting from {source_unit} ({source_is_uri}) to {target_unit} ({target_is_uri})', file=sys.stderr)
-        source_value = Values(value, source)
-        return source_value.to_unit(target)
+
+def model_input_rows(model_input: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, List[Dict]]:
+    # Rows (dicts of column name -> value) of every argument, as sent to the model gateway
+    rows = dict()
+    for argument_name, columns in model_input.items():
+        names = list(columns)
+        # tolist gives Python values (not NumPy scalars) that can be serialized
+        values = [columns[name].tolist() for name in names]
+        rows[argument_name] = [dict(zip(names, row)) for row in zip(*values)]
+    return rows
+
+
+def __join_columns(argument_binding: ArgumentBinding, argument_per_column: Dict[str, np.ndarray],
+    column_sources: Dict[str, Optional[str]], available_data: Dict, warnings: List[str]) -> Dict[str, np.ndarray]:
+    # Hash join of the columns of several sources on the join key of the argument
+    # The rows of the source of the join key column are matched with the rows of every other source that have
+    # the same key (in its source_key_column_name, or else in the column with the same name as the key);
+    # rows that do not match in every source are left out. Input columns are not joined.
+    key_binding = next((cb for cb in argument_binding.columns if cb.target_column.name == argument_binding.join_key
+                        and column_sources.get(cb.target_column.name) is not None), None)
+    if key_binding is None:
+        raise ValueError(f'join key {argument_binding.join_key} of argument {argument_binding.argument_name} '
+                         'is not a column bound to a data source or model output')
+    key_source = key_binding.source_argument_uri
+    keys = __source_column(available_data[key_source], key_binding.source_column_name).tolist()
+
+    # row of every source for every row of the key source, -1 where there is no match
+    source_rows = {key_source: np.arange(len(keys))}
+    for source_uri in sorted(set(column_sources.values()) - {None, key_source}):
+        key_column = next((cb.source_key_column_name for cb in argument_binding.columns
+                           if cb.source_argument_uri == source_uri and cb.source_key_column_name),
+                          key_binding.source_column_name)
+        index = dict()
+        duplicates = 0
+        for row, key in enumerate(__source_column(available_data[source_uri], key_column).tolist()):
+            if key in index:
+                duplicates += 1
+            else:
+                index[key] = row
+        if duplicates:
+            warnings.append(f'{argument_binding.argument_name}: {duplicates} rows of {source_uri} have a '
+                            f'{key_column} that is used before, only the first row is used')
+        source_rows[source_uri] = np.fromiter((index.get(key, -1) for key in keys), dtype=int, count=len(keys))
+
+    matched = np.logical_and.reduce([rows >= 0 for rows in source_rows.values()])
+    if not matched.all():
+        unmatched = [keys[row] for row in np.flatnonzero(~matched)]
+        warnings.append(f'{argument_binding.argument_name}: {len(unmatched)} rows of {key_source} have no match on '
+                        f'{argument_binding.join_key} and are left out '
+                        f'({", ".join(str(key) for key in unmatched[:10])}{", ..." if len(unmatched) > 10 else ""})')
+    return {name: (values if column_sources[name] is None else values[source_rows[column_sources[name]][matched]])
+            for name, values in argument_per_column.items()}
+
+
+def __object_array(values: list) -> np.ndarray:
+    # Array that keeps the values as they are (no conversion of e.g. ints to floats or numbers to strings)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def __source_column(source: Dict, column_name: str) -> np.ndarray:
+    # Column of the rows of a data source or model output, extracted once and shared by all bindings
+    columns = source.setdefault("columns", dict())
+    if column_name not in columns:
+        columns[column_name] = __object_array([row[column_name] for row in source["data"]])
+    return columns[column_name]
+
+
+def __convert_column(values: np.ndarray, source_units, source_is_uri: bool, target: Unit) -> np.ndarray:
+    # Convert a column to the target unit, source_units is one unit for the column or an array with a unit per row
+    # Rows are grouped by source unit, so every (source, target) pair is resolved once and converted in one pass;
+    # rows that are already in the target unit keep their value
+    if isinstance(source_units, str):
+        categories, codes = [source_units], np.zeros(len(values), dtype=int)
     else:
-        return value
+        categories, codes = np.unique(source_units.astype(str), return_inverse=True)
+    converted = values.copy()
+    for code, source_unit in enumerate(categories):
+        source = Unit(source_unit, internal=source_is_uri)
+        if source != target:
+            rows = codes == code
+            # plans are cached per unit pair
+            converted[rows] = ConversionPlan.get(source, target).apply(values[rows].astype(float)).tolist()
+    return converted
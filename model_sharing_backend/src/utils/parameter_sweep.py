@@ -0,0 +1,113 @@
+import itertools
+from typing import Dict, List, Optional, Set, Tuple
+
+from model_sharing_backend.src.models.model_info import ModelInfo
+from model_sharing_backend.src.models.simulation import Simulation, SimulationBindingTypes, SweepModes, \
+    SweepParameter
+from model_sharing_backend.src.utils.simulation_scheduler import SimulationSchedule
+
+# Values of the parameters that affect a model in a scenario, as (name, value) pairs sorted by name
+Variant = Tuple[Tuple[str, str], ...]
+
+
+class ParameterSweep:
+    # Scenarios of a simulation and the runs of every model they need
+    # Every sweep parameter gives an input column of a model a list of values, the scenarios are every combination
+    # of those values (grid) or the n-th values of all parameters together (list). `scenarios` holds the values of
+    # the parameters (by name) of every scenario, a simulation without parameters has a single empty scenario.
+    # `parameters` holds the names of the parameters that affect every model: its own and those of the models
+    # whose outputs it uses. A model runs once per variant (the values of the parameters that affect it), so models
+    # that are not affected by any parameter run once for all scenarios.
+    # Raises a ValueError if the parameters do not make up a sweep of the simulation.
+
+    def __init__(self, simulation: Simulation, schedule: SimulationSchedule, max_scenarios: int = None):
+        self.sweep_parameters: List[SweepParameter] = sorted(simulation.sweep_parameters or [],
+                                                             key=lambda p: p.name)
+        self.parameters: Dict[str, Set[str]] = {model_id: set() for model_id in schedule.models}
+        self.scenarios: List[Dict[str, str]] = [dict()]
+
+        self.__check_parameters(schedule)
+        self.__expand(simulation.sweep_mode or SweepModes.GRID.value, max_scenarios)
+        self.__add_dependencies(schedule)
+
+    def is_sweep(self) -> bool:
+        return bool(self.sweep_parameters)
+
+    def variant(self, model: ModelInfo, scenario: int) -> Variant:
+        return tuple((name, self.scenarios[scenario][name]) for name in sorted(self.parameters[model.id]))
+
+    def variants(self, model: ModelInfo) -> Dict[Variant, List[int]]:
+        # Scenarios of every variant of a model, in the order of their first scenario
+        variants: Dict[Variant, List[int]] = dict()
+        for scenario in range(len(self.scenarios)):
+            variants.setdefault(self.variant(model, scenario), []).append(scenario)
+        return variants
+
+    def dependency_variant(self, dependency: ModelInfo, variant: Variant) -> Variant:
+        # Variant of a model whose outputs are used by a model in the given variant
+        # (the parameters that affect a dependency also affect the models that use its outputs)
+        return tuple((name, value) for name, value in variant if name in self.parameters[dependency.id])
+
+    def input_values(self, model: ModelInfo, variant: Variant) -> Dict[Tuple[str, str], str]:
+        # Values of the input columns (by argument and column name) of a model that are set by the variant
+        values = dict(variant)
+        return {(p.argument_name, p.column_name): values[p.name] for p in self.sweep_parameters
+                if p.model_uri == model.ontology_uri and p.name in values}
+
+    def __check_parameters(self, schedule: SimulationSchedule):
+        names = [p.name for p in self.sweep_parameters]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f'sweep parameters {", ".join(duplicates)} are defined more than once')
+        targets: Dict[Tuple[str, str, str], str] = dict()
+        for parameter in self.sweep_parameters:
+            target = (parameter.model_uri, parameter.argument_name, parameter.column_name)
+            if target in targets:
+                raise ValueError(f'sweep parameters {targets[target]} and {parameter.name} set the same input '
+                                 f'{parameter.argument_name}.{parameter.column_name}')
+            targets[target] = parameter.name
+            if not parameter.values:
+                raise ValueError(f'sweep parameter {parameter.name} has no values')
+            models = [model for model in schedule.models.values() if model.ontology_uri == parameter.model_uri]
+            if not models:
+                raise ValueError(f'sweep parameter {parameter.name} sets an input of model {parameter.model_uri} '
+                                 'that is not part of this simulation')
+            column_binding = self.__column_binding(schedule, models[0], parameter)
+            if column_binding is None or column_binding.source_type != SimulationBindingTypes.INPUT:
+                raise ValueError(f'sweep parameter {parameter.name} sets {parameter.argument_name}.'
+                                 f'{parameter.column_name} of model {models[0].name}, which is not an input column')
+            for model in models:
+                self.parameters[model.id].add(parameter.name)
+
+    def __expand(self, mode: str, max_scenarios: Optional[int]):
+        if not self.sweep_parameters:
+            return
+        values = [p.values for p in self.sweep_parameters]
+        if mode == SweepModes.LIST.value:
+            if len({len(parameter_values) for parameter_values in values}) > 1:
+                raise ValueError('the sweep parameters of a list sweep need the same number of values ('
+                                 + ', '.join(f'{p.name}: {len(p.values)}' for p in self.sweep_parameters) + ')')
+            count = len(values[0])
+            combinations = zip(*values)
+        else:
+            count = 1
+            for parameter_values in values:
+                count *= len(parameter_values)
+            combinations = itertools.product(*values)
+        if max_scenarios is not None and count > max_scenarios:
+            raise ValueError(f'the sweep has {count} scenarios, at most {max_scenarios} can be run at once')
+        names = [p.name for p in self.sweep_parameters]
+        self.scenarios = [dict(zip(names, combination)) for combination in combinations]
+
+    def __add_dependencies(self, schedule: SimulationSchedule):
+        # models are ordered after the models they depend on, so the parameters of those are known first
+        for model in schedule.order:
+            for dependency in schedule.dependencies[model.id]:
+                self.parameters[model.id] |= self.parameters[dependency]
+
+    @staticmethod
+    def __column_binding(schedule: SimulationSchedule, model: ModelInfo, parameter: SweepParameter):
+        return next((column_binding for binding in schedule.model_bindings(model)
+                     if binding.argument_name == parameter.argument_name
+                     for column_binding in binding.columns
+                     if column_binding.target_column.name == parameter.column_name), None)
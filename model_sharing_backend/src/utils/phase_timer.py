@@ -0,0 +1,47 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Phases of a simulation run, stored as <phase>_seconds on ExecutedSimulation (and ExecutedModel for the phases of
+# a single model)
+DATA_FETCH = 'data_fetch'
+METADATA_PARSE = 'metadata_parse'
+INPUT_PREPARATION = 'input_preparation'
+UNIT_CONVERSION = 'unit_conversion'
+GATEWAY_REQUEST = 'gateway_request'
+RESULT_FETCH = 'result_fetch'
+PERSISTENCE = 'persistence'
+TOTAL = 'total'
+
+
+class PhaseTimer:
+    # Seconds spent per phase, summed over every time a phase is timed
+    # Phases can be timed from several threads at once (e.g. data sources that are fetched at the same time), so
+    # the sum of a phase can be more than the time it took from start to end.
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = dict()
+        self.__lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        with self.__lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def add_all(self, other: 'PhaseTimer'):
+        for name, seconds in dict(other.seconds).items():
+            self.add(name, seconds)
+
+    def get(self, name: str) -> Optional[float]:
+        return self.seconds.get(name)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.seconds}>'
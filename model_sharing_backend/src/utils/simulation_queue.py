@@ -0,0 +1,225 @@
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from common_data_access.db import create_db_connection
+from model_sharing_backend.src.models.simulation import ExecutedSimulation, Simulation, SimulationJob, \
+    SimulationJobStatus
+from model_sharing_backend.src.models.user import User
+from model_sharing_backend.src.utils import model_runner
+
+_db = create_db_connection()
+
+# Simulations are run in the background: running a simulation adds a job to the simulation_jobs table and
+# returns, workers claim the queued jobs one at a time and run them. Workers are threads of `flask simulation-worker`
+# processes (SIMULATION_WORKER_THREADS each) on any number of nodes, which is how a deployment runs simulations.
+# For development a backend process can run SIMULATION_WORKERS worker threads of its own (0 for none).
+# A claimed job is leased to its worker, which renews the lease with a heartbeat while the job runs. Jobs of
+# workers that stopped (e.g. a crashed node) are queued again once the lease expired, up to
+# SIMULATION_JOB_MAX_ATTEMPTS runs. A worker that loses the lease of its job (e.g. its heartbeats did not reach the
+# database in time) stops running it before the next model starts, and stores nothing of the execution.
+
+# events that wake and stop the worker threads of an application, by application
+__workers: Dict[Flask, Tuple[threading.Event, threading.Event]] = dict()
+__workers_lock = threading.Lock()
+
+
+def enqueue(simulation: Simulation, user: User) -> ExecutedSimulation:
+    # Add an execution of the simulation to the queue, its models are run by a worker
+    now = datetime.utcnow()
+    executed_simulation = ExecutedSimulation(created_by=user, created_on=now, owner=user.company,
+                                             simulation_id=simulation.id, executed_models=[])
+    executed_simulation.job = SimulationJob(executed_simulation_id=executed_simulation.id,
+                                            status=SimulationJobStatus.QUEUED, enqueued_on=now, attempts=0)
+    executed_simulation.add()
+
+    # the worker threads of this process (if it runs any) pick the job up right away
+    app = current_app._get_current_object()
+    start_workers(app)
+    if app in __workers:
+        __workers[app][0].set()
+    return executed_simulation
+
+
+def claim_job(worker: str) -> Optional[SimulationJob]:
+    # Take the oldest queued job and lease it to the worker, None if there is no job to run
+    reclaim_expired_jobs()
+    if _db.engine.dialect.name == 'postgresql':
+        # rows locked by other workers are skipped, so workers do not wait for each other
+        job = SimulationJob.query.filter(SimulationJob.status == SimulationJobStatus.QUEUED) \
+            .order_by(SimulationJob.enqueued_on).with_for_update(skip_locked=True).first()
+        if job is None:
+            _db.session.commit()
+            return None
+        now = datetime.utcnow()
+        job.status = SimulationJobStatus.RUNNING
+        job.worker = worker
+        job.started_on = now
+        job.heartbeat_on = now
+        job.attempts = (job.attempts or 0) + 1
+        _db.session.commit()
+        return job
+
+    # without row locks (e.g. SQLite) a job is claimed with an update that only succeeds while it is queued
+    candidates = SimulationJob.query.with_entities(SimulationJob.id) \
+        .filter(SimulationJob.status == SimulationJobStatus.QUEUED) \
+        .order_by(SimulationJob.enqueued_on).limit(10).all()
+    for (job_id,) in candidates:
+        now = datetime.utcnow()
+        claimed = SimulationJob.query.filter(SimulationJob.id == job_id,
+                                             SimulationJob.status == SimulationJobStatus.QUEUED) \
+            .update({SimulationJob.status: SimulationJobStatus.RUNNING, SimulationJob.worker: worker,
+                     SimulationJob.started_on: now, SimulationJob.heartbeat_on: now,
+                     SimulationJob.attempts: SimulationJob.attempts + 1}, synchronize_session=False)
+        _db.session.commit()
+        if claimed:
+            return SimulationJob.query.get(job_id)
+    return None
+
+
+def reclaim_expired_jobs():
+    # Queue the running jobs without a heartbeat within the lease again, fail those that ran too often
+    config = current_app.config
+    expired = datetime.utcnow() - timedelta(seconds=config.get('SIMULATION_JOB_LEASE', 60.0))
+    running = (SimulationJob.status == SimulationJobStatus.RUNNING, SimulationJob.heartbeat_on < expired)
+    SimulationJob.query.filter(*running, SimulationJob.attempts >= config.get('SIMULATION_JOB_MAX_ATTEMPTS', 3)) \
+        .update({SimulationJob.status: SimulationJobStatus.FAILED, SimulationJob.finished_on: datetime.utcnow(),
+                 SimulationJob.error_message: 'the workers running the simulation stopped responding'},
+                synchronize_session=False)
+    SimulationJob.query.filter(*running) \
+        .update({SimulationJob.status: SimulationJobStatus.QUEUED, SimulationJob.worker: None},
+                synchronize_session=False)
+    _db.session.commit()
+
+
+def heartbeat(job_id, worker: str) -> bool:
+    # Renew the lease of a job, False if the job is no longer leased to the worker
+    renewed = SimulationJob.query.filter(SimulationJob.id == job_id, SimulationJob.worker == worker,
+                                         SimulationJob.status == SimulationJobStatus.RUNNING) \
+        .update({SimulationJob.heartbeat_on: datetime.utcnow()}, synchronize_session=False)
+    _db.session.commit()
+    return bool(renewed)
+
+
+def run_job(job: SimulationJob, worker: str):
+    # Run the simulation of a claimed job and record how it ended (unless the job was reclaimed meanwhile)
+    job_id = job.id
+    app = current_app._get_current_object()
+    stop_heartbeat = threading.Event()
+    # set when the job is no longer leased to this worker, it may be run by another worker by now
+    lease_lost = threading.Event()
+    heartbeat_thread = threading.Thread(target=__send_heartbeats,
+                                        args=(app, job_id, worker, stop_heartbeat, lease_lost),
+                                        name=f'{threading.current_thread().name}-heartbeat', daemon=True)
+    heartbeat_thread.start()
+    status, error_message = SimulationJobStatus.DONE, None
+    try:
+        executed_simulation = ExecutedSimulation.query.get(job.executed_simulation_id)
+        simulation = executed_simulation.simulation
+        simulation.models = simulation.models or []
+        model_runner.run_simulation(simulation, executed_simulation, lease_lost)
+    except model_runner.SimulationCancelledException:
+        _db.session.rollback()
+        print('simulation job', job_id, 'was reclaimed while', worker, 'ran it, stopped running it', file=sys.stderr)
+        return
+    except Exception as e:
+        traceback.print_exc()
+        _db.session.rollback()
+        status = SimulationJobStatus.FAILED
+        error_message = f'{e.__class__.__name__} occurred while running the simulation. {str(e)}'
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+    finished = SimulationJob.query.filter(SimulationJob.id == job_id, SimulationJob.worker == worker,
+                                          SimulationJob.status == SimulationJobStatus.RUNNING) \
+        .update({SimulationJob.status: status, SimulationJob.error_message: error_message,
+                 SimulationJob.finished_on: datetime.utcnow()}, synchronize_session=False)
+    _db.session.commit()
+    if not finished:
+        print('simulation job', job_id, 'was reclaimed while', worker, 'ran it', file=sys.stderr)
+
+
+def start_workers(app: Flask, count: int = None) -> List[threading.Thread]:
+    # Start the worker threads of an application (SIMULATION_WORKERS unless count is given), once per process
+    count = app.config.get('SIMULATION_WORKERS', 0) if count is None else count
+    with __workers_lock:
+        if app in __workers or count <= 0:
+            return []
+        __workers[app] = (threading.Event(), threading.Event())
+        threads = [threading.Thread(target=__work, args=(app, *__workers[app]), name=f'simulation-worker-{i}',
+                                    daemon=True)
+                   for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_workers(app: Flask, count: int = None):
+    # Run worker threads (SIMULATION_WORKER_THREADS unless count is given) until interrupted or terminated, the jobs
+    # that are running are completed first
+    threads = start_workers(app, app.config.get('SIMULATION_WORKER_THREADS', 2) if count is None else count)
+    if not threads:
+        print('no simulation workers to run', file=sys.stderr)
+        return
+    (wake, stop) = __workers[app]
+
+    def shutdown(*_):
+        print('stopping simulation workers after their current job', file=sys.stderr)
+        stop.set()
+        wake.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f'{len(threads)} simulation workers on {__worker_prefix()} waiting for jobs', file=sys.stderr)
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1.0)
+    except KeyboardInterrupt:
+        shutdown()
+        for thread in threads:
+            thread.join()
+
+
+def __work(app: Flask, wake: threading.Event, stop: threading.Event):
+    # Run queued jobs, wait for a new job (or the poll interval) when the queue is empty
+    worker = f'{__worker_prefix()}:{threading.current_thread().name}'
+    poll_interval = app.config.get('SIMULATION_QUEUE_POLL_INTERVAL', 1.0)
+    while not stop.is_set():
+        job = None
+        try:
+            with app.app_context():
+                job = claim_job(worker)
+                if job is not None:
+                    print('running simulation job', job.id, 'on', worker, file=sys.stderr)
+                    run_job(job, worker)
+        except Exception:
+            # e.g. the database is not reachable, try again later
+            traceback.print_exc()
+        if job is None:
+            wake.wait(poll_interval)
+            wake.clear()
+
+
+def __send_heartbeats(app: Flask, job_id, worker: str, stop: threading.Event, lease_lost: threading.Event):
+    # Renew the lease of a job until it is done, on a thread (and database session) of its own
+    # lease_lost is set when the job is no longer leased to the worker
+    interval = app.config.get('SIMULATION_JOB_HEARTBEAT_INTERVAL', 10.0)
+    while not stop.wait(interval):
+        try:
+            with app.app_context():
+                if not heartbeat(job_id, worker):
+                    lease_lost.set()
+                    return
+        except Exception:
+            traceback.print_exc()
+
+
+def __worker_prefix() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
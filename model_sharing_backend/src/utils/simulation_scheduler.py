@@ -0,0 +1,127 @@
+import heapq
+from typing import Dict, List, Set
+
+from model_sharing_backend.src.models.model_info import ModelInfo
+from model_sharing_backend.src.models.simulation import ArgumentBinding, Simulation, SimulationBindingTypes
+
+
+class SimulationSchedule:
+    # Order in which the models of a simulation are run
+    # Built from the argument bindings before any gateway is called: a model depends on the models whose
+    # outputs are bound to its inputs. `order` holds the models that can run, sorted so that every model
+    # comes after the models it depends on (in the order of the simulation otherwise). `errors` holds the
+    # reason for every model that can not run: an input bound to a source that is not part of the
+    # simulation, a dependency cycle, or a dependency on one of those models. `data_sources` holds the URIs
+    # of the data sources every model reads, so a model can start as soon as those are fetched.
+
+    def __init__(self, simulation: Simulation):
+        self.models: Dict = {model.id: model for model in simulation.models}
+        self.bindings: Dict[str, List[ArgumentBinding]] = dict()
+        self.dependencies: Dict[str, Set] = {model_id: set() for model_id in self.models}
+        self.dependants: Dict[str, Set] = {model_id: set() for model_id in self.models}
+        self.data_sources: Dict[str, Set[str]] = {model_id: set() for model_id in self.models}
+        self.errors: Dict[str, str] = dict()
+        self.order: List[ModelInfo] = []
+
+        self.__position = {model_id: position for position, model_id in enumerate(self.models)}
+        self.__add_dependencies(simulation)
+        self.__sort()
+        self.__propagate_errors()
+
+    def required_data_sources(self) -> Set[str]:
+        # URIs of the data sources read by the models that can run
+        return set().union(*(self.data_sources[model.id] for model in self.order))
+
+    def model_bindings(self, model: ModelInfo) -> List[ArgumentBinding]:
+        return self.bindings.get(model.ontology_uri, [])
+
+    def failed_dependency(self, model: ModelInfo, failed: Set):
+        # The first dependency of a model that is in failed (a set of model ids), None if there is none
+        return next((self.models[model_id] for model_id in sorted(self.dependencies[model.id],
+            key=self.__position.get) if model_id in failed), None)
+
+    def __add_dependencies(self, simulation: Simulation):
+        data_source_uris = {str(data_source.ontology_uri) for data_source in simulation.data_sources}
+        models_by_uri: Dict[str, List[ModelInfo]] = dict()
+        for model in self.models.values():
+            models_by_uri.setdefault(model.ontology_uri, []).append(model)
+        for binding in simulation.bindings:
+            self.bindings.setdefault(binding.model_uri, []).append(binding)
+
+        for model in self.models.values():
+            for binding in self.model_bindings(model):
+                for column_binding in binding.columns:
+                    if column_binding.source_type == SimulationBindingTypes.DATA_SOURCE:
+                        if str(column_binding.source_argument_uri) in data_source_uris:
+                            self.data_sources[model.id].add(str(column_binding.source_argument_uri))
+                        else:
+                            self.__set_error(model, f'input {binding.argument_name}.{column_binding.target_column.name}'
+                                f' is bound to data source {column_binding.source_name or column_binding.source_argument_uri}'
+                                ' that is not part of this simulation')
+                    elif column_binding.source_type == SimulationBindingTypes.MODEL:
+                        producers = models_by_uri.get(column_binding.source_uri, [])
+                        if not producers:
+                            self.__set_error(model, f'input {binding.argument_name}.{column_binding.target_column.name}'
+                                f' is bound to model {column_binding.source_name or column_binding.source_uri}'
+                                ' that is not part of this simulation')
+                        for producer in producers:
+                            self.dependencies[model.id].add(producer.id)
+                            self.dependants[producer.id].add(model.id)
+
+    def __sort(self):
+        # Kahn's algorithm, ready models are taken in the order of the simulation
+        remaining = {model_id: len(dependencies) for model_id, dependencies in self.dependencies.items()}
+        ready = [self.__position[model_id] for model_id, count in remaining.items() if count == 0]
+        heapq.heapify(ready)
+        model_ids = list(self.models)
+        while ready:
+            model_id = model_ids[heapq.heappop(ready)]
+            del remaining[model_id]
+            self.order.append(self.models[model_id])
+            for dependant in self.dependants[model_id]:
+                remaining[dependant] -= 1
+                if remaining[dependant] == 0:
+                    heapq.heappush(ready, self.__position[dependant])
+
+        # models left over are part of a cycle or depend on one
+        for model_id in sorted(remaining, key=self.__position.get):
+            cycle = self.__find_cycle(model_id, set(remaining))
+            if cycle:
+                names = ' -> '.join(self.models[cycle_id].name for cycle_id in cycle + [model_id])
+                self.__set_error(self.models[model_id], f'inputs depend on its own outputs ({names})')
+        for model_id in sorted(remaining, key=self.__position.get):
+            if model_id not in self.errors:
+                self.__set_error(self.models[model_id], 'inputs depend on a dependency cycle')
+
+    def __find_cycle(self, start, candidates: Set) -> List:
+        # Path of models from start back to a model that depends on start, empty if start is not on a cycle
+        path = [start]
+        visited = {start}
+        stack = [iter(sorted(self.dependants[start] & candidates, key=self.__position.get))]
+        while stack:
+            dependant = next(stack[-1], None)
+            if dependant is None:
+                stack.pop()
+                path.pop()
+            elif dependant == start:
+                return path
+            elif dependant not in visited:
+                visited.add(dependant)
+                path.append(dependant)
+                stack.append(iter(sorted(self.dependants[dependant] & candidates, key=self.__position.get)))
+        return []
+
+    def __propagate_errors(self):
+        # models depending on a model that can not run, can not run either
+        runnable = []
+        for model in self.order:
+            dependency = self.failed_dependency(model, self.errors.keys())
+            if model.id not in self.errors and dependency is not None:
+                self.__set_error(model, f'inputs depend on model {dependency.name} that can not run')
+            if model.id not in self.errors:
+                runnable.append(model)
+        self.order = runnable
+
+    def __set_error(self, model: ModelInfo, message: str):
+        # keep the first reason found for a model
+        self.errors.setdefault(model.id, message)
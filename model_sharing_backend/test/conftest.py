@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app():
+    # the models are bound to the database connection of the application, so tests import the modules that use
+    # them (e.g. models.simulation, utils.model_runner) after it is created
+    from model_sharing_backend.src import create_app
+    return create_app()
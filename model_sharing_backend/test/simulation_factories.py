@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+# Stand-ins for the parts of a simulation, for tests that do not need a database. The models can only be imported
+# once the application is created (see the app fixture), so binding types are given by their value
+# ('data', 'model' or 'input').
+
+
+def column_binding(source_column: str = None, target_column: str = 'value', unit_type: str = 'none',
+                   unit_uri: str = None, source_type: str = 'data', source_name: str = 'data',
+                   source: str = 'http://data/source', key_column: str = None):
+    from model_sharing_backend.src.models.simulation import SimulationBindingTypes
+    return SimpleNamespace(source_type=SimulationBindingTypes(source_type), source_name=source_name,
+                           source_uri=f'http://models/{source_name}', source_argument_uri=source,
+                           source_column_name=source_column, source_key_column_name=key_column,
+                           target_column=SimpleNamespace(name=target_column, unit_type=unit_type, unit_uri=unit_uri))
+
+
+def argument_binding(name: str, columns: list, join_key: str = None, model: str = 'model'):
+    return SimpleNamespace(model_uri=f'http://models/{model}', argument_name=name, columns=columns, join_key=join_key)
+
+
+def binding(model: str, source_type: str, source: str, column: str = 'value'):
+    # binding of a column of the input of a model to a data source, the outputs of a model (by name) or input values
+    return argument_binding('input', [column_binding(target_column=column, source_type=source_type, source_name=source,
+                                                     source=f'http://data/{source}')], model=model)
+
+
+def model(name: str):
+    return SimpleNamespace(id=name, name=name, ontology_uri=f'http://models/{name}')
+
+
+def simulation(models: list, bindings: list, data_sources=('ingredients',), sweep_parameters: list = None,
+               sweep_mode: str = None):
+    return SimpleNamespace(models=[model(name) for name in models], bindings=bindings,
+                           data_sources=[SimpleNamespace(ontology_uri=f'http://data/{name}') for name in data_sources],
+                           sweep_parameters=sweep_parameters or [], sweep_mode=sweep_mode)
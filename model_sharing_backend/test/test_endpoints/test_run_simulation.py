@@ -1,4 +1,5 @@
 import json
+import time
 
 from .dummy_data import create_simulation_dict, create_unilever_tomato_soup_map, create_unilever_tomato_soup_model, \
     create_model_info_dict, create_food_product_map, create_unilever_tomato_soup_map_with_different_units
@@ -88,10 +89,22 @@ def _assert_successfully_create_and_run_simulation(client_with_auth, model_ids,
     simulation_id = response.json['id']
     models = response.json['models']
 
-    # run simulation
+    # run simulation, it is queued and run in the background
     response = client_with_auth.post(f'/api/run_simulation/{simulation_id}', content_type='application/json')
-    assert response.status_code == 200
+    assert response.status_code == 202
     simulation_execution_id = response.json['simulation_execution_id']
+    assert len(response.json['executed_models']) == 0
+
+    # wait until a worker ran it
+    for _ in range(60):
+        response = client_with_auth.get(f'/api/simulation_status/{simulation_execution_id}',
+                                        content_type='application/json')
+        assert response.status_code == 200
+        assert response.json['status'] in ('queued', 'running', 'done')
+        if response.json['status'] == 'done':
+            break
+        time.sleep(1)
+    assert response.json['status'] == 'done'
     assert len(models) == len(response.json['executed_models'])
     return simulation_execution_id
 
@@ -102,6 +115,7 @@ def _assert_model_status_and_result(client_with_auth, simulation_execution_id, s
                                     content_type='application/json')
     assert response.status_code == 200
     assert response.is_json
+    assert response.json['status'] == 'done'
     assert len(response.json['model_statuses']) > 0
     assert all(map(lambda s: s['status'] == status, response.json['model_statuses']))
 
@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import pytest
+
+from model_sharing_backend.src.ontology_services.data_structures import ColumnReferenceType
+from model_sharing_backend.test.simulation_factories import argument_binding, column_binding
+
+# the model runner uses the models, which are imported once the application is created
+pytestmark = pytest.mark.usefixtures('app')
+
+OM = 'http://www.ontology-of-units-of-measure.org/resource/om-2/'
+
+
+@pytest.fixture
+def available_data():
+    metadata = SimpleNamespace(columns=[
+        SimpleNamespace(name='amount', uri='http://data/amount', unit_type=ColumnReferenceType.COLUMN,
+                        unit_uri='http://data/unit'),
+        SimpleNamespace(name='unit', uri='http://data/unit', unit_type=ColumnReferenceType.NONE),
+        SimpleNamespace(name='weight', uri='http://data/weight', unit_type=ColumnReferenceType.FIXED,
+                        unit_uri=OM + 'gram'),
+    ])
+    data = [{'amount': 1, 'unit': 'kilogram', 'weight': 1500}, {'amount': 2, 'unit': 'gram', 'weight': 20},
+            {'amount': 3, 'unit': 'kilogram', 'weight': 3}]
+    properties = SimpleNamespace(columns=[
+        SimpleNamespace(name='unit_name', uri='http://properties/unit_name', unit_type=ColumnReferenceType.NONE),
+        SimpleNamespace(name='system', uri='http://properties/system', unit_type=ColumnReferenceType.NONE),
+    ])
+    property_data = [{'unit_name': 'gram', 'system': 'SI'}, {'unit_name': 'pound', 'system': 'imperial'},
+                     {'unit_name': 'gram', 'system': 'CGS'}]
+    return {'http://data/source': dict(data=data, metadata=metadata),
+            'http://data/properties': dict(data=property_data, metadata=properties)}
+
+
+def test_prepare_model_inputs_converts_columns(available_data):
+    from model_sharing_backend.src.utils.model_runner import model_input_rows, prepare_model_inputs
+    bindings = [argument_binding('ingredients', [
+        column_binding('amount', 'amount', 'fixed', OM + 'gram'),
+        column_binding('weight', 'weight', 'fixed', OM + 'kilogram'),
+        column_binding('unit', 'unit'),
+    ])]
+    rows = model_input_rows(prepare_model_inputs(bindings, available_data))
+    assert rows == {'ingredients': [
+        {'amount': 1000.0, 'weight': 1.5, 'unit': 'kilogram'},
+        # already in the target unit, the value is kept as it is
+        {'amount': 2, 'weight': 0.02, 'unit': 'gram'},
+        {'amount': 3000.0, 'weight': 0.003, 'unit': 'kilogram'},
+    ]}
+
+
+def test_prepare_model_inputs_uses_shortest_column(available_data):
+    from model_sharing_backend.src.utils.model_runner import model_input_rows, prepare_model_inputs
+    bindings = [argument_binding('mixture', [
+        column_binding(None, 'fraction', source_type='input', source_name='0.5|0.5'),
+        column_binding('unit', 'unit'),
+    ])]
+    warnings = []
+    rows = model_input_rows(prepare_model_inputs(bindings, available_data, warnings))
+    assert rows == {'mixture': [{'fraction': '0.5', 'unit': 'kilogram'}, {'fraction': '0.5', 'unit': 'gram'}]}
+    assert warnings == ['mixture: columns have different lengths, 1 rows left out after row 2']
+
+
+def test_prepare_model_inputs_joins_sources_on_key(available_data):
+    from model_sharing_backend.src.utils.model_runner import model_input_rows, prepare_model_inputs
+    bindings = [argument_binding('units', [
+        column_binding('unit', 'unit'),
+        column_binding('amount', 'amount'),
+        column_binding('system', 'system', source='http://data/properties', key_column='unit_name'),
+    ], join_key='unit')]
+    warnings = []
+    rows = model_input_rows(prepare_model_inputs(bindings, available_data, warnings))
+    assert rows == {'units': [{'unit': 'gram', 'amount': 2, 'system': 'SI'}]}
+    assert warnings == [
+        'units: 1 rows of http://data/properties have a unit_name that is used before, only the first row is used',
+        'units: 2 rows of http://data/source have no match on unit and are left out (kilogram, kilogram)',
+    ]
+
+
+def test_data_source_columns(available_data):
+    from model_sharing_backend.src.utils.model_runner import data_source_columns
+    metadata = available_data['http://data/source']['metadata']
+    bindings = [
+        argument_binding('ingredients', [column_binding('amount', 'amount', 'fixed', OM + 'gram')]),
+        argument_binding('units', [
+            column_binding('weight', 'unit'),
+            column_binding('system', 'system', source='http://data/properties'),
+        ], join_key='unit'),
+    ]
+    # the unit column of amount is fetched as well
+    assert data_source_columns('http://data/source', metadata, bindings) == ['amount', 'unit', 'weight']
+    # the key column of the joined source has the name of the column bound to the key
+    assert data_source_columns('http://data/properties', metadata, bindings) == ['system', 'weight']
+    assert data_source_columns('http://data/other', metadata, bindings) == []
+
+
+def test_model_run_hash():
+    from model_sharing_backend.src.utils.model_runner import model_run_hash
+    model = SimpleNamespace(ontology_uri='http://models/soup', version='1')
+    run = {'simulation_id': 's1', 'created_by': 'a', 'created_on': '2020-01-01T00:00:00',
+           'data': {'ingredients': [{'amount': 1.5, 'unit': 'gram'}]}}
+    # who runs the model, when and in which simulation does not change the hash, neither does the order of keys
+    same = {'simulation_id': 's2', 'created_by': 'b', 'created_on': '2021-01-01T00:00:00',
+            'data': {'ingredients': [{'unit': 'gram', 'amount': 1.5}]}}
+    assert model_run_hash(model, run) == model_run_hash(model, same)
+    # other inputs, another version or another model do
+    other = {'data': {'ingredients': [{'amount': 2.5, 'unit': 'gram'}]}}
+    assert model_run_hash(model, run) != model_run_hash(model, other)
+    assert model_run_hash(model, run) != model_run_hash(SimpleNamespace(ontology_uri='http://models/soup', version='2'),
+                                                        run)
+    assert model_run_hash(model, run) != model_run_hash(SimpleNamespace(ontology_uri='http://models/other', version='1'),
+                                                        run)
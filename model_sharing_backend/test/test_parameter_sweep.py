@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from model_sharing_backend.test.simulation_factories import binding, simulation
+
+# the sweep uses the models, which are imported once the application is created
+pytestmark = pytest.mark.usefixtures('app')
+
+
+def _parameter(name: str, model: str, values: list, column: str = 'value'):
+    return SimpleNamespace(name=name, model_uri=f'http://models/{model}', argument_name='input', column_name=column,
+                           values=values)
+
+
+def _sweep(parameters: list, mode: str = None, max_scenarios: int = None):
+    from model_sharing_backend.src.utils.parameter_sweep import ParameterSweep
+    from model_sharing_backend.src.utils.simulation_scheduler import SimulationSchedule
+    # a reads a data source, b uses the outputs of a, c uses the outputs of b and d stands on its own
+    swept = simulation(list('abcd'), [binding('a', 'data', 'ingredients'),
+                                      binding('b', 'model', 'a'),
+                                      binding('b', 'input', '60', 'temperature'),
+                                      binding('c', 'model', 'b'),
+                                      binding('d', 'input', '1|2')],
+                       sweep_parameters=parameters, sweep_mode=mode)
+    schedule = SimulationSchedule(swept)
+    return ParameterSweep(swept, schedule, max_scenarios), schedule.models
+
+
+def test_sweep_runs_models_once_per_variant():
+    sweep, models = _sweep([_parameter('temperature', 'b', ['60', '80'], 'temperature'),
+                            _parameter('amounts', 'd', ['1', '2|3', '4'])])
+    assert len(sweep.scenarios) == 6
+    assert sweep.scenarios[1] == {'amounts': '1', 'temperature': '80'}
+    assert list(sweep.variants(models['a'])) == [()]
+    assert list(sweep.variants(models['b']).values()) == [[0, 2, 4], [1, 3, 5]]
+    assert sweep.variants(models['c']) == sweep.variants(models['b'])
+    assert len(sweep.variants(models['d'])) == 3
+    assert sweep.input_values(models['b'], (('temperature', '80'),)) == {('input', 'temperature'): '80'}
+    assert sweep.input_values(models['c'], (('temperature', '80'),)) == {}
+    assert sweep.dependency_variant(models['a'], (('temperature', '80'),)) == ()
+
+
+def test_list_sweep_pairs_values():
+    sweep, models = _sweep([_parameter('temperature', 'b', ['60', '80'], 'temperature'),
+                            _parameter('amounts', 'd', ['1', '2'])], 'list')
+    assert sweep.scenarios == [{'amounts': '1', 'temperature': '60'}, {'amounts': '2', 'temperature': '80'}]
+
+    with pytest.raises(ValueError, match='same number of values'):
+        _sweep([_parameter('temperature', 'b', ['60', '80'], 'temperature'),
+                _parameter('amounts', 'd', ['1'])], 'list')
+
+
+def test_simulation_without_parameters_has_one_scenario():
+    sweep, models = _sweep([])
+    assert not sweep.is_sweep()
+    assert sweep.scenarios == [{}]
+    assert all(list(sweep.variants(model)) == [()] for model in models.values())
+
+
+def test_sweep_reports_invalid_parameters():
+    with pytest.raises(ValueError, match='not an input column'):
+        _sweep([_parameter('amount', 'c', ['1'])])
+    with pytest.raises(ValueError, match='not part of this simulation'):
+        _sweep([_parameter('amount', 'unknown', ['1'])])
+    with pytest.raises(ValueError, match='more than once'):
+        _sweep([_parameter('amount', 'd', ['1']), _parameter('amount', 'd', ['2'])])
+    with pytest.raises(ValueError, match='at most 4'):
+        _sweep([_parameter('temperature', 'b', ['60', '80'], 'temperature'),
+                _parameter('amounts', 'd', ['1', '2', '3'])], max_scenarios=4)
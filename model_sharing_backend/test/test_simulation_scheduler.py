@@ -0,0 +1,49 @@
+import pytest
+
+from model_sharing_backend.test.simulation_factories import binding, simulation
+
+# the schedule uses the models, which are imported once the application is created
+pytestmark = pytest.mark.usefixtures('app')
+
+
+def test_schedule_orders_models_after_their_dependencies():
+    from model_sharing_backend.src.utils.simulation_scheduler import SimulationSchedule
+    schedule = SimulationSchedule(simulation(['c', 'b', 'a', 'd'], [
+        binding('a', 'data', 'ingredients'),
+        binding('b', 'model', 'a'),
+        binding('c', 'model', 'b'),
+        binding('c', 'model', 'a'),
+        binding('d', 'input', '1|2'),
+    ]))
+    assert [model.name for model in schedule.order] == ['a', 'b', 'c', 'd']
+    assert schedule.errors == {}
+    assert schedule.failed_dependency(schedule.models['c'], {'a'}).name == 'a'
+    assert schedule.data_sources['a'] == {'http://data/ingredients'}
+    assert schedule.data_sources['b'] == set()
+    assert schedule.required_data_sources() == {'http://data/ingredients'}
+
+
+def test_schedule_reports_cycles():
+    from model_sharing_backend.src.utils.simulation_scheduler import SimulationSchedule
+    schedule = SimulationSchedule(simulation(['a', 'b', 'c', 'd'], [
+        binding('a', 'model', 'b'),
+        binding('b', 'model', 'a'),
+        binding('c', 'model', 'b'),
+    ]))
+    assert [model.name for model in schedule.order] == ['d']
+    assert 'a -> b -> a' in schedule.errors['a']
+    assert 'b -> a -> b' in schedule.errors['b']
+    assert schedule.errors['c'] == 'inputs depend on a dependency cycle'
+
+
+def test_schedule_reports_unsatisfiable_inputs():
+    from model_sharing_backend.src.utils.simulation_scheduler import SimulationSchedule
+    schedule = SimulationSchedule(simulation(['a', 'b', 'c'], [
+        binding('a', 'data', 'recipes'),
+        binding('b', 'model', 'a'),
+        binding('c', 'model', 'unknown'),
+    ]))
+    assert schedule.order == []
+    assert 'data source recipes' in schedule.errors['a']
+    assert schedule.errors['b'] == 'inputs depend on model a that can not run'
+    assert 'model unknown' in schedule.errors['c']
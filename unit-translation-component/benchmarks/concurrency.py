@@ -0,0 +1,46 @@
+# Concurrency benchmark: conversions per second with an increasing number of threads.
+# Resolving units and conversion plans reads shared, immutable structures without a global lock,
+# so throughput should not drop when threads are added. Prints one JSON object per thread count.
+#
+#   python benchmarks/concurrency.py [conversions per thread]
+import json
+import sys
+import threading
+import time
+
+from unit_translation_component import ConversionPlan, Unit, Values, warmup
+from unit_translation_component.index import OMIndex
+
+PAIRS = [
+    ('gram', 'kilogram'), ('kilometre per hour', 'metre per second'), ('degree Celsius', 'degree Fahrenheit'),
+    ('cubic metre', 'litre'), ('hour', 'second'), ('joule', 'kilowatt hour'), ('pascal', 'bar'),
+]
+
+
+def convert(conversions: int):
+    index = OMIndex.get_instance()
+    for i in range(conversions):
+        source, target = PAIRS[i % len(PAIRS)]
+        # resolve through the index every time, the unit and plan caches are exercised as well
+        index.find_by_label(source)
+        Values(float(i), Unit(source)).to_unit(Unit(target))
+
+
+def run(threads: int, conversions: int) -> dict:
+    workers = [threading.Thread(target=convert, args=(conversions,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - start
+    return {'benchmark': 'concurrency', 'threads': threads, 'conversions': threads * conversions,
+            'seconds': round(seconds, 4), 'conversions_per_second': round(threads * conversions / seconds)}
+
+
+if __name__ == '__main__':
+    conversions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    warmup()
+    for threads in (1, 2, 4, 8):
+        ConversionPlan.cache.clear()
+        print(json.dumps(run(threads, conversions)))
@@ -0,0 +1,225 @@
+# Benchmark suite of the unit translation component
+# Measures what a conversion costs, from a cold import up to bulk column conversions, with and without
+# a cache backend. Results are written as JSON so two runs (e.g. before and after a change) can be compared:
+#
+#   PYTHONPATH=. python benchmarks/suite.py --output before.json
+#   PYTHONPATH=. python benchmarks/suite.py --compare before.json
+#
+# Cold cases clear the in-process caches (interned units, conversion plans, SI factors and corrections)
+# before every repetition, so they measure a restarted process that may still have a warm cache backend.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from unit_translation_component import ConversionPlan, Unit, Values, constant, convert_array
+from unit_translation_component.cache_backend import (CacheBackend, RedisCacheBackend, SQLiteCacheBackend,
+                                                      MemoryCacheBackend, set_backend)
+from unit_translation_component.corrector import SpellCheckerObject
+
+FORMAT_VERSION = 1
+
+# Cases that run in a fresh interpreter, the package is imported by the measured code
+SUBPROCESS_CASE = '''
+import sys, time
+start = time.perf_counter()
+import unit_translation_component
+imported = time.perf_counter()
+if sys.argv[1]:
+    unit_translation_component.Unit(sys.argv[1], sys.argv[2] == 'symbol', 'en', sys.argv[2] == 'uri')
+print(imported - start, time.perf_counter() - imported)
+'''
+
+# name: (unit string, how it is looked up)
+SUBPROCESS_CASES = {
+    'cold_import': ('', ''),
+    'cold_first_unit_label': ('kilogram', 'label'),
+    'cold_first_unit_symbol': ('kg', 'symbol'),
+    'cold_first_unit_uri': (constant.OM2 + 'kilogram', 'uri'),
+}
+
+# Rows of the bulk column conversion
+BULK_ROWS = 100000
+
+
+class NoCacheBackend(CacheBackend):
+    # Backend that never stores anything, every cold conversion computes its SI factors
+
+    def get_many(self, keys, field: str) -> dict:
+        return {}
+
+    def set_many(self, field: str, values: dict):
+        pass
+
+    def clear(self):
+        pass
+
+
+def clear_caches():
+    Unit.cache.clear()
+    Unit.si_factors.clear()
+    ConversionPlan.cache.clear()
+    SpellCheckerObject.get_instance().cache.clear()
+
+
+def convert(quantity, source, target, percentage=100.0):
+    return Values(quantity, Unit(source), percentage).to_unit(Unit(target))
+
+
+# name: (callable, cold), a cold case clears the in-process caches before every repetition
+def in_process_cases() -> dict:
+    quantities = np.random.default_rng(0).uniform(0, 1000, BULK_ROWS)
+    units = np.array(['gram', 'kilogram', 'milligram', 'pound (avoirdupois)'])[np.arange(BULK_ROWS) % 4]
+    return {
+        'first_unit_label': (lambda: Unit('kilogram'), True),
+        'first_unit_symbol': (lambda: Unit('kg', True), True),
+        'first_unit_uri': (lambda: Unit(constant.OM2 + 'kilogram', internal=True), True),
+        'first_conversion': (lambda: convert(10, 'gram', 'kilogram'), True),
+        'warm_conversion': (lambda: convert(10, 'gram', 'kilogram'), False),
+        'first_compound_conversion': (lambda: convert(10, 'kilometre per hour', 'metre per second'), True),
+        'warm_compound_conversion': (lambda: convert(10, 'kilometre per hour', 'metre per second'), False),
+        'first_temperature_conversion': (lambda: convert(10, 'degree Celsius', 'degree Fahrenheit'), True),
+        'warm_temperature_conversion': (lambda: convert(10, 'degree Celsius', 'degree Fahrenheit'), False),
+        'warm_percent_conversion': (lambda: convert(10, 'stere', 'barrel (US)', 80.0), False),
+        'warm_to_percent_conversion': (
+            lambda: Values(10, Unit('gram')).to_unit(Unit('%', True), Values(40, Unit('gram'))), False),
+        'first_spelling_corrected_unit': (lambda: Unit('klogram'), True),
+        'warm_spelling_corrected_unit': (lambda: Unit('klogram'), False),
+        'bulk_column_conversion': (lambda: convert_array(quantities, units, Unit('kilogram')), False),
+    }
+
+
+def create_backend(name: str, directory: str) -> CacheBackend:
+    if name == 'none':
+        return NoCacheBackend()
+    if name == 'memory':
+        return MemoryCacheBackend()
+    if name == 'sqlite':
+        return SQLiteCacheBackend(os.path.join(directory, 'benchmark.cache.sqlite'))
+    if name == 'redis':
+        return RedisCacheBackend(os.getenv('UNIT_CACHE_URL'))
+    raise ValueError('Unknown backend "%s"' % name)
+
+
+def summarize(name: str, backend, timings: list, number: int) -> dict:
+    # Seconds per operation
+    per_op = [timing / number for timing in timings]
+    return {
+        'case': name,
+        'backend': backend,
+        'repeat': len(timings),
+        'number': number,
+        'min': min(per_op),
+        'median': statistics.median(per_op),
+        'mean': statistics.mean(per_op),
+        'ops_per_second': 1.0 / statistics.median(per_op) if statistics.median(per_op) > 0 else None,
+    }
+
+
+def run_subprocess_case(name: str, repeat: int) -> list:
+    unit_string, lookup = SUBPROCESS_CASES[name]
+    imports = []
+    lookups = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', SUBPROCESS_CASE, unit_string, lookup],
+                                capture_output=True, text=True, check=True)
+        imported, found = result.stdout.split()
+        imports.append(float(imported))
+        lookups.append(float(found))
+    return [summarize(name, None, imports if name == 'cold_import' else lookups, 1)]
+
+
+def run_in_process_case(name: str, function, cold: bool, backend: str, repeat: int, number: int) -> dict:
+    # Run once to fill the cache backend (and the in-process caches of warm cases)
+    function()
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            clear_caches()
+        start = time.perf_counter()
+        for _ in range(1 if cold else number):
+            function()
+        timings.append(time.perf_counter() - start)
+    return summarize(name, backend, timings, 1 if cold else number)
+
+
+def run_suite(backends=('none', 'memory', 'sqlite'), repeat: int = 5, number: int = 1000, cases=None) -> dict:
+    results = []
+    for name in SUBPROCESS_CASES:
+        if cases is None or name in cases:
+            results.extend(run_subprocess_case(name, repeat))
+    functions = in_process_cases()
+    skipped = []
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in backends:
+            cache_backend = create_backend(backend, directory)
+            if not cache_backend.available():
+                skipped.append(backend)
+                continue
+            set_backend(cache_backend)
+            clear_caches()
+            for name, (function, cold) in functions.items():
+                if cases is None or name in cases:
+                    # bulk conversions are slow, a few repetitions are enough
+                    case_number = max(1, number // 1000) if name.startswith('bulk') else number
+                    results.append(run_in_process_case(name, function, cold, backend, repeat, case_number))
+    set_backend(None)
+    clear_caches()
+    return {
+        'format_version': FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'skipped_backends': skipped,
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    # Cases whose median got more than threshold times slower than in the baseline
+    previous = {(result['case'], result['backend']): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        before = previous.get((result['case'], result['backend']))
+        if before is not None and before['median'] > 0 and result['median'] / before['median'] > threshold:
+            regressions.append({'case': result['case'], 'backend': result['backend'], 'before': before['median'],
+                                'after': result['median'], 'ratio': result['median'] / before['median']})
+    return regressions
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the unit translation component')
+    parser.add_argument('--backend', action='append', choices=['none', 'memory', 'sqlite', 'redis'],
+                        help='cache backend to run with, can be given more than once (default: none, memory, sqlite)')
+    parser.add_argument('--case', action='append', help='only run this case, can be given more than once')
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions of every case')
+    parser.add_argument('--number', type=int, default=1000, help='operations per repetition of warm cases')
+    parser.add_argument('--output', help='write the results to this file instead of stdout')
+    parser.add_argument('--compare', help='results of an earlier run, exits with 1 when a case got slower')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown of the median that counts as a regression (default: 1.25)')
+    options = parser.parse_args(arguments)
+
+    report = run_suite(tuple(options.backend or ('none', 'memory', 'sqlite')), options.repeat, options.number,
+                       options.case)
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            report['regressions'] = compare(report, json.load(baseline_file), options.threshold)
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+# Build step: compile om-2.ttl into the binary unit index shipped with the package (om-2.idx)
+from unit_translation_component.index import compile_index, path
+
+compile_index()
+print('Compiled %s' % path)
@@ -20,7 +20,7 @@ setup(name='unit_translation_component',
 		  'SPARQLWrapper==1.8.5',
           'redis==3.5.3',
 		  'progress==1.5',
-		  'pyspellchecker==0.5.4'
+		  'numpy>=1.18.4'
 	  ],
 	  include_package_data = True,
       zip_safe=False)
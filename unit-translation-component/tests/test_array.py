@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from unit_translation_component import Values, Unit, convert_array, floatequal
+
+def test_array_values():
+    RES = Values([1, 20, 300], Unit('gram')).to_unit(Unit('kilogram'))
+    assert(all(floatequal(a, b) for a, b in zip(RES, [0.001, 0.02, 0.3])))
+
+def test_array_matches_scalar():
+    QUANTITIES = [0.5, 1, 42]
+    RES = convert_array(QUANTITIES, 'mile (statute)', Unit('kilometre'))
+    for quantity, res in zip(QUANTITIES, RES):
+        assert(floatequal(res, Values(quantity, Unit('mile (statute)')).to_unit(Unit('kilometre'))))
+
+def test_array_temperatures():
+    RES = convert_array(np.array([10.0, 10.0]), 'degree Celsius', Unit('degree Fahrenheit'))
+    assert(all(floatequal(res, 49.99995922640318) for res in RES))
+
+def test_array_unit_per_row():
+    RES = convert_array([1, 2, 3, 4], ['g', 'kg', 'g', 'mg'], Unit('gram'), symbol=True)
+    assert(all(floatequal(a, b) for a, b in zip(RES, [1, 2000, 3, 0.004])))
+
+def test_array_unit_objects_per_row():
+    UNITS = [Unit('degree Celsius'), Unit('degree Fahrenheit')]
+    RES = convert_array([10, 50], UNITS, Unit('degree Fahrenheit'))
+    assert(floatequal(RES[0], 49.99995922640318))
+    assert(floatequal(RES[1], 50))
+
+def test_array_percentage():
+    RES = convert_array([1, 2], ['gram', 'kilogram'], Unit('%', True), whole=Values([10, 20], Unit('gram')))
+    assert(all(floatequal(a, b) for a, b in zip(RES, [10, 10000])))
+
+def test_array_length_mismatch():
+    with pytest.raises(ValueError):
+        convert_array([1, 2, 3], ['g', 'kg'], Unit('gram'), symbol=True)
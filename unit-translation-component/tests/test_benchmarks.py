@@ -0,0 +1,25 @@
+import importlib.util
+import json
+import os
+
+# The benchmark suite is a script, load it from benchmarks/suite.py
+SPEC = importlib.util.spec_from_file_location(
+    'suite', os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'suite.py'))
+suite = importlib.util.module_from_spec(SPEC)
+SPEC.loader.exec_module(suite)
+
+def test_benchmark_output(tmp_path):
+    OUTPUT = tmp_path / 'results.json'
+    assert(suite.main(['--case', 'warm_conversion', '--case', 'first_unit_label', '--backend', 'none',
+                       '--backend', 'memory', '--repeat', '1', '--number', '1', '--output', str(OUTPUT)]) == 0)
+    RES = json.loads(OUTPUT.read_text())
+    assert(RES['format_version'] == suite.FORMAT_VERSION)
+    assert(sorted((result['case'], result['backend']) for result in RES['results']) ==
+           [('first_unit_label', 'memory'), ('first_unit_label', 'none'),
+            ('warm_conversion', 'memory'), ('warm_conversion', 'none')])
+
+def test_benchmark_compare():
+    BASELINE = {'results': [{'case': 'warm_conversion', 'backend': 'memory', 'median': 1.0}]}
+    REPORT = {'results': [{'case': 'warm_conversion', 'backend': 'memory', 'median': 2.0}]}
+    assert([regression['ratio'] for regression in suite.compare(REPORT, BASELINE, 1.25)] == [2.0])
+    assert(suite.compare(BASELINE, BASELINE, 1.25) == [])
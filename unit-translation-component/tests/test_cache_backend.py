@@ -0,0 +1,96 @@
+import pytest
+from unit_translation_component import ConversionPlan, Values, Unit, floatequal, constant
+from unit_translation_component.cache_backend import MemoryCacheBackend, SQLiteCacheBackend, create_backend, get_backend, set_backend
+
+def test_memory_backend():
+    BACKEND = MemoryCacheBackend()
+    BACKEND.set_many('factor_si', {'a': 1.0, 'b': 2.0})
+    assert(BACKEND.get_many(['a', 'b', 'c'], 'factor_si') == {'a': 1.0, 'b': 2.0})
+    assert(BACKEND.get('a', 'other') is None)
+
+def test_sqlite_backend_persists(tmp_path):
+    PATH = str(tmp_path / 'cache.sqlite')
+    SQLiteCacheBackend(PATH).set('a', 'factor_si', 0.001)
+    assert(float(SQLiteCacheBackend(PATH).get('a', 'factor_si')) == 0.001)
+
+def test_sqlite_backend_many_keys(tmp_path):
+    BACKEND = SQLiteCacheBackend(str(tmp_path / 'cache.sqlite'))
+    VALUES = {str(i): i for i in range(1200)}
+    BACKEND.set_many('factor_si', VALUES)
+    assert(len(BACKEND.get_many(VALUES, 'factor_si')) == 1200)
+
+def test_conversion_uses_backend(tmp_path):
+    class WriteOnlyBackend(SQLiteCacheBackend):
+        def get_many(self, keys, field):
+            raise AssertionError('conversions do not read the backend')
+
+    PREVIOUS = get_backend()
+    PATH = str(tmp_path / 'cache.sqlite')
+    set_backend(WriteOnlyBackend(PATH))
+    # plans that are already resolved and factors computed before do not touch the backend
+    ConversionPlan.cache.clear()
+    Unit.si_factors.pop(constant.OM2 + 'hectare', None)
+    try:
+        RES = Values(1, Unit('hectare')).to_unit(Unit('square metre'))
+        assert(floatequal(RES, 10000))
+        # factors computed by a conversion are written to the shared backend
+        assert(floatequal(float(SQLiteCacheBackend(PATH).get(constant.OM2 + 'hectare', 'factor_si')), 10000))
+    finally:
+        set_backend(PREVIOUS)
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_backend('memcached')
+
+def test_cache_units_resumes(tmp_path, monkeypatch):
+    from unit_translation_component import cache_units
+    from unit_translation_component.corrector import SpellCheckerObject
+    monkeypatch.setenv('UNIT_DICTIONARY_PATH', str(tmp_path / 'dictionary' / 'unit_dictionary.json'))
+    PREVIOUS = get_backend()
+    set_backend(MemoryCacheBackend())
+    try:
+        REPORT = cache_units(processes=1, report_path=str(tmp_path / 'report.json'))
+        assert(REPORT['failed'] == 0)
+        assert(REPORT['cached'] + REPORT['not_expressible'] == REPORT['units'])
+        assert((tmp_path / 'report.json').exists())
+        # the corrector uses the written dictionary instead of the one in the package
+        assert(SpellCheckerObject.path() == str(tmp_path / 'dictionary' / 'unit_dictionary.json'))
+        # a second run skips every unit, including those that can not be expressed in SI
+        RERUN = cache_units(processes=1)
+        assert(RERUN['skipped'] == REPORT['units'])
+        assert(RERUN['cached'] + RERUN['not_expressible'] == 0)
+    finally:
+        set_backend(PREVIOUS)
+        SpellCheckerObject.get_instance().reload()
+
+def test_sqlite_backend_unwritable_path(tmp_path):
+    PREVIOUS = get_backend()
+    # a directory can not be created below a file
+    (tmp_path / 'file').write_text('')
+    BACKEND = SQLiteCacheBackend(str(tmp_path / 'file' / 'dir' / 'cache.sqlite'))
+    assert(not BACKEND.available())
+    assert(BACKEND.get_many(['a'], 'factor_si') == {})
+    BACKEND.set_many('factor_si', {'a': 1.0})
+    set_backend(BACKEND)
+    ConversionPlan.cache.clear()
+    try:
+        # conversions do not need the cache
+        assert(floatequal(Values(1000, Unit('gram')).to_unit(Unit('kilogram')), 1))
+    finally:
+        set_backend(PREVIOUS)
+
+def test_failing_backend_does_not_break_conversions():
+    class FailingBackend(MemoryCacheBackend):
+        def get_many(self, keys, field):
+            raise RuntimeError('cache down')
+
+        def set_many(self, field, values):
+            raise RuntimeError('cache down')
+
+    PREVIOUS = get_backend()
+    set_backend(FailingBackend())
+    ConversionPlan.cache.clear()
+    try:
+        assert(floatequal(Values(1, Unit('hectare')).to_unit(Unit('square metre')), 10000))
+    finally:
+        set_backend(PREVIOUS)
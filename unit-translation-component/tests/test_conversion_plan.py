@@ -0,0 +1,23 @@
+import pytest
+from unit_translation_component import ConversionPlan, Values, Unit, floatequal
+from unit_translation_component.exception import UnitsNotComparableException
+
+def test_conversion_plan_cached():
+    PLAN = ConversionPlan.get(Unit('gram'), Unit('kilogram'))
+    assert(ConversionPlan.get(Unit('gram'), Unit('kilogram')) is PLAN)
+    assert(floatequal(PLAN.a, 0.001))
+    assert(PLAN.b == 0.0)
+
+def test_conversion_plan_temperature():
+    PLAN = ConversionPlan.get(Unit('degree Celsius'), Unit('degree Fahrenheit'))
+    assert(floatequal(PLAN.apply(10), 49.99995922640318))
+    assert(floatequal(PLAN.apply(10, 50.0), 49.99995922640318 / 2))
+
+def test_conversion_plan_kelvin():
+    # the kelvin scale has no offset
+    RES = Values(20, Unit('degree Celsius')).to_unit(Unit('kelvin'))
+    assert(floatequal(RES, 293.15))
+
+def test_conversion_plan_not_comparable():
+    with pytest.raises(UnitsNotComparableException):
+        ConversionPlan.get(Unit('gram'), Unit('metre'))
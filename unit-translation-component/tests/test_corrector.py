@@ -0,0 +1,20 @@
+from unit_translation_component.corrector import SpellCheckerObject
+
+def test_edit_distance():
+    assert(SpellCheckerObject.edit_distance('klogram', 'kilogram') == 1)
+    assert(SpellCheckerObject.edit_distance('meter', 'metre') == 1)
+    # transposition after an insertion
+    assert(SpellCheckerObject.edit_distance('ca', 'abc') == 2)
+    assert(SpellCheckerObject.edit_distance('gram', 'kilometre', 2) == 3)
+
+def test_correction_smallest_distance():
+    assert(SpellCheckerObject.get_instance().correction('klogram') == 'kilogram')
+
+def test_correction_not_found():
+    CORRECTOR = SpellCheckerObject.get_instance()
+    assert(CORRECTOR.correction('gallitre') == 'gallitre')
+    # misses are cached as well
+    assert('gallitre' in CORRECTOR.cache)
+
+def test_correction_skips_numbers():
+    assert(SpellCheckerObject.get_instance().correction('12') == '12')
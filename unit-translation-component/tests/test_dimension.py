@@ -0,0 +1,20 @@
+from unit_translation_component import Unit, constant
+from unit_translation_component.dimension import Dimension
+
+def test_dimension_vector_interned():
+    assert(Dimension(constant.OM2 + 'speed-Dimension').vector is Dimension(vector=[-1, 1, 0, 0, 0, 0, 0]).vector)
+
+def test_dimension_sum_does_not_mutate():
+    LENGTH = Dimension(constant.OM2 + 'length-Dimension')
+    AREA = LENGTH.dim_sum(LENGTH)
+    assert(LENGTH.vector == (0, 1, 0, 0, 0, 0, 0))
+    assert(AREA.vector == (0, 2, 0, 0, 0, 0, 0))
+    assert(AREA.dim_sub(LENGTH).dim_equals(LENGTH))
+
+def test_unit_dimension_vector():
+    assert(Unit('kilometre per hour').dimension_vector == (-1, 1, 0, 0, 0, 0, 0))
+
+def test_compatible_units():
+    COMPATIBLE = Unit('gram').compatible_units()
+    assert(constant.OM2 + 'kilogram' in COMPATIBLE)
+    assert(constant.OM2 + 'metre' not in COMPATIBLE)
@@ -0,0 +1,16 @@
+from unit_translation_component import Unit, constant, floatequal
+from unit_translation_component.index import OMIndex
+
+def test_factor_si_base_unit():
+    assert(constant.OM2 + 'kilogram' in OMIndex.get_instance().si_unit_set)
+    assert(Unit('kilogram').get_factor_si() == 1.0)
+
+def test_factor_si_compound():
+    # kilometre per hour = 1000 / 3600 metre per second
+    assert(floatequal(Unit('kilometre per hour').get_factor_si(), 1000 / 3600))
+
+def test_factor_si_memoized():
+    Unit('centimetre per second squared').get_factor_si()
+    # the factors of the units it is composed of are computed on the way
+    assert(constant.OM2 + 'centimetre' in Unit.si_factors)
+    assert(floatequal(Unit.si_factors[constant.OM2 + 'centimetre'], 0.01))
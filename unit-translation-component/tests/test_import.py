@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+# Importing the package must not load the ontology, see warmup()
+IMPORT_CHECK = '''
+import sys, time
+start = time.perf_counter()
+import unit_translation_component
+elapsed = time.perf_counter() - start
+from unit_translation_component.index import OMIndex
+assert 'rdflib' not in sys.modules, 'rdflib imported'
+assert OMIndex._OMIndex__instance is None, 'unit index loaded'
+print(elapsed)
+'''
+
+# Generous bound, importing takes well below 0.1s; parsing om-2.ttl took seconds
+MAX_IMPORT_SECONDS = 1.0
+
+def test_import_is_lazy():
+    RES = subprocess.run([sys.executable, '-c', IMPORT_CHECK], capture_output=True, text=True)
+    assert RES.returncode == 0, RES.stderr
+    assert(float(RES.stdout) < MAX_IMPORT_SECONDS)
+
+def test_warmup():
+    from unit_translation_component import warmup, Unit, constant
+    assert(warmup() >= 0)
+    assert(constant.OM2 + 'kilogram' in Unit.si_factors)
@@ -0,0 +1,74 @@
+import shutil
+
+from unit_translation_component import Unit, constant, index
+from unit_translation_component.index import OMIndex, source_digest, source_size
+
+def test_index_up_to_date():
+    # the shipped snapshot has to be rebuilt (compile_index.py) whenever om-2.ttl changes
+    assert(OMIndex.get_instance().meta['source_sha1'] == source_digest())
+    assert(OMIndex.get_instance().meta['source_size'] == source_size())
+
+def test_index_find_by_label():
+    assert(OMIndex.get_instance().find_by_label('kilogram') == (constant.OM2 + 'kilogram',))
+
+def test_index_find_by_symbol():
+    assert(OMIndex.get_instance().find_by_symbol('kg') == (constant.OM2 + 'kilogram',))
+
+def test_index_find_by_label_language():
+    assert(OMIndex.get_instance().find_by_label('liter', 'nl') == (constant.OM2 + 'litre',))
+    assert(OMIndex.get_instance().find_by_label('liter', 'en') == ())
+
+def test_index_find_by_symbol_multiple_units():
+    assert(len(OMIndex.get_instance().find_by_symbol('m')) > 1)
+
+def test_index_multiple_units_warning(capsys):
+    Unit('m', True)
+    assert('More units with the same label/symbol found' in capsys.readouterr().out)
+
+def test_index_prefix_factor():
+    assert(OMIndex.get_instance().prefix_factor(constant.OM2 + 'kilo') == 1000.0)
+
+def test_index_dimension_vector():
+    # time, length, mass, temperature, current, amount of substance, luminous intensity
+    vector = OMIndex.get_instance().dimension_vector(constant.OM2 + 'speed-Dimension')
+    assert(vector == (-1, 1, 0, 0, 0, 0, 0))
+
+def test_index_scale_offset():
+    scale = OMIndex.get_instance().scale(constant.OM2 + 'degreeCelsius')
+    assert(scale == (constant.OM2 + 'CelsiusScale', -273.15))
+
+def test_index_si_units():
+    assert(constant.OM2 + 'metre' in constant.SI_units)
+
+def test_index_concurrent_first_use(monkeypatch):
+    # a fresh index used from several threads at once builds its tables once and answers every lookup
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr(OMIndex, '_OMIndex__instance', None)
+    index = OMIndex()
+    with ThreadPoolExecutor(8) as pool:
+        found = list(pool.map(lambda _: index.find_by_symbol('kg'), range(32)))
+    assert(found == [(constant.OM2 + 'kilogram',)] * 32)
+
+def test_index_of_other_format_is_rebuilt(tmp_path, monkeypatch):
+    TARGET = str(tmp_path / 'om-2.idx')
+    DATA = bytearray(open(index.path, 'rb').read())
+    magic, version, count = index.HEADER.unpack_from(DATA, 0)
+    index.HEADER.pack_into(DATA, 0, magic, version - 1, count)
+    open(TARGET, 'wb').write(DATA)
+    monkeypatch.setattr(OMIndex, '_OMIndex__instance', None)
+    assert(OMIndex(TARGET).find_by_symbol('kg') == (constant.OM2 + 'kilogram',))
+    assert(index.HEADER.unpack_from(open(TARGET, 'rb').read(), 0)[1] == index.FORMAT_VERSION)
+    assert(list(tmp_path.iterdir()) == [tmp_path / 'om-2.idx'])
+
+def test_stale_read_only_index_is_rebuilt_in_memory(tmp_path, monkeypatch, capsys):
+    # om-2.ttl changed after the snapshot was built, and the snapshot can not be written
+    TARGET = str(tmp_path / 'om-2.idx')
+    shutil.copy(index.path, TARGET)
+    monkeypatch.setattr(index, 'source_size', lambda source_path=None: 0)
+
+    def read_only(sections, target_path):
+        raise PermissionError('read-only')
+    monkeypatch.setattr(index, 'write_index', read_only)
+    monkeypatch.setattr(OMIndex, '_OMIndex__instance', None)
+    assert(OMIndex(TARGET).find_by_symbol('kg') == (constant.OM2 + 'kilogram',))
+    assert('is out of date' in capsys.readouterr().err)
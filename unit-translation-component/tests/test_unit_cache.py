@@ -0,0 +1,29 @@
+from unit_translation_component import Unit, constant
+
+def test_unit_interned():
+    Unit.cache.clear()
+    assert(Unit('kilogram') is Unit('kilogram'))
+    assert(Unit.cache.info()['misses'] == 1 and Unit.cache.info()['hits'] == 1)
+
+def test_unit_cache_key_includes_arguments():
+    Unit.cache.clear()
+    assert(Unit('kg', True) is not Unit('kilogram'))
+    assert(Unit('kg', True) == Unit('kilogram'))
+    assert(Unit(constant.OM2 + 'kilogram', internal=True) is Unit(constant.OM2 + 'kilogram', internal=True))
+
+def test_unit_cache_bound():
+    Unit.cache.clear()
+    Unit.cache.resize(2)
+    try:
+        first = Unit('metre')
+        Unit('gram')
+        Unit('litre')
+        assert(len(Unit.cache) == 2)
+        assert(Unit('metre') is not first)
+    finally:
+        Unit.cache.resize(1024)
+
+def test_unit_cache_clear():
+    Unit('metre')
+    Unit.cache.clear()
+    assert(len(Unit.cache) == 0 and Unit.cache.info()['hits'] == 0)
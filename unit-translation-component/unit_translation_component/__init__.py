@@ -1,4 +1,14 @@
 # Import most used components of the conversion library
-from unit_translation_component.values import Values
-from unit_translation_component.unit import Unit, cache_units
-from unit_translation_component.constant import floatequal, OMGraph
+# Importing does not load the ontology, that happens on first use of a Unit (or with warmup())
+from unit_translation_component.values import Values, convert_array
+from unit_translation_component.unit import Unit, cache_units, warmup
+from unit_translation_component.conversion_plan import ConversionPlan
+from unit_translation_component.constant import floatequal
+
+
+def __getattr__(name):
+    # The OM2 graph is only parsed when it is explicitly requested
+    if name == 'OMGraph':
+        from unit_translation_component.ontology import load_graph
+        return load_graph()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
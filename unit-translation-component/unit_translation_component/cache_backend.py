@@ -0,0 +1,250 @@
+# Cache backends for values derived from OM2 (e.g. the SI factor of a unit).
+# Entries are stored like Redis hashes: a key (the unit URI) with named fields.
+# The backend is chosen with the UNIT_CACHE_BACKEND environment variable
+# (memory, sqlite or redis) or with set_backend().
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+from unit_translation_component import index
+
+
+def __default_directory() -> str:
+    # The package directory is not always writable (e.g. a system wide install), so files derived from OM2 (the
+    # SQLite cache, the dictionary written by cache_units) live in the user cache directory, or the temporary
+    # directory of a user without a home directory
+    directory = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    if directory.startswith('~'):
+        directory = tempfile.gettempdir()
+    return os.path.join(directory, 'unit_translation_component')
+
+
+# Default directory of the files written by the package, and location of the SQLite cache
+default_directory = __default_directory()
+default_path = os.path.join(default_directory, os.path.basename(index.path)[:-4] + '.cache.sqlite')
+default_url = 'redis://localhost:6379/0'
+
+# Value cached for a unit that can not be expressed in SI (it has no SI factor), so it is not computed again
+NOT_EXPRESSIBLE = 'none'
+
+
+class CacheBackend:
+    # Interface of a cache backend
+
+    def available(self) -> bool:
+        # Check if the backend can be used
+        return True
+
+    def get_many(self, keys, field: str) -> dict:
+        # Get the cached values of a field for several keys, keys that are not cached are left out
+        raise NotImplementedError
+
+    def set_many(self, field: str, values: dict):
+        # Store the values of a field for several keys
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get(self, key: str, field: str):
+        return self.get_many([key], field).get(key)
+
+    def set(self, key: str, field: str, value):
+        self.set_many(field, {key: value})
+
+    def __repr__(self):
+        return f'<{type(self).__name__}>'
+
+
+class MemoryCacheBackend(CacheBackend):
+    # Cache that lives as long as the process
+
+    def __init__(self):
+        self.__data = {}
+
+    def get_many(self, keys, field: str) -> dict:
+        found = {}
+        for key in keys:
+            value = self.__data.get((key, field))
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set_many(self, field: str, values: dict):
+        for key, value in values.items():
+            self.__data[(key, field)] = value
+
+    def clear(self):
+        self.__data.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    # Cache persisted in a SQLite file, so conversions are warm after a restart without a cache server
+
+    # SQLite limits the number of parameters of a statement
+    CHUNK_SIZE = 500
+
+    def __init__(self, path: str = None):
+        self.path = path or default_path
+        self.__connection = None
+        self.__lock = threading.Lock()
+        # Flag to indicate the file can be opened, None until it is tried
+        self.__flag = None
+
+    def __connect(self):
+        if self.__connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute('CREATE TABLE IF NOT EXISTS unit_cache ('
+                               'key TEXT NOT NULL, field TEXT NOT NULL, value TEXT, PRIMARY KEY (key, field))')
+            connection.commit()
+            self.__connection = connection
+        return self.__connection
+
+    def available(self) -> bool:
+        # The file is opened once, a file that can not be opened (e.g. in a directory that is not writable) is
+        # reported once and not tried again
+        if self.__flag is None:
+            try:
+                with self.__lock:
+                    self.__connect()
+                self.__flag = True
+            except (sqlite3.Error, OSError) as e:
+                print('Unit cache %s not available, factors are not cached. %s' % (self.path, e), file=sys.stderr)
+                self.__flag = False
+        return self.__flag
+
+    def get_many(self, keys, field: str) -> dict:
+        keys = list(keys)
+        found = {}
+        if not keys or not self.available():
+            return found
+        with self.__lock:
+            for start in range(0, len(keys), self.CHUNK_SIZE):
+                chunk = keys[start:start + self.CHUNK_SIZE]
+                rows = self.__connection.execute(
+                    'SELECT key, value FROM unit_cache WHERE field = ? AND key IN (%s)' % ','.join('?' * len(chunk)),
+                    [field] + chunk)
+                found.update(rows)
+        return found
+
+    def set_many(self, field: str, values: dict):
+        if not values or not self.available():
+            return
+        with self.__lock:
+            self.__connection.executemany('INSERT OR REPLACE INTO unit_cache (key, field, value) VALUES (?, ?, ?)',
+                                          ((key, field, str(value)) for key, value in values.items()))
+            self.__connection.commit()
+
+    def clear(self):
+        if not self.available():
+            return
+        with self.__lock:
+            self.__connection.execute('DELETE FROM unit_cache')
+            self.__connection.commit()
+
+    def __repr__(self):
+        return f'<{type(self).__name__} path: {self.path}>'
+
+
+class RedisCacheBackend(CacheBackend):
+    # Cache shared through a Redis server, all keys of a call are sent in one pipeline
+
+    def __init__(self, url: str = None):
+        import redis
+        self.url = url or default_url
+        self.__redis = redis.StrictRedis.from_url(self.url, decode_responses=True)
+        # Flag to indicate the redis instance is available
+        self.__flag = None
+
+    def available(self) -> bool:
+        if self.__flag is None:
+            import redis
+            try:
+                self.__flag = bool(self.__redis.ping())
+            except redis.exceptions.ConnectionError:
+                self.__flag = False
+        return self.__flag
+
+    def get_many(self, keys, field: str) -> dict:
+        keys = list(keys)
+        if not keys or not self.available():
+            return {}
+        pipeline = self.__redis.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hget(key, field)
+        return {key: value for key, value in zip(keys, pipeline.execute()) if value is not None}
+
+    def set_many(self, field: str, values: dict):
+        if not values or not self.available():
+            return
+        pipeline = self.__redis.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.hset(key, field, value)
+        pipeline.execute()
+
+    def clear(self):
+        if self.available():
+            self.__redis.flushdb()
+
+    def __repr__(self):
+        return f'<{type(self).__name__} url: {self.url}>'
+
+
+BACKENDS = {
+    'memory': MemoryCacheBackend,
+    'sqlite': SQLiteCacheBackend,
+    'redis': RedisCacheBackend,
+}
+
+__backend = None
+
+
+def create_backend(name: str, path: str = None, url: str = None) -> CacheBackend:
+    # Create a backend by name, path is used by the sqlite backend and url by the redis backend
+    name = name.strip().lower()
+    if name == 'sqlite':
+        return SQLiteCacheBackend(path)
+    if name == 'redis':
+        return RedisCacheBackend(url)
+    if name == 'memory':
+        return MemoryCacheBackend()
+    raise ValueError('Unknown unit cache backend "%s", expected one of %s' % (name, ', '.join(BACKENDS)))
+
+
+def get_backend() -> CacheBackend:
+    # Get the configured backend, created from the environment on first use
+    global __backend
+    if __backend is None:
+        __backend = create_backend(os.getenv('UNIT_CACHE_BACKEND', 'memory'),
+                                   os.getenv('UNIT_CACHE_PATH'), os.getenv('UNIT_CACHE_URL'))
+    return __backend
+
+
+def set_backend(backend: CacheBackend):
+    # Replace the backend, e.g. from the configuration of an application
+    global __backend
+    __backend = backend
+
+
+def get_cached(keys, field: str) -> dict:
+    # Cached values of a field of the configured backend, nothing is cached when the backend can not be used
+    # (a cache never breaks a conversion, the values are computed instead)
+    backend = get_backend()
+    try:
+        return backend.get_many(keys, field) if backend.available() else {}
+    except Exception as e:
+        print('Unit cache %s failed, factors are computed. %s' % (backend, e), file=sys.stderr)
+        return {}
+
+
+def set_cached(field: str, values: dict):
+    # Store the values of a field in the configured backend, if it can be used
+    backend = get_backend()
+    try:
+        if values and backend.available():
+            backend.set_many(field, values)
+    except Exception as e:
+        print('Unit cache %s failed, factors are not cached. %s' % (backend, e), file=sys.stderr)
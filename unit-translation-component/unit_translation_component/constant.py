@@ -1,5 +1,3 @@
-from unit_translation_component.ontology import OMGraph
-
 # Declare OM2 path
 OM2 = 'http://www.ontology-of-units-of-measure.org/resource/om-2/'
 RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
@@ -47,15 +45,16 @@ SI_properties = [
 SI_units_URI = OM2 + 'InternationalSystemOfUnits'
 base_unit = OM2 + 'hasBaseUnit'
 
-q_SI = '''
-    select ?o where {
-        <''' + SI_units_URI + '''> <''' + base_unit + '''> ?o
-    }
-'''
 
-SI_units = []
-for r in OMGraph.query(q_SI):
-    SI_units.append(r)
+def __getattr__(name):
+    # Ontology derived values are resolved lazily, so importing the library does not load OM2
+    if name == 'SI_units':
+        from unit_translation_component.index import OMIndex
+        return list(OMIndex.get_instance().si_units)
+    if name == 'OMGraph':
+        from unit_translation_component.ontology import load_graph
+        return load_graph()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def trim_uri(uri_ref):
@@ -71,12 +70,5 @@ def floatequal(a, b, rel_tol=1e-09, abs_tol=0.0):
 
 
 def get_units_uri():
-    query = '''
-        PREFIX rdf:     <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-        select distinct ?u where {
-            ?u rdf:type ?o .FILTER regex(str(?o), "Unit|Prefixed") .
-        }'''
-    unit_list = []
-    for uri in OMGraph.query(query):
-        unit_list.append(trim_uri(uri))
-    return unit_list
+    from unit_translation_component.index import OMIndex
+    return [trim_uri(uri) for uri in OMIndex.get_instance().unit_uris()]
@@ -0,0 +1,101 @@
+from __future__ import annotations
+from unit_translation_component.unit import Unit
+from unit_translation_component.scale import TemperatureScale
+from unit_translation_component.cache_backend import NOT_EXPRESSIBLE, set_cached
+from unit_translation_component.lru_cache import LRUCache
+import os
+
+
+class ConversionPlan:
+    # Resolved conversion between two units
+    # Every conversion reduces to `y = (a * x + b) ** exponent`: a is the ratio of the SI factors,
+    # b the offset between temperature scales and the exponent is only used for exponentiated
+    # temperature units. A plan checks the dimensions and resolves the factors once, after that
+    # it can be applied to scalars or NumPy arrays without touching the ontology.
+    # Plans are kept in a bounded LRU cache, see `ConversionPlan.cache`
+
+    cache = LRUCache(int(os.getenv('PLAN_CACHE_SIZE', '1024')))
+
+    @staticmethod
+    def get(source: Unit, target: Unit) -> ConversionPlan:
+        # Get the plan for a pair of units, resolving it on first use
+        key = (source.URIRef, target.URIRef)
+        plan = ConversionPlan.cache.get(key)
+        if plan is None:
+            plan = ConversionPlan(source, target)
+            ConversionPlan.cache.put(key, plan)
+        return plan
+
+    def __init__(self, source: Unit, target: Unit):
+        source.can_convert_to(target)
+        self.source = source
+        self.target = target
+        self.exponent = 1.0
+        if source == target:
+            (self.a, self.b) = (1.0, 0.0)
+        elif not (source.f_temperature or target.f_temperature):
+            # Handle non-temperatures units
+            (f1, f2) = ConversionPlan.__factors_si(source, target)
+            self.a = f1 / f2
+            self.b = 0.0
+        else:
+            # Handle temperatures, compose source -> kelvin -> target
+            (a1, b1) = ConversionPlan.__to_kelvin(source)
+            (a2, b2) = ConversionPlan.__from_kelvin(target)
+            self.a = a1 * a2
+            self.b = b1 * a2 + b2
+            if target.f_exponentiation:
+                self.exponent = target.get_exponent_attribute()
+
+    def apply(self, quantity, percentage=100.0):
+        # Convert a quantity (or an array of quantities) of the source unit to the target unit
+        result = self.a * quantity + self.b
+        if self.exponent != 1.0:
+            result = result ** self.exponent
+        return result * (percentage / 100.0)
+
+    @staticmethod
+    def __factors_si(source: Unit, target: Unit) -> tuple:
+        # Factors are computed from the index and kept in `Unit.si_factors`, which is cheaper than a request to the
+        # cache backend, so the backend is not read here. It is a warm store shared with other processes: the
+        # factors this process computes first are written to it (in one request)
+        computed = [str(unit.URIRef) not in Unit.si_factors for unit in (source, target)]
+        factors = (source.get_factor_si(), target.get_factor_si())
+        if any(computed):
+            set_cached('factor_si', {unit.URIRef: NOT_EXPRESSIBLE if factor is None else factor
+                                     for (unit, factor, new) in zip((source, target), factors, computed) if new})
+        return factors
+
+    @staticmethod
+    def __offset(unit_uri) -> float:
+        # The kelvin scale has no offset
+        offset = TemperatureScale(unit_uri).get_offset()
+        return 0.0 if offset == "undefined" else offset
+
+    @staticmethod
+    def __to_kelvin(unit: Unit) -> tuple:
+        # (a, b) of `kelvin = a * x + b`, see Unit.to_kelvin
+        if unit.f_prefixed:
+            offset = ConversionPlan.__offset(unit.get_unit_attribute())
+        else:
+            offset = ConversionPlan.__offset(unit.URIRef)
+        factor = unit.get_factor_only_attribute()
+        return (unit.get_prefix_factor() * factor, -offset * factor)
+
+    @staticmethod
+    def __from_kelvin(unit: Unit) -> tuple:
+        # (a, b) of `x = a * kelvin + b` (before the exponent), see Unit.from_kelvin
+        if unit.f_prefixed:
+            offset = ConversionPlan.__offset(unit.get_unit_attribute())
+        elif unit.f_exponentiation:
+            offset = ConversionPlan.__offset(unit.get_base_attribute())
+        else:
+            offset = ConversionPlan.__offset(unit.URIRef)
+        factor = unit.get_factor_only_attribute()
+        if unit.f_exponentiation:
+            return (1.0 / factor, offset)
+        return (unit.get_prefix_factor() / factor, offset * unit.get_prefix_factor())
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.source.label} -> {self.target.label}: ' \
+               f'({self.a} * x + {self.b}) ** {self.exponent}>'
@@ -1,30 +1,194 @@
-from spellchecker import SpellChecker
+from unit_translation_component import cache_backend
+from unit_translation_component.lru_cache import LRUCache
+import json
 import os
+import string
+import threading
 
 
 class SpellCheckerObject:
+    # Corrects misspelled unit labels against unit_dictionary.json
+    # Gives the same corrections as the pyspellchecker instance it replaces: the known words at
+    # the smallest (Damerau-Levenshtein) edit distance, 1 or 2, the alphabetically first of them if
+    # there are several, or the word itself if there is none. Instead of generating every string
+    # within two edits, words are looked up in a trigram index that is built on first use and only
+    # the few words sharing enough trigrams are compared. Corrections, including misses, are cached.
+
     __instance = None
-    __flag = None
+    __instance_lock = threading.Lock()
+
+    # Largest number of edits a correction can be away from the word
+    DISTANCE = 2
+    # Number of trigrams one edit can change (an adjacent transposition changes 4)
+    GRAMS_PER_EDIT = 4
 
     @staticmethod
     def get_instance():
         if SpellCheckerObject.__instance is None:
-            SpellCheckerObject()
+            with SpellCheckerObject.__instance_lock:
+                if SpellCheckerObject.__instance is None:
+                    SpellCheckerObject()
         return SpellCheckerObject.__instance
 
-    def __init__(self):
+    def __init__(self, dictionary_path: str = None):
         if SpellCheckerObject.__instance is not None:
             raise Exception("This is a singleton class.")
         else:
-            path = os.path.abspath(__file__)
-            path = path[:-12]
-            path = path + 'unit_dictionary.json'
-            SpellCheckerObject.__instance = SpellChecker(language=None, distance=4, case_sensitive=True)
-            SpellCheckerObject.__instance.word_frequency.load_dictionary(path)
+            # None for the dictionary found by path(), looked up whenever the index is built
+            self.dictionary_path = dictionary_path
+            self.cache = LRUCache(int(os.getenv('CORRECTION_CACHE_SIZE', '1024')))
+            # (frequencies, longest word length, trigram postings, words by length, words), built on
+            # first use and replaced as a whole, so it is read without locking
+            self.__index = None
+            self.__lock = threading.Lock()
+            SpellCheckerObject.__instance = self
 
     @staticmethod
     def path():
+        # The dictionary written by cache_units if there is one, the dictionary shipped with the package otherwise
+        written = SpellCheckerObject.written_path()
+        if os.path.exists(written):
+            return written
         path = os.path.abspath(__file__)
         path = path[:-12]
         path = path + 'unit_dictionary.json'
         return path
+
+    @staticmethod
+    def written_path():
+        # Where cache_units writes the dictionary: UNIT_DICTIONARY_PATH, or next to the SQLite cache by default
+        # (the package directory is not always writable)
+        return os.getenv('UNIT_DICTIONARY_PATH') or os.path.join(cache_backend.default_directory,
+                                                                 'unit_dictionary.json')
+
+    def __build_index(self) -> tuple:
+        # Load the dictionary and index every word by its trigrams and by its length
+        with open(self.dictionary_path or SpellCheckerObject.path(), encoding='utf-8') as dictionary_file:
+            frequencies = json.load(dictionary_file)
+        words = sorted(frequencies)
+        trigrams = {}
+        lengths = {}
+        for i, word in enumerate(words):
+            for gram in SpellCheckerObject.__trigrams(word):
+                postings = trigrams.setdefault(gram, [])
+                if not postings or postings[-1] != i:
+                    postings.append(i)
+            lengths.setdefault(len(word), []).append(i)
+        return (frequencies, max((len(word) for word in words), default=0), trigrams, lengths, words)
+
+    def reload(self):
+        # Rebuild the index on next use (e.g. after cache_units rewrote the dictionary)
+        with self.__lock:
+            self.__index = None
+            self.cache.clear()
+
+    def known(self, word: str) -> bool:
+        return word in self.__get_index()[0]
+
+    def correction(self, word: str) -> str:
+        # The most probable correct spelling for the word
+        word = str(word)
+        corrected = self.cache.get(word)
+        if corrected is None:
+            corrected = self.__correct(word)
+            self.cache.put(word, corrected)
+        return corrected
+
+    def candidates(self, word: str) -> list:
+        # Known words at the smallest edit distance (at most 2) from the word
+        index = self.__get_index()
+        if word in index[0] or not SpellCheckerObject.__should_check(word, index[1]):
+            return [word]
+        by_distance = {}
+        for candidate in SpellCheckerObject.__neighbours(word, index):
+            distance = SpellCheckerObject.edit_distance(word, candidate, self.DISTANCE)
+            if distance <= self.DISTANCE:
+                by_distance.setdefault(distance, []).append(candidate)
+        if not by_distance:
+            return [word]
+        return sorted(by_distance[min(by_distance)])
+
+    def __get_index(self) -> tuple:
+        index = self.__index
+        if index is None:
+            with self.__lock:
+                if self.__index is None:
+                    self.__index = self.__build_index()
+                index = self.__index
+        return index
+
+    def __correct(self, word: str) -> str:
+        candidates = self.candidates(word)
+        frequencies = self.__get_index()[0]
+        # max keeps the first (alphabetical) candidate when frequencies are equal
+        return max(candidates, key=lambda candidate: frequencies.get(candidate, 0))
+
+    @staticmethod
+    def __should_check(word: str, longest: int) -> bool:
+        # Same words are skipped as by pyspellchecker: punctuation, numbers and too long words
+        if len(word) == 1 and word in string.punctuation:
+            return False
+        if len(word) > longest + 3:
+            return False
+        try:
+            float(word)
+            return False
+        except ValueError:
+            return True
+
+    @staticmethod
+    def __neighbours(word: str, index: tuple) -> list:
+        # Words that can be within DISTANCE edits of the word: a similar length and, since every edit
+        # changes at most GRAMS_PER_EDIT trigrams, enough trigrams in common
+        (_, _, trigrams, lengths, words) = index
+        grams = SpellCheckerObject.__trigrams(word)
+        shared = {}
+        for gram in set(grams):
+            count = grams.count(gram)
+            for i in trigrams.get(gram, ()):
+                shared[i] = shared.get(i, 0) + count
+        slack = SpellCheckerObject.DISTANCE * SpellCheckerObject.GRAMS_PER_EDIT
+        neighbours = []
+        for length in range(len(word) - SpellCheckerObject.DISTANCE, len(word) + SpellCheckerObject.DISTANCE + 1):
+            # words have length + 2 (padded) trigrams
+            required = max(len(word), length) + 2 - slack
+            for i in lengths.get(length, ()):
+                if required <= 0 or shared.get(i, 0) >= required:
+                    neighbours.append(words[i])
+        return neighbours
+
+    @staticmethod
+    def __trigrams(word: str) -> list:
+        padded = '\0\0' + word + '\0\0'
+        return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    @staticmethod
+    def edit_distance(a: str, b: str, limit: int = None) -> int:
+        # Damerau-Levenshtein distance (insertions, deletions, substitutions and transpositions of
+        # adjacent characters, also when other edits happen in between), limit + 1 when it exceeds limit
+        if limit is not None and abs(len(a) - len(b)) > limit:
+            return limit + 1
+        infinity = len(a) + len(b)
+        last_row = {}
+        rows = [[infinity] * (len(b) + 2)]
+        rows.append([infinity] + list(range(len(b) + 1)))
+        for i in range(1, len(a) + 1):
+            row = [infinity, i] + [0] * len(b)
+            last_match = 0
+            for j in range(1, len(b) + 1):
+                k = last_row.get(b[j - 1], 0)
+                l = last_match
+                cost = 1
+                if a[i - 1] == b[j - 1]:
+                    cost = 0
+                    last_match = j
+                row[j + 1] = min(rows[i][j] + cost,
+                                 row[j] + 1,
+                                 rows[i][j + 1] + 1,
+                                 rows[k][l] + (i - k - 1) + 1 + (j - l - 1))
+            rows.append(row)
+            last_row[a[i - 1]] = i
+            if limit is not None and min(row[1:]) > limit:
+                return limit + 1
+        distance = rows[-1][-1]
+        return distance if limit is None or distance <= limit else limit + 1
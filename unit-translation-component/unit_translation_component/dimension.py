@@ -1,70 +1,45 @@
-from unit_translation_component.redis_instance import RedisObject
-from unit_translation_component.ontology import OMGraph
+from unit_translation_component.index import OMIndex
 import unit_translation_component.constant as ct
 
 
-# Dimension class creates a dictionary for each dimension consisting of all
-# properties and their values, where the dimension is given as a URIref through arg_dim
+# Dimension class holds the exponents of the SI base quantities of a dimension,
+# where the dimension is given as a URIref through arg_dim
 class Dimension:
     # Represents a dimension
 
-    # Creates a dictionary for each dimension consisting of all
-    # properties and their values, where the dimension is given as a URIref through arg_dim
+    # The exponents are an immutable tuple ordered as constant.SI_properties (the vector).
+    # Vectors are interned, so equal dimensions share one tuple and comparing them is cheap.
+    vectors = {}
 
-    def __init__(self, arg_dim: str):
-        self.values = {}
+    def __init__(self, arg_dim: str = None, vector: tuple = None):
         self.name = arg_dim
-        # For each property in SI_properties query the OM2 graph for the corresponding value
-        # and save it as a new entry in the dictionary
-        if RedisObject.available():
-            self.__redis_init()
-        else:
-            self.__standard_init()
-
-    def __redis_init(self):
-        redis_instance = RedisObject.get_instance()
-        if not redis_instance.exists(self.name):
-            for pred in ct.SI_properties:
-                value = '''
-                    select ?o where {
-                        <''' + str(self.name) + '''> <''' + ct.OM2 + pred + '''> ?o
-                    }'''
-                r = OMGraph.query(value)
-                if len(r) > 0:
-                    for res in r:
-                        redis_instance.hmset(str(self.name), {str(pred): str(res[0])})
-                else:
-                    redis_instance.hmset(str(self.name), {str(pred): '0'})
-        for pred in ct.SI_properties:
-            self.values[pred] = int(redis_instance.hget(str(self.name), pred))
-
-    def __standard_init(self):
-        for pred in ct.SI_properties:
-            value = '''
-                select ?o where {
-                    <''' + str(self.name) + '''> <''' + ct.OM2 + pred + '''> ?o
-                }'''
-            for res in OMGraph.query(value):
-                self.values[pred] = int(res[0])
-        for pred in ct.SI_properties:
-            if pred not in self.values:
-                self.values[pred] = 0
+        if vector is None:
+            # Take the exponents from the compiled OM2 index,
+            # properties that are not defined for the dimension are 0
+            vector = OMIndex.get_instance().dimension_vector(arg_dim) if arg_dim is not None else None
+            if vector is None:
+                vector = (0,) * len(ct.SI_properties)
+        self.vector = Dimension.intern(vector)
+
+    @staticmethod
+    def intern(vector) -> tuple:
+        # Get the shared tuple for a vector
+        vector = tuple(vector)
+        return Dimension.vectors.setdefault(vector, vector)
+
+    @property
+    def values(self) -> dict:
+        # Exponents keyed by SI property
+        return dict(zip(ct.SI_properties, self.vector))
 
     def dim_equals(self, to_dim):
         # Checks if two dimensions are equal
-        for x in self.values:
-            if self.values[x] != to_dim.values[x]:
-                return False
-        return True
+        return self.vector == to_dim.vector
 
     def dim_sum(self, arg_dim):
-        # Sums two dimensions SI values
-        for x in self.values:
-            self.values[x] = self.values[x] + arg_dim.values[x]
-        return self
+        # Sums two dimensions SI values into a new dimension
+        return Dimension(vector=[a + b for a, b in zip(self.vector, arg_dim.vector)])
 
     def dim_sub(self, arg_dim):
-        # Subtracts two dimensions SI values
-        for x in self.values:
-            self.values[x] = self.values[x] - arg_dim.values[x]
-        return self
+        # Subtracts two dimensions SI values into a new dimension
+        return Dimension(vector=[a - b for a, b in zip(self.vector, arg_dim.vector)])
@@ -0,0 +1,346 @@
+# Compiled snapshot of the parts of OM2 needed for conversions (om-2.idx).
+# Parsing om-2.ttl takes seconds, the snapshot is memory-mapped and every section is only
+# decoded on first use. Rebuild it with compile_index.py after changing om-2.ttl.
+import hashlib
+import mmap
+import os
+import pickle
+import re
+import struct
+import sys
+import tempfile
+import threading
+import types
+
+import unit_translation_component.constant as ct
+from unit_translation_component import ontology
+
+# Declare path to the snapshot (next to om-2.ttl)
+path = ontology.path[:-4] + '.idx'
+
+MAGIC = b'OMIX'
+FORMAT_VERSION = 3
+# Sections are pickled with a fixed protocol, so every supported Python version reads the shipped snapshot
+PICKLE_PROTOCOL = 4
+# magic, format version, number of sections
+HEADER = struct.Struct('<4sHH')
+# section name, offset, length
+SECTION = struct.Struct('<16sQQ')
+
+# Unit attributes stored in a unit record, keyed by their OM2 predicate
+UNIT_REFERENCES = {
+    ct.HAS_DIMENSION: 'dimension',
+    ct.HAS_PREFIX: 'prefix',
+    ct.HAS_UNIT: 'unit',
+    ct.HAS_NUMERATOR: 'numerator',
+    ct.HAS_DENOMINATOR: 'denominator',
+    ct.HAS_BASE: 'base',
+    ct.HAS_TERM1: 'term1',
+    ct.HAS_TERM2: 'term2',
+}
+UNIT_NUMBERS = {
+    ct.HAS_FACTOR: 'factor',
+    ct.HAS_EXPONENT: 'exponent',
+}
+# Attributes that point to other units, their records are compiled as well
+COMPOSITION = ('unit', 'numerator', 'denominator', 'base', 'term1', 'term2')
+
+
+class IndexFormatException(Exception):
+    """Raised when the snapshot file can not be read"""
+
+
+def source_digest(source_path: str = ontology.path) -> str:
+    # Digest of the turtle file, checked by the tests to make sure the shipped snapshot is up to date
+    with open(source_path, 'rb') as source:
+        return hashlib.sha1(source.read()).hexdigest()
+
+
+def source_size(source_path: str = ontology.path) -> int:
+    # Size of the turtle file, checked whenever the snapshot is loaded (cheaper than the digest)
+    return os.path.getsize(source_path)
+
+
+def compile_sections(graph) -> dict:
+    # Extract everything the conversion library needs from the OM2 graph
+    from rdflib import RDF, RDFS, Literal, URIRef
+
+    # Units that can be found by label or symbol (same selection as the former
+    # `rdf:type ?o . FILTER regex(str(?o), "Unit|Prefixed")` query)
+    unit_uris = []
+    seen = set()
+    for subject, type_uri in graph.subject_objects(RDF.type):
+        if subject not in seen and re.search('Unit|Prefixed', str(type_uri)):
+            seen.add(subject)
+            unit_uris.append(str(subject))
+
+    symbol = URIRef(ct.OM2 + 'symbol')
+    units = {}
+    pending = list(unit_uris)
+    while pending:
+        uri = pending.pop()
+        if uri in units:
+            continue
+        record = {'types': [], 'quantities': [], 'labels': [], 'symbols': []}
+        for pred, out in graph.predicate_objects(URIRef(uri)):
+            pred = str(pred)
+            if pred == ct.PREFIX_TYPE:
+                record['types'].append(ct.trim_uri(out)[0])
+            elif pred in UNIT_REFERENCES:
+                record[UNIT_REFERENCES[pred]] = str(out)
+            elif pred in UNIT_NUMBERS:
+                record[UNIT_NUMBERS[pred]] = float(out)
+            elif pred == ct.HAS_QUANTITY:
+                record['quantities'].append(str(out))
+            elif pred == ct.RDF_SCHEMA_LABEL and isinstance(out, Literal):
+                record['labels'].append((str(out), out.language or ''))
+            elif pred == str(symbol) and isinstance(out, Literal) and out.language is None and out.datatype is None:
+                record['symbols'].append(str(out))
+        for key in ('types', 'quantities', 'labels', 'symbols'):
+            record[key] = tuple(sorted(record[key]))
+        units[uri] = record
+        pending.extend(record[key] for key in COMPOSITION if key in record)
+
+    prefixes = {}
+    for record in units.values():
+        if 'prefix' in record and record['prefix'] not in prefixes:
+            factor = graph.value(URIRef(record['prefix']), URIRef(ct.HAS_FACTOR))
+            prefixes[record['prefix']] = None if factor is None else float(factor)
+
+    dimensions = {}
+    for pred in ct.SI_properties:
+        for subject, exponent in graph.subject_objects(URIRef(ct.OM2 + pred)):
+            vector = dimensions.setdefault(str(subject), [0] * len(ct.SI_properties))
+            vector[ct.SI_properties.index(pred)] = int(exponent)
+    dimensions = {uri: tuple(vector) for uri, vector in dimensions.items()}
+
+    # Temperature scales, keyed by the unit they belong to
+    scales = {}
+    for scale, type_uri in graph.subject_objects(RDF.type):
+        if not re.search('Ratio|Interval', str(type_uri)):
+            continue
+        offset = graph.value(scale, URIRef(ct.HAS_OFFSET_TEMP))
+        for unit in graph.objects(scale, URIRef(ct.HAS_UNIT)):
+            scales[str(unit)] = (str(scale), None if offset is None else float(offset))
+
+    si_units = tuple(str(unit) for unit in graph.objects(URIRef(ct.SI_units_URI), URIRef(ct.base_unit)))
+
+    # rdflib does not iterate in a stable order, sort so the snapshot is reproducible
+    return {
+        'unit_uris': tuple(sorted(unit_uris)),
+        'units': dict(sorted(units.items())),
+        'prefixes': dict(sorted(prefixes.items())),
+        'dimensions': dict(sorted(dimensions.items())),
+        'scales': dict(sorted(scales.items())),
+        'si_units': tuple(sorted(si_units)),
+    }
+
+
+def _intern(value):
+    # Share equal strings, so pickle stores repeated URIs as back-references
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, tuple):
+        return tuple(_intern(item) for item in value)
+    if isinstance(value, list):
+        return [_intern(item) for item in value]
+    if isinstance(value, dict):
+        return {_intern(key): _intern(item) for key, item in value.items()}
+    return value
+
+
+def parse_sections(source_path: str = ontology.path) -> dict:
+    # Parse om-2.ttl and compile the sections of the snapshot
+    from rdflib import Graph
+    graph = Graph()
+    graph.parse(location=source_path, format="turtle")
+    sections = {name: _intern(section) for name, section in compile_sections(graph).items()}
+    sections['meta'] = {'format': FORMAT_VERSION, 'source_sha1': source_digest(source_path),
+                        'source_size': source_size(source_path)}
+    return sections
+
+
+def write_index(sections: dict, target_path: str = path):
+    # Serialize the sections into the snapshot file
+    blobs = [(name.encode(), pickle.dumps(section, protocol=PICKLE_PROTOCOL)) for name, section in sections.items()]
+    offset = HEADER.size + SECTION.size * len(blobs)
+    table = []
+    for name, blob in blobs:
+        table.append(SECTION.pack(name, offset, len(blob)))
+        offset += len(blob)
+
+    # every writer (e.g. forked workers rebuilding a stale snapshot at once) uses its own temporary file
+    handle, tmp_path = tempfile.mkstemp(prefix=os.path.basename(target_path) + '.',
+                                        dir=os.path.dirname(os.path.abspath(target_path)))
+    try:
+        with os.fdopen(handle, 'wb') as target:
+            target.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(blobs)))
+            for entry in table:
+                target.write(entry)
+            for _, blob in blobs:
+                target.write(blob)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def compile_index(source_path: str = ontology.path, target_path: str = path):
+    # Build step: parse om-2.ttl once and write the snapshot
+    write_index(parse_sections(source_path), target_path)
+
+
+class OMIndex:
+    # Read access to the compiled OM2 snapshot
+
+    # OMIndex instance
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance():
+        # Get the instance (singleton) of this class, the file is mapped on first use
+        if OMIndex.__instance is None:
+            with OMIndex.__instance_lock:
+                if OMIndex.__instance is None:
+                    OMIndex()
+        return OMIndex.__instance
+
+    def __init__(self, index_path: str = path):
+        if OMIndex.__instance is not None:
+            raise Exception("This is a singleton class.")
+        # Decoded sections and lookup tables are never changed after they are built, so they are read
+        # without locking; the lock only makes sure each of them is built once (re-entrant, building the
+        # lookup tables decodes sections)
+        self.__lock = threading.RLock()
+        self.__decoded = {}
+        self.__buffer = None
+        self.__sections = {}
+        problem = self.__load(index_path) if os.path.exists(index_path) else 'does not exist'
+        if problem is not None:
+            self.__rebuild(index_path, problem)
+        self.__labels = None
+        self.__symbols = None
+        self.__si_unit_set = None
+        OMIndex.__instance = self
+
+    def __load(self, index_path: str):
+        # Map the snapshot and read its section table, returns why it can not be used (None if it can)
+        with open(index_path, 'rb') as index_file:
+            self.__buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.__buffer) < HEADER.size:
+            return 'is not readable'
+        magic, version, count = HEADER.unpack_from(self.__buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            return 'is not readable'
+        for i in range(count):
+            name, offset, length = SECTION.unpack_from(self.__buffer, HEADER.size + i * SECTION.size)
+            self.__sections[name.rstrip(b'\0').decode()] = (offset, length)
+        try:
+            meta = self.meta
+        except (KeyError, ValueError, EOFError, TypeError, pickle.UnpicklingError):
+            return 'is not readable'
+        # the snapshot has to match om-2.ttl, unless the ontology is not shipped
+        if os.path.exists(ontology.path) and meta.get('source_size') != source_size():
+            return 'is out of date with %s' % ontology.path
+        return None
+
+    def __rebuild(self, index_path: str, problem: str):
+        # A missing or stale snapshot is compiled from om-2.ttl and written for the next start. If it can not be
+        # written (e.g. a read-only install), the compiled sections are only used by this process.
+        if self.__buffer is not None:
+            self.__buffer.close()
+            self.__buffer = None
+        self.__sections = {}
+        try:
+            sections = parse_sections()
+        except Exception as e:
+            raise IndexFormatException('The unit index "%s" %s and can not be rebuilt from %s (%s).'
+                                       % (index_path, problem, ontology.path, e))
+        try:
+            write_index(sections, index_path)
+        except OSError as e:
+            print('WARNING: The unit index "%s" %s and can not be written (%s), it is rebuilt on every start. '
+                  'Rebuild it with compile_index.py.' % (index_path, problem, e), file=sys.stderr)
+        self.__decoded = sections
+
+    def section(self, name: str):
+        # Decode a section from the mapping on first access
+        if name not in self.__decoded:
+            with self.__lock:
+                if name not in self.__decoded:
+                    offset, length = self.__sections[name]
+                    self.__decoded[name] = pickle.loads(self.__buffer[offset:offset + length])
+        return self.__decoded[name]
+
+    @property
+    def meta(self) -> dict:
+        return self.section('meta')
+
+    @property
+    def si_units(self) -> tuple:
+        return self.section('si_units')
+
+    @property
+    def si_unit_set(self) -> frozenset:
+        # SI base units for membership tests
+        if self.__si_unit_set is None:
+            self.__si_unit_set = frozenset(self.si_units)
+        return self.__si_unit_set
+
+    def unit_uris(self) -> tuple:
+        # URIs of all units that can be found by label or symbol
+        return self.section('unit_uris')
+
+    def unit_record(self, uri: str) -> types.MappingProxyType:
+        # Attributes of a unit (read-only), an empty record if the URI is not a known unit
+        return types.MappingProxyType(self.section('units').get(str(uri), {}))
+
+    def __build_lookup_tables(self):
+        # Hash indexes from (label, language) and from symbol to unit URIs, built once from the unit records
+        units = self.section('units')
+        with self.__lock:
+            if self.__labels is None:
+                self.__fill_lookup_tables(units)
+
+    def __fill_lookup_tables(self, units: dict):
+        labels = {}
+        symbols = {}
+        for uri in self.unit_uris():
+            for key in units[uri]['labels']:
+                found = labels.setdefault(key, [])
+                if uri not in found:
+                    found.append(uri)
+            for key in units[uri]['symbols']:
+                found = symbols.setdefault(key, [])
+                if uri not in found:
+                    found.append(uri)
+        # labels is checked to see if the tables exist, so it is assigned last
+        self.__symbols = {key: tuple(uris) for key, uris in symbols.items()}
+        self.__labels = {key: tuple(uris) for key, uris in labels.items()}
+
+    def find_by_label(self, label: str, lang: str = 'en') -> tuple:
+        # All unit URIs with the given label in the given language
+        if self.__labels is None:
+            self.__build_lookup_tables()
+        return self.__labels.get((str(label), lang), ())
+
+    def find_by_symbol(self, symbol: str) -> tuple:
+        # All unit URIs with the given symbol
+        if self.__labels is None:
+            self.__build_lookup_tables()
+        return self.__symbols.get(str(symbol), ())
+
+    def prefix_factor(self, uri: str):
+        # Factor of a prefix, None if it has none
+        return self.section('prefixes').get(str(uri))
+
+    def dimension_vector(self, uri: str):
+        # SI exponents of a dimension (ordered as constant.SI_properties), None if unknown
+        return self.section('dimensions').get(str(uri))
+
+    def scale(self, unit_uri: str):
+        # (scale URI, offset) of the scale a unit belongs to, None if it has no scale
+        return self.section('scales').get(str(unit_uri))
+
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+    # Bounded mapping that evicts the least recently used entry
+    # Keeps hit/miss counters so the effectiveness of the cache can be inspected
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None):
+        # Get a cached value and mark it as most recently used
+        with self.__lock:
+            try:
+                value = self.__data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.__data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        # Add a value, evicting the least recently used entries when the cache is full
+        with self.__lock:
+            self.__data[key] = value
+            self.__data.move_to_end(key)
+            self.__evict()
+
+    def resize(self, maxsize: int):
+        # Change the bound of the cache, a bound of 0 disables caching
+        with self.__lock:
+            self.maxsize = maxsize
+            self.__evict()
+
+    def clear(self):
+        # Remove all entries and reset the counters
+        with self.__lock:
+            self.__data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.__data), 'maxsize': self.maxsize}
+
+    def __evict(self):
+        while len(self.__data) > max(self.maxsize, 0):
+            self.__data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.info()}>'
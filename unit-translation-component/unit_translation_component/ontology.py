@@ -1,4 +1,3 @@
-from rdflib import Graph
 import os
 
 # Declare path to module
@@ -6,6 +5,23 @@ path = os.path.abspath(__file__)
 path = path[:-11]
 path = path + 'om-2.ttl'
 
-# Load module from path
-OMGraph = Graph()
-OMGraph.parse(location=path, format="turtle")
+__graph = None
+
+
+def load_graph():
+    # Parse the OM2 turtle file into an rdflib graph (only once per process).
+    # Conversions do not need the graph, they read the compiled index (see index.py).
+    global __graph
+    if __graph is None:
+        from rdflib import Graph
+        graph = Graph()
+        graph.parse(location=path, format="turtle")
+        __graph = graph
+    return __graph
+
+
+def __getattr__(name):
+    # Keep `OMGraph` available for code that still queries the graph directly
+    if name == 'OMGraph':
+        return load_graph()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,146 +1,122 @@
 from __future__ import annotations
 import unit_translation_component.constant as ct
+from unit_translation_component.index import OMIndex
 from unit_translation_component.prefix import Prefix
 from unit_translation_component.exception import UnitNotFoundException, ParameterMismatchException, UnitsNotComparableException, GenericException
 from unit_translation_component.dimension import Dimension
 from unit_translation_component.scale import TemperatureScale
-from unit_translation_component.redis_instance import RedisObject
+from unit_translation_component.cache_backend import NOT_EXPRESSIBLE, get_backend
 from unit_translation_component.corrector import SpellCheckerObject
-from progress.bar import Bar
+from unit_translation_component.lru_cache import LRUCache
 import json
+import os
+import time
 
 
-class Unit:
+class InternedUnit(type):
+    # Metaclass that makes Unit construction go through an LRU cache
+    # Constructing a unit with the same arguments again returns the same (read-only) instance
+
+    def __call__(cls, unit_string: str, symbol: bool = False, lang: str = "en", internal: bool = False):
+        key = (str(unit_string), bool(symbol), lang, bool(internal))
+        unit = cls.cache.get(key)
+        if unit is None:
+            unit = super().__call__(unit_string, symbol, lang, internal)
+            cls.cache.put(key, unit)
+        return unit
+
+
+class Unit(metaclass=InternedUnit):
     # Represents a unit of measure
     # Uses the Ontology of unit of measure to provide conversions between units
-    # Can make use of Redis for caching to speed up the conversion process
+    # Can make use of a cache backend (see cache_backend.py) to speed up the conversion process
+    # Instances are interned, see `Unit.cache` for the bound, hit/miss counters and clear()
+
+    cache = LRUCache(int(os.getenv('UNIT_CACHE_SIZE', '1024')))
+
+    # SI factors by unit URI, shared by all instances (see factor_si)
+    si_factors = {}
+
+    # Units grouped by dimension, built on first use (see compatible_units)
+    __compatibility = None
 
     def __init__(self, unit_string: str, symbol: bool = False, lang: str = "en", internal: bool = False):
         self.__init_flags()
+        index = OMIndex.get_instance()
 
-        # Find unit_string in graph, if not found, raise exception
+        # Find unit_string in the OM2 index, if not found, raise exception
         # We need to include this exception to be sure the initial unit is correctly input
-        def q_find_unit():
-            return '''
-                PREFIX OM2: ''' + ct.PREFIX_OM2 + '''
-                PREFIX rdfs: ''' + ct.PREFIX_RDFS + '''
-                PREFIX rdf: ''' + ct.PREFIX_RDF + '''
-
-                select distinct ?u where {
-                    ?u rdf:type ?o .FILTER regex(str(?o), "Unit|Prefixed")'''
-
-        def searchlabel(unit_string: str, lang: str = 'en'):
-            return '''
-                        ?u rdfs:label "''' + str(unit_string) + '''"@''' + lang + ''' .
-                }'''
-
-        def q_labels(URIRef):
-            return '''
-                PREFIX OM2: ''' + ct.PREFIX_OM2 + '''
-                PREFIX rdfs: ''' + ct.PREFIX_RDFS + '''
-                PREFIX rdf: ''' + ct.PREFIX_RDF + '''
-
-                select ?o where {
-                    <''' + str(URIRef) + '''> rdfs:label ?o .
-            }'''
-
-        find_symbol = '''
-                        ?u ''' + ct.PREFIX_SYMBOL + ''' "''' + str(unit_string) + '''" .
-                    }'''
-        query_unit = ''
-        if symbol is True:
-            query_unit = q_find_unit() + find_symbol
+        if internal:
+            self.label, self.URIRef = ct.trim_uri(unit_string)
         else:
-            query_unit = q_find_unit() + searchlabel(unit_string, lang)
-
-        # First, search for the unit string
-        r_find_unit = ct.OMGraph.query(query_unit)
-        if len(r_find_unit) == 0 and not internal:
-            # If not found, search for the symbol
-            query_unit = q_find_unit() + find_symbol
-            r_find_unit = ct.OMGraph.query(query_unit)
+            # First, search for the unit string
+            if symbol is True:
+                r_find_unit = index.find_by_symbol(unit_string)
+            else:
+                r_find_unit = index.find_by_label(unit_string, lang)
             if len(r_find_unit) == 0:
-                # If still not found, try to correct the unit string and query again
-                query_unit = q_find_unit() + \
-                    searchlabel(SpellCheckerObject.get_instance(
-                    ).correction(str(unit_string)))
-                r_find_unit = ct.OMGraph.query(query_unit)
-
-                # If still not found, raise exception
+                # If not found, search for the symbol
+                r_find_unit = index.find_by_symbol(unit_string)
                 if len(r_find_unit) == 0:
-                    raise UnitNotFoundException(unit_string)
+                    # If still not found, try to correct the unit string and search again
+                    r_find_unit = index.find_by_label(
+                        SpellCheckerObject.get_instance().correction(str(unit_string)))
 
-        if not internal:
-            for row in r_find_unit:
-                self.label, self.URIRef = ct.trim_uri(row)
-                break
-        else:
-            self.label, self.URIRef = ct.trim_uri(unit_string)
+                    # If still not found, raise exception
+                    if len(r_find_unit) == 0:
+                        raise UnitNotFoundException(unit_string)
+
+            self.label, self.URIRef = ct.trim_uri(r_find_unit[0])
+
+            if len(r_find_unit) > 1:
+                print(
+                    "Warning: More units with the same label/symbol found. Using %s." % (self.label))
 
-        if len(r_find_unit) > 1 and not internal:
-            print(
-                "Warning: More units with the same label/symbol found. Using %s." % (self.label))
+        record = index.unit_record(self.URIRef)
 
         # Get english labels needed for dictionary
-        self.labels = []
-        r_labels = ct.OMGraph.query(q_labels(self.URIRef))
-        for rrow in r_labels:
-            language = str(rrow.asdict()).partition("lang=")
-            if language[2][1] == 'e' and language[2][2] == 'n':
-                self.labels.append(str(rrow).partition('\'')
-                                   [2].partition('\'')[0])
-
-        q_get_attributes = '''
-                            select ?p ?o where {
-                                <''' + self.URIRef + '''> ?p ?o
-                            }'''
-
-        self.__init_unit_from_rdf(q_get_attributes)
-
-    def __init_unit_from_rdf(self, query_attributes: str):
+        self.labels = [label for label, language in record.get('labels', ()) if language.startswith('en')]
+
+        self.__init_unit_from_record(record)
+
+    def __init_unit_from_record(self, record: dict):
         # Get attributes of specific unit and add them as fields to the object
-        # Compare keys in predicate with pre-defined constants to determine the attributes
-        r_get_attributes = ct.OMGraph.query(query_attributes)
-        for pred, out in r_get_attributes:
-            if str(pred) == ct.PREFIX_TYPE:
-                if "UnitDivision" in ct.trim_uri(out)[0]:
-                    self.f_division = True
-                if "UnitExponentiation" in ct.trim_uri(out)[0]:
-                    self.f_exponentiation = True
-                if "UnitMultiplication" in ct.trim_uri(out)[0]:
-                    self.f_multiplication = True
-            if str(pred) == ct.HAS_DIMENSION:
-                self.__has_dimension = out
-                if str(self.__has_dimension) == ct.PREFIX_TEMP:
-                    self.f_temperature = True
-            if str(pred) == ct.HAS_FACTOR:
-                self.__has_factor = out
-            if str(pred) == ct.HAS_PREFIX:
-                self.__has_prefix = Prefix(out)
-                self.f_prefixed = True
-            if str(pred) == ct.HAS_UNIT:
-                self.__has_unit = out
-            if str(pred) == ct.HAS_EXPONENT:
-                self.__has_exponent = out
-            if str(pred) == ct.HAS_NUMERATOR:
+        for unit_type in record.get('types', ()):
+            if "UnitDivision" in unit_type:
                 self.f_division = True
-                self.__has_numerator = out
-            if str(pred) == ct.HAS_DENOMINATOR:
-                self.f_division = True
-                self.__has_denominator = out
-            if str(pred) == ct.HAS_BASE:
+            if "UnitExponentiation" in unit_type:
                 self.f_exponentiation = True
-                self.__has_base = out
-            if str(pred) == ct.HAS_TERM1:
+            if "UnitMultiplication" in unit_type:
                 self.f_multiplication = True
-                self.__has_term1 = out
-            if str(pred) == ct.HAS_TERM2:
-                self.__has_term2 = out
-            if str(pred) == ct.HAS_QUANTITY and str(out) == ct.IT_QUANTITY:
-                self.f_it_quantity = True
-            if str(pred) == ct.RDF_SCHEMA_LABEL:
-                if not hasattr(self, 'labels'):
-                    self.labels = []
+        if 'dimension' in record:
+            self.__has_dimension = record['dimension']
+            if self.__has_dimension == ct.PREFIX_TEMP:
+                self.f_temperature = True
+        if 'factor' in record:
+            self.__has_factor = record['factor']
+        if 'prefix' in record:
+            self.__has_prefix = Prefix(record['prefix'])
+            self.f_prefixed = True
+        if 'unit' in record:
+            self.__has_unit = record['unit']
+        if 'exponent' in record:
+            self.__has_exponent = record['exponent']
+        if 'numerator' in record:
+            self.f_division = True
+            self.__has_numerator = record['numerator']
+        if 'denominator' in record:
+            self.f_division = True
+            self.__has_denominator = record['denominator']
+        if 'base' in record:
+            self.f_exponentiation = True
+            self.__has_base = record['base']
+        if 'term1' in record:
+            self.f_multiplication = True
+            self.__has_term1 = record['term1']
+        if 'term2' in record:
+            self.__has_term2 = record['term2']
+        if ct.IT_QUANTITY in record.get('quantities', ()):
+            self.f_it_quantity = True
         self.f_singular = not (
             self.f_division or self.f_exponentiation or self.f_multiplication or self.f_it_quantity)
 
@@ -152,21 +128,48 @@ class Unit:
         self.f_temperature = False
         self.f_it_quantity = False
         self.f_prefixed = False
+        self.__dimension_vector = None
 
     def can_convert_to(self, param):
         # Checks if the provided unit can be converted into this unit
         if not isinstance(param, Unit):
             raise ParameterMismatchException(param)
+        if self.get_dimension_attribute() == param.get_dimension_attribute():
+            return True
         if self.get_dimension_attribute() == "undefined" or param.get_dimension_attribute() == "undefined":
-            # If dimension is not defined for a unit, calculate and compare them.
-            d_self = self.get_dimension_object()
-            d_param = param.get_dimension_object()
-            if d_self.dim_equals(d_param):
+            # If dimension is not defined for a unit, compare the calculated dimension vectors.
+            if self.dimension_vector == param.dimension_vector:
                 return True
-        if self.get_dimension_attribute() != param.get_dimension_attribute():
-            raise UnitsNotComparableException(self.label, self.get_dimension_attribute(
-            ), param.label, param.get_dimension_attribute())
-        return True
+        raise UnitsNotComparableException(self.label, self.get_dimension_attribute(
+        ), param.label, param.get_dimension_attribute())
+
+    def compatible_units(self) -> tuple:
+        # URIs of all units this unit can be converted into (see can_convert_to)
+        if Unit.__compatibility is None:
+            Unit.__build_compatibility_index()
+        (by_dimension, by_vector, undefined_by_vector) = Unit.__compatibility
+        attribute = self.get_dimension_attribute()
+        uris = set(by_dimension.get(attribute, ()))
+        if attribute == "undefined":
+            uris.update(by_vector.get(self.dimension_vector, ()))
+        else:
+            uris.update(undefined_by_vector.get(self.dimension_vector, ()))
+        return tuple(sorted(uris))
+
+    @staticmethod
+    def __build_compatibility_index():
+        # Group all units of the index by dimension attribute and by dimension vector, built once
+        by_dimension = {}
+        by_vector = {}
+        undefined_by_vector = {}
+        for uri in OMIndex.get_instance().unit_uris():
+            unit = Unit(uri, internal=True)
+            attribute = unit.get_dimension_attribute()
+            by_dimension.setdefault(attribute, []).append(unit.URIRef)
+            by_vector.setdefault(unit.dimension_vector, []).append(unit.URIRef)
+            if attribute == "undefined":
+                undefined_by_vector.setdefault(unit.dimension_vector, []).append(unit.URIRef)
+        Unit.__compatibility = (by_dimension, by_vector, undefined_by_vector)
 
     # Getters
     def get_dimension_attribute(self):
@@ -187,6 +190,13 @@ class Unit:
         else:
             return Dimension(self.get_dimension_attribute())
 
+    @property
+    def dimension_vector(self) -> tuple:
+        # Interned vector of the dimension object, computed once per unit
+        if self.__dimension_vector is None:
+            self.__dimension_vector = self.get_dimension_object().vector
+        return self.__dimension_vector
+
     def get_unit_attribute(self):
         # Get the unit attribute of this unit instance
         if hasattr(self, '_Unit__has_unit'):
@@ -295,112 +305,215 @@ class Unit:
 
     def get_factor_si(self):
         # Get unit's factor w.r.t. international system units
+        return Unit.factor_si(self.URIRef)
+
+    @staticmethod
+    def factor_si(uri: str):
+        # Factor of a unit w.r.t. international system units, None if it can not be expressed in SI
+        # Evaluated over the unit records of the index (the composition of units is a DAG),
+        # every unit's factor is computed once per process and kept in `Unit.si_factors`
+        uri = str(uri)
+        if uri in Unit.si_factors:
+            return Unit.si_factors[uri]
+        factor = Unit.__evaluate_factor_si(uri, OMIndex.get_instance().unit_record(uri))
+        Unit.si_factors[uri] = factor
+        return factor
+
+    @staticmethod
+    def __evaluate_factor_si(uri: str, record: dict):
+        types = record.get('types', ())
         # Composite division unit has num / den
-        if self.f_division:
-            numerator = Unit(self.get_numerator_attribute(), internal=True)
-            denominator = Unit(self.get_denominator_attribute(), internal=True)
-
-            f1 = numerator.get_factor_si()
-            f2 = denominator.get_factor_si()
-
+        if 'numerator' in record or 'denominator' in record or any('UnitDivision' in t for t in types):
+            f1 = Unit.__reference_factor_si(record, 'numerator')
+            f2 = Unit.__reference_factor_si(record, 'denominator')
             if f1 is None or f2 is None:
                 return None
-
-            factor = f1 / f2
-            return factor
+            return f1 / f2
 
         # Composite multiplication unit has a * b
-        elif self.f_multiplication:
-            term1 = Unit(self.get_term1_attribute(), internal=True)
-            term2 = Unit(self.get_term2_attribute(), internal=True)
-
-            f1 = term1.get_factor_si()
-            f2 = term2.get_factor_si()
-
+        elif 'term1' in record or any('UnitMultiplication' in t for t in types):
+            f1 = Unit.__reference_factor_si(record, 'term1')
+            f2 = Unit.__reference_factor_si(record, 'term2')
             if f1 is None or f2 is None:
                 return None
-
-            factor = f1 * f2
-            return factor
+            return f1 * f2
 
         # Unit with exponentation, has b^e
-        elif self.f_exponentiation:
-            base = Unit(self.get_base_attribute(), internal=True)
-
-            bf = base.get_factor_si()
+        elif 'base' in record or any('UnitExponentiation' in t for t in types):
+            bf = Unit.__reference_factor_si(record, 'base')
             if bf is None:
                 return None
-
-            factor = bf ** float(self.get_exponent_attribute())
-            return factor
+            return bf ** float(record['exponent'])
 
         # A simple quantity has no factor
-        elif self.f_it_quantity:
+        elif ct.IT_QUANTITY in record.get('quantities', ()):
             return 1.0
 
         # A single unit
-        elif self.f_singular:
-            # If the searched unit is a SI Unit, return 1.0 as factor
-            for si_unit in ct.SI_units:
-                if self.label == Unit(si_unit, internal=True).label:
-                    return 1.0
-
-            if self.get_unit_attribute() is not self.URIRef:
-                next_unit = Unit(self.get_unit_attribute(), internal=True)
-                f = next_unit.get_factor_si()
-                if f is None:  # Return None if one computed factor is None
-                    return None
-                factor = self.get_factor_attribute() * f
-                return factor
-            else:
+        # If the searched unit is a SI Unit, return 1.0 as factor
+        if uri in OMIndex.get_instance().si_unit_set:
+            return 1.0
+        if 'unit' in record and record['unit'] != uri:
+            f = Unit.__reference_factor_si(record, 'unit')
+            if f is None:  # Return None if one computed factor is None
                 return None
-        else:
-            raise GenericException(
-                "Conversion not defined. Please report the repordouction steps to the developers.")
+            if 'factor' in record:
+                return record['factor'] * f
+            if 'prefix' in record:
+                return Prefix(record['prefix']).get_factor() * f
+            return f
+        return None
+
+    @staticmethod
+    def __reference_factor_si(record: dict, key: str):
+        # Factor of a unit referenced by a composite unit, None if the reference is missing
+        if key not in record:
+            return None
+        return Unit.factor_si(record[key])
 
     def __eq__(self, other: Unit):
         return other is not None and isinstance(other, Unit) and self.URIRef == other.URIRef and self.label == other.label
 
+    def __hash__(self):
+        return hash((self.URIRef, self.label))
+
     def __repr__(self):
         return f'<{type(self).__name__} label: {self.label}, uri: {self.URIRef}>'
 
 
-def cache_units():
-    # Initializes the Redis cache by adding all units
-    if not RedisObject.available():
-        print("Redis instance not available. Exiting.")
-        return
+def warmup(corrector: bool = True) -> float:
+    # Load everything conversions use up front, so the first request does not pay for it.
+    # Importing the package loads nothing, servers can call this once before forking workers.
+    # Returns the time it took in seconds.
+    start = time.perf_counter()
+    index = OMIndex.get_instance()
+    for name in ('units', 'prefixes', 'dimensions', 'scales', 'si_units'):
+        index.section(name)
+    index.find_by_label('')  # builds the label and symbol lookup tables
+    for uri in index.unit_uris():
+        Unit.factor_si(uri)
+    if corrector:
+        SpellCheckerObject.get_instance().known('')
+    return time.perf_counter() - start
+
+
+def cache_units(processes: int = None, chunk_size: int = 64, report_path: str = None,
+                dictionary_path: str = None) -> dict:
+    # Initializes the cache backend by adding all units
+    # The units are split in chunks that are processed by a pool of `processes` worker processes
+    # (os.cpu_count() by default, 1 processes them in this process). The factors of every chunk are
+    # written in one batch as soon as it completes and units that are already cached are skipped
+    # (units that can not be expressed in SI are cached as NOT_EXPRESSIBLE), so an interrupted warm-up
+    # continues where it stopped. The labels of the cached units are written to the dictionary of the
+    # spelling corrector (dictionary_path, SpellCheckerObject.written_path() by default). Returns (and
+    # optionally writes to report_path as JSON) a report with the throughput, failures and total time.
+    # Only needed for the warm-up, not imported with the package
+    from progress.bar import Bar
+    import multiprocessing
+
+    backend = get_backend()
+    if not backend.available():
+        print("Cache backend %s not available. Exiting." % backend)
+        return None
+
+    start = time.perf_counter()
+    processes = processes or os.cpu_count() or 1
+    unit_list = ct.get_units_uri()
+    cached_factors = backend.get_many([uri for label, uri in unit_list], 'factor_si')
+    pending = [uri for label, uri in unit_list if uri not in cached_factors]
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
 
     cached = 0
-    unit_list = ct.get_units_uri()
     warnings = []
+    failures = []
     dictdata = {}
-    with Bar('Processing', max=len(unit_list), suffix='%(index)d/%(max)d [%(elapsed_td)s]') as bar:
-        for label, uri in unit_list:
-            # Initialize Unit and calculate SI factor
-            unit = Unit(uri, internal=True)
-            factor = unit.get_factor_si()
-            if factor is not None:
-                for label in unit.labels:  # Create dictionary
-                    dictdata[label] = 1
-                # Set factor on redis
-                RedisObject.get_instance().hmset(uri, {'factor_si': factor})
-                cached = cached + 1
-                bar.message = f'Processed {unit.label}'
+    index = OMIndex.get_instance()
+    for uri, factor in cached_factors.items():  # Dictionary entries of units cached by a previous run
+        if factor == NOT_EXPRESSIBLE:
+            continue
+        for label, language in index.unit_record(uri).get('labels', ()):
+            if language.startswith('en'):
+                dictdata[label] = 1
+
+    # the progress bar can not show an empty run
+    if pending:
+        with Bar('Processing', max=len(pending), suffix='%(index)d/%(max)d [%(elapsed_td)s]') as bar:
+            if processes > 1 and len(chunks) > 1:
+                pool = multiprocessing.Pool(min(processes, len(chunks)))
+                results = pool.imap_unordered(__cache_chunk, chunks)
             else:
-                warnings.append(
-                    f"WARNING: Unit {label} cannot be expressed in SI.")
-            bar.next()
-        bar.finish()
-
-    print("Cached %d units." % (cached))
+                pool = None
+                results = map(__cache_chunk, chunks)
+            try:
+                for chunk_results in results:
+                    factors = {}
+                    for uri, factor, labels, error in chunk_results:
+                        if error is not None:
+                            failures.append({'uri': uri, 'error': error})
+                        elif factor is not None:
+                            for label in labels:  # Create dictionary
+                                dictdata[label] = 1
+                            factors[uri] = factor
+                        else:
+                            warnings.append(
+                                f"WARNING: Unit {ct.trim_uri(uri)[0]} cannot be expressed in SI.")
+                            factors[uri] = NOT_EXPRESSIBLE
+                    # Set factors of the chunk on the cache backend in one batch
+                    backend.set_many('factor_si', factors)
+                    cached = cached + sum(1 for factor in factors.values() if factor != NOT_EXPRESSIBLE)
+                    bar.next(len(chunk_results))
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+            bar.finish()
+
+    print("Cached %d units, skipped %d units that were already cached." % (cached, len(cached_factors)))
 
     # Save dictionary
-    with open(SpellCheckerObject.path(), 'w') as outfile:
-        json.dump(dictdata, outfile)
+    dictionary_path = dictionary_path or SpellCheckerObject.written_path()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(dictionary_path)), exist_ok=True)
+        with open(dictionary_path, 'w') as outfile:
+            json.dump(dictdata, outfile)
+        SpellCheckerObject.get_instance().reload()
+    except OSError as e:
+        print("WARNING: Dictionary %s can not be written, the corrector keeps its dictionary. %s" % (dictionary_path, e))
 
     # Print logged warnings
     if len(warnings) > 0:
         print("Finished with warnings.")
         for warning in warnings:
             print(warning)
+
+    seconds = time.perf_counter() - start
+    report = {
+        'backend': type(backend).__name__,
+        'processes': processes,
+        'units': len(unit_list),
+        'cached': cached,
+        'skipped': len(cached_factors),
+        'not_expressible': len(warnings),
+        'failed': len(failures),
+        'failures': failures,
+        'seconds': round(seconds, 3),
+        'units_per_second': round(len(pending) / seconds, 1) if seconds > 0 else None,
+    }
+    print("Processed %d units in %.2fs (%s units/s), %d failures." % (
+        len(pending), seconds, report['units_per_second'], len(failures)))
+    if report_path is not None:
+        with open(report_path, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+    return report
+
+
+def __cache_chunk(uris: list) -> list:
+    # Worker of cache_units: (uri, SI factor, english labels, error) of every unit in the chunk
+    results = []
+    for uri in uris:
+        try:
+            unit = Unit(uri, internal=True)
+            results.append((uri, unit.get_factor_si(), unit.labels, None))
+        except Exception as e:
+            results.append((uri, None, [], f'{type(e).__name__}: {e}'))
+    return results
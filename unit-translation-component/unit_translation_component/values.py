@@ -1,7 +1,8 @@
 from __future__ import annotations
 from unit_translation_component.unit import Unit
-from unit_translation_component.redis_instance import RedisObject
+from unit_translation_component.conversion_plan import ConversionPlan
 from unit_translation_component.exception import PercentConversionException
+import numpy as np
 
 
 class Values:
@@ -10,30 +11,14 @@ class Values:
 
     # function __init__ initializes the newly created object with preset
     # values for quantity and unity
+    # the quantity can also be an array (or list) of numbers that share the unit,
+    # to_unit then converts all of them in one NumPy expression
 
     def __init__(self, q: float, u: Unit, p: float = 100.0):
-        self.quantity = q
+        self.quantity = np.asarray(q, dtype=float) if isinstance(q, (list, tuple)) else q
         self.unit = u
         self.percentage = p
 
-    # Get cached factors or calculate if redis not available
-    def __get_units_factors(self, param: Unit):
-        if RedisObject.available():
-            factors = []
-            redis_instance = RedisObject.get_instance()
-            for target in [self.unit, param]:
-                if redis_instance.hexists(target.URIRef, 'factor_si'):
-                    factor = float(redis_instance.hget(
-                        target.URIRef, 'factor_si'))
-                    factors.append(factor)
-                else:
-                    factor = target.get_factor_si()
-                    factors.append(factor)
-                    redis_instance.hmset(target.URIRef, {'factor_si': factor})
-            return (factors[0], factors[1])
-        else:
-            return (self.unit.get_factor_si(), param.get_factor_si())
-
     def to_unit(self, param: Unit, whole: Values = None):
         if param == Unit('%', symbol=True):
             if whole is None:
@@ -41,14 +26,56 @@ class Values:
             value_in_whole_unit = self.to_unit(whole.unit)
             return (value_in_whole_unit * 100) / whole.quantity
 
-        self.unit.can_convert_to(param)
-        # Handle non-temperatures units
-        if not (self.unit.f_temperature or param.f_temperature):
-            (f1, f2) = self.__get_units_factors(param)
-            return (self.quantity * f1 / f2) * (self.percentage / 100.0)
-        else:
-            # Handle temperatures
-            return param.from_kelvin(self.unit.to_kelvin(self.quantity)) * (self.percentage / 100.0)
+        # The plan of a unit pair is resolved once and cached, see ConversionPlan
+        return ConversionPlan.get(self.unit, param).apply(self.quantity, self.percentage)
 
     def __repr__(self):
         return f'<{type(self).__name__} quantity: {self.quantity}, unit: {self.unit}, percentage: {self.percentage}>'
+
+
+def convert_array(quantities, source_units, target: Unit, percentage=100.0, whole: Values = None,
+                  symbol: bool = False, lang: str = "en", internal: bool = False) -> np.ndarray:
+    # Convert a column of quantities to the target unit
+    # source_units is either one unit for all quantities, or a (categorical) array with a unit per quantity.
+    # Units given as strings are resolved with the symbol, lang and internal flags of the Unit constructor.
+    # Quantities are grouped by source unit, so every distinct unit pair is resolved once.
+    quantities = np.asarray(quantities, dtype=float)
+    if isinstance(source_units, (Unit, str)):
+        return np.asarray(Values(quantities, __as_unit(source_units, symbol, lang, internal), percentage)
+                          .to_unit(target, whole), dtype=float)
+
+    categories, codes = __factorize(source_units)
+    if codes.shape != quantities.shape:
+        raise ValueError('Expected a source unit for each of the %d quantities, got %d' % (quantities.size, codes.size))
+
+    flat_quantities = quantities.ravel()
+    codes = codes.ravel()
+    result = np.empty(flat_quantities.shape, dtype=float)
+    order = np.argsort(codes, kind='stable')
+    groups = np.split(order, np.cumsum(np.bincount(codes, minlength=len(categories)))[:-1])
+    for category, rows in zip(categories, groups):
+        if len(rows) == 0:
+            continue
+        source = __as_unit(category, symbol, lang, internal)
+        group_whole = whole
+        if whole is not None and np.ndim(whole.quantity) > 0:
+            group_whole = Values(np.ravel(whole.quantity)[rows], whole.unit)
+        group_percentage = np.ravel(percentage)[rows] if np.ndim(percentage) > 0 else percentage
+        result[rows] = Values(flat_quantities[rows], source, group_percentage).to_unit(target, group_whole)
+    return result.reshape(quantities.shape)
+
+
+def __as_unit(unit, symbol: bool, lang: str, internal: bool) -> Unit:
+    return unit if isinstance(unit, Unit) else Unit(unit, symbol, lang, internal)
+
+
+def __factorize(units):
+    # Split a sequence of units into its distinct units and a code per element
+    units = np.asarray(units) if not isinstance(units, np.ndarray) else units
+    if units.dtype.kind in 'US':
+        categories, codes = np.unique(units.ravel(), return_inverse=True)
+        return [str(category) for category in categories], codes.reshape(units.shape)
+    categories = {}
+    codes = np.fromiter((categories.setdefault(unit, len(categories)) for unit in units.ravel()),
+                        dtype=np.intp, count=units.size)
+    return list(categories), codes.reshape(units.shape)